@@ -1,8 +1,6 @@
-import json
-import os
-import psycopg2
 import secrets
 from typing import Dict, Any, List
+from runtime import Router, Request, BadRequest, DB_JSON_RESPONSES, json_response, raw_json_response, timed
 
 def generate_api_key() -> str:
     return f"madai_{secrets.token_urlsafe(32)}"
@@ -30,6 +28,23 @@ def get_api_keys(conn) -> List[Dict]:
     
     return keys
 
+def get_api_keys_json(conn) -> str:
+    '''Тот же список, что get_api_keys, но JSON собирает сам запрос — Python только передаёт строку'''
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COALESCE(json_agg(json_build_object(
+            'id', id,
+            'key', key,
+            'name', name,
+            'created', py_isoformat(created_at),
+            'lastUsed', py_isoformat(last_used)
+        ) ORDER BY created_at DESC), '[]')::text
+        FROM api_keys
+    """)
+    body = cursor.fetchone()[0]
+    cursor.close()
+    return body
+
 def create_api_key(name: str, conn) -> Dict:
     cursor = conn.cursor()
     
@@ -53,6 +68,10 @@ def create_api_key(name: str, conn) -> Dict:
     }
 
 def delete_api_key(key_id: int, conn) -> Dict:
+    '''
+    Отзывает ключ. Чат кеширует проверенные ключи, поэтому отзыв вступает в силу
+    там не позже API_KEY_CACHE_TTL_SECONDS (по умолчанию 30 с)
+    '''
     cursor = conn.cursor()
     
     cursor.execute("UPDATE api_keys SET key = NULL WHERE id = %s", (key_id,))
@@ -62,106 +81,43 @@ def delete_api_key(key_id: int, conn) -> Dict:
     
     return {'success': True}
 
+app = Router()
+
+@app.route('GET')
+def list_keys(request: Request) -> Dict[str, Any]:
+    conn = request.conn
+    with timed('query'):
+        if DB_JSON_RESPONSES:
+            return raw_json_response(get_api_keys_json(conn))
+        keys = get_api_keys(conn)
+    return json_response(keys)
+
+@app.route('POST')
+def create_key(request: Request) -> Dict[str, Any]:
+    body_data = request.json()
+    conn = request.conn
+    with timed('save'):
+        key = create_api_key(body_data.get('name', 'Unnamed Key'), conn)
+    return json_response(key, 201)
+
+@app.route('DELETE')
+def delete_key(request: Request) -> Dict[str, Any]:
+    key_id = request.query.get('id')
+    if not key_id:
+        raise BadRequest('Missing key id')
+    try:
+        key_id = int(key_id)
+    except ValueError:
+        raise BadRequest('Invalid key id')
+    conn = request.conn
+    with timed('save'):
+        result = delete_api_key(key_id, conn)
+    return json_response(result)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Управление API ключами с сохранением в БД
     Args: event - HTTP запрос, context - контекст функции
     Returns: HTTP response с API ключами
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Database not configured'})
-        }
-    
-    conn = psycopg2.connect(database_url)
-    
-    try:
-        if method == 'GET':
-            keys = get_api_keys(conn)
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps(keys)
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            name = body_data.get('name', 'Unnamed Key')
-            
-            result = create_api_key(name, conn)
-            conn.close()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps(result)
-            }
-        
-        elif method == 'DELETE':
-            query_params = event.get('queryStringParameters') or {}
-            key_id = query_params.get('id')
-            
-            if not key_id:
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json'},
-                    'body': json.dumps({'error': 'Missing key id'})
-                }
-            
-            result = delete_api_key(int(key_id), conn)
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps(result)
-            }
-        
-        else:
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
-            
-    except Exception as e:
-        if conn:
-            conn.close()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': str(e)})
-        }
+    return app.dispatch(event, context)
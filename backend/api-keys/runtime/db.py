@@ -0,0 +1,96 @@
+import os
+import time
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR, TRANSACTION_STATUS_UNKNOWN
+from typing import Dict, Any, List, Tuple, Optional
+from .timing import count_query, annotate, log_stats
+
+DB_POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '2'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+_idle_connections: List[Tuple[Any, float]] = []
+_pool_database_url: Optional[str] = None
+pool_stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'reconnects': 0, 'aborted_rollbacks': 0}
+log_stats('db_pool', lambda: {**pool_stats, 'idle': len(_idle_connections)})
+
+class CountingCursor(psycopg2.extensions.cursor):
+    '''Курсор соединений пула: каждый execute попадает в счётчик queries текущего запроса'''
+    
+    def execute(self, query, vars=None):
+        count_query()
+        return super().execute(query, vars)
+    
+    def copy_expert(self, sql, file, size=8192):
+        count_query()
+        return super().copy_expert(sql, file, size)
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_connection_alive(conn, idle_seconds: float) -> bool:
+    '''Проверяет, что соединение из пула ещё пригодно для запросов'''
+    if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if idle_seconds < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def acquire_connection(database_url: str):
+    '''Берёт соединение из пула тёплого контейнера или открывает новое'''
+    global _pool_database_url
+    
+    if _pool_database_url != database_url:
+        while _idle_connections:
+            _close_quietly(_idle_connections.pop()[0])
+        _pool_database_url = database_url
+    
+    had_stale = False
+    while _idle_connections:
+        conn, released_at = _idle_connections.pop()
+        if _is_connection_alive(conn, time.monotonic() - released_at):
+            pool_stats['hits'] += 1
+            annotate('db_pool', 'hit')
+            return conn
+        _close_quietly(conn)
+        had_stale = True
+    
+    pool_stats['misses'] += 1
+    if had_stale:
+        pool_stats['reconnects'] += 1
+    annotate('db_pool', 'reconnect' if had_stale else 'miss')
+    return psycopg2.connect(database_url, cursor_factory=CountingCursor)
+
+def release_connection(conn) -> None:
+    '''Возвращает соединение в пул, откатив незавершённую транзакцию'''
+    if conn is None or conn.closed:
+        return
+    
+    status = conn.get_transaction_status()
+    if status == TRANSACTION_STATUS_UNKNOWN:
+        _close_quietly(conn)
+        return
+    
+    if status != TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _close_quietly(conn)
+            return
+        if status == TRANSACTION_STATUS_INERROR:
+            pool_stats['aborted_rollbacks'] += 1
+    
+    if len(_idle_connections) >= DB_POOL_MAX_IDLE:
+        _close_quietly(conn)
+        return
+    
+    _idle_connections.append((conn, time.monotonic()))
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from runtime import annotate, log_stats
+
+API_KEY_CACHE_ENABLED = os.environ.get('API_KEY_CACHE_ENABLED', 'true').lower() == 'true'
+API_KEY_CACHE_SIZE = int(os.environ.get('API_KEY_CACHE_SIZE', '1024'))
+API_KEY_CACHE_TTL_SECONDS = float(os.environ.get('API_KEY_CACHE_TTL_SECONDS', '30'))
+API_KEY_NEGATIVE_TTL_SECONDS = float(os.environ.get('API_KEY_NEGATIVE_TTL_SECONDS', '10'))
+API_KEY_LAST_USED_FLUSH_SECONDS = float(os.environ.get('API_KEY_LAST_USED_FLUSH_SECONDS', '60'))
+
+def _digest(api_key: str) -> str:
+    # Сами ключи в памяти контейнера не храним
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+class ApiKeyCache:
+    '''
+    LRU проверенных ключей: digest → (id или None для неизвестного ключа, срок годности).
+    Отозванный через delete_api_key ключ перестаёт приниматься не позже
+    API_KEY_CACHE_TTL_SECONDS — другого канала оповещения между функциями нет.
+    last_flushed хранится только для ключей, что есть в entries, и уходит вместе с ними.
+    '''
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: 'OrderedDict[str, Tuple[Optional[int], float]]' = OrderedDict()
+        self.last_flushed: Dict[int, float] = {}
+        self.stats: Dict[str, int] = {
+            'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0,
+            'last_used_writes': 0, 'last_used_skipped': 0, 'revoked': 0
+        }
+    
+    def get(self, digest: str) -> Tuple[bool, Optional[int]]:
+        '''(найдено ли в кеше, id ключа или None)'''
+        entry = self.entries.get(digest)
+        if entry is None:
+            return False, None
+        key_id, expires_at = entry
+        if expires_at <= time.monotonic():
+            # Просроченная запись остаётся до put: так put видит прежний id и его last_flushed
+            return False, None
+        self.entries.move_to_end(digest)
+        return True, key_id
+    
+    def put(self, digest: str, key_id: Optional[int]) -> None:
+        ttl = API_KEY_CACHE_TTL_SECONDS if key_id is not None else API_KEY_NEGATIVE_TTL_SECONDS
+        previous = self.entries.get(digest)
+        if previous is not None and previous[0] != key_id:
+            self.last_flushed.pop(previous[0], None)
+        self.entries[digest] = (key_id, time.monotonic() + ttl)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_size:
+            _, (evicted_id, _) = self.entries.popitem(last=False)
+            self.last_flushed.pop(evicted_id, None)
+            self.stats['evictions'] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['negative_hits'] + self.stats['misses']
+        hit_ratio = (self.stats['hits'] + self.stats['negative_hits']) / lookups if lookups else 0.0
+        return {**self.stats, 'size': len(self.entries), 'flush_times': len(self.last_flushed),
+                'hit_ratio': round(hit_ratio, 4)}
+
+api_key_cache = ApiKeyCache(API_KEY_CACHE_SIZE)
+log_stats('api_key_cache', api_key_cache.snapshot)
+
+def _select_key_id(api_key: str, conn) -> Optional[int]:
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM api_keys
+        WHERE key = %s AND key IS NOT NULL
+    """, (api_key,))
+    result = cursor.fetchone()
+    cursor.close()
+    return result[0] if result else None
+
+def _flush_last_used(digest: str, key_id: int, conn) -> Optional[int]:
+    '''
+    Пишет last_used не чаще раза в API_KEY_LAST_USED_FLUSH_SECONDS на ключ,
+    так что запросы одного ключа не выстраиваются в очередь за блокировкой строки.
+    Если ключ успели отозвать, UPDATE ничего не находит — кеш узнаёт об этом сразу.
+    '''
+    now = time.monotonic()
+    if now - api_key_cache.last_flushed.get(key_id, float('-inf')) < API_KEY_LAST_USED_FLUSH_SECONDS:
+        api_key_cache.stats['last_used_skipped'] += 1
+        return key_id
+    
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE api_keys
+        SET last_used = CURRENT_TIMESTAMP
+        WHERE id = %s AND key IS NOT NULL
+    """, (key_id,))
+    updated = cursor.rowcount
+    cursor.close()
+    conn.commit()
+    api_key_cache.stats['last_used_writes'] += 1
+    
+    if not updated:
+        api_key_cache.stats['revoked'] += 1
+        api_key_cache.put(digest, None)
+        return None
+    
+    api_key_cache.last_flushed[key_id] = now
+    return key_id
+
+def validate_api_key(api_key: str, conn) -> Optional[int]:
+    '''Возвращает id действующего ключа или None; БД читается только при промахе кеша'''
+    if not API_KEY_CACHE_ENABLED:
+        key_id = _select_key_id(api_key, conn)
+        if key_id is not None:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE api_keys
+                SET last_used = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (key_id,))
+            cursor.close()
+            conn.commit()
+        return key_id
+    
+    digest = _digest(api_key)
+    found, key_id = api_key_cache.get(digest)
+    if found:
+        api_key_cache.stats['hits' if key_id is not None else 'negative_hits'] += 1
+        annotate('api_key_cache', 'hit' if key_id is not None else 'negative_hit')
+    else:
+        api_key_cache.stats['misses'] += 1
+        annotate('api_key_cache', 'miss')
+        key_id = _select_key_id(api_key, conn)
+        api_key_cache.put(digest, key_id)
+    
+    if key_id is None:
+        return None
+    return _flush_last_used(digest, key_id, conn)
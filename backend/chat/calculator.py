@@ -0,0 +1,274 @@
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+CALC_CACHE_SIZE = int(os.environ.get('CALC_CACHE_SIZE', '512'))
+MAX_EXPRESSION_LENGTH = 200
+MAX_EXPRESSION_TOKENS = 64
+MAX_EXPRESSIONS_PER_MESSAGE = 10
+MAX_NESTING_DEPTH = 16
+MAX_EXPONENT = 100
+MAX_BATCH_SIZE = int(os.environ.get('CALC_MAX_BATCH_SIZE', '100'))
+
+# Словесные операторы заменяются только целыми словами: «на» и «х» внутри
+# обычных слов («написать», «хорошо») больше не превращаются в умножение
+WORD_OPERATORS = [
+    (re.compile(r'\bплюс\b'), ' + '),
+    (re.compile(r'\bминус\b'), ' - '),
+    (re.compile(r'\b(?:умножить|умноженное|умножь)(?:\s+на)?\b'), ' * '),
+    (re.compile(r'\b(?:разделить|поделить|делить|раздели|подели)(?:\s+на)?\b'), ' / '),
+    (re.compile(r'\bв\s+степени\b'), ' ^ '),
+    (re.compile(r'\bпроцент(?:ов|а)?\b'), '%'),
+    (re.compile(r'%\s*от\b'), '% *'),
+    (re.compile(r'(?<=\d)\s*(?:[xх×]|на)\s*(?=[\d(])'), ' * '),
+    (re.compile(r'÷'), ' / '),
+    (re.compile(r'(?<=\d),(?=\d)'), '.'),
+]
+
+# Фрагмент не начинается внутри слова или числа: «1e5», «gta5», «v2.0» — не выражения
+EXPRESSION_CANDIDATE = re.compile(r'(?<![\w.])[-+*/^%().\d\s]+')
+DATE_LIKE = re.compile(r'^\d{1,4}([-./])\d{1,2}\1\d{1,4}$')
+# Группы цифр через дефис без пробелов — телефон («8-800-555-35-35», «+7-999-123-45-67»),
+# а не вычитание; «100 - 20 - 30» с пробелами по-прежнему считается
+PHONE_LIKE = re.compile(r'^\+?\d{1,4}(?:-\d{2,4}){2,}$')
+TOKEN_PATTERN = re.compile(r'\s*(?:(\d+(?:\.\d*)?|\.\d+)|(\*\*|[-+*/^%()]))')
+NUMBER_MAX_DIGITS = 30
+
+class CalculationError(Exception):
+    '''Выражение разобрано, но вычислить его нельзя'''
+
+class _Parser:
+    '''Рекурсивный спуск: + -  <  * /  <  унарный знак  <  ^ (правоассоциативно)  <  %'''
+    
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+    
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][1] if self.position < len(self.tokens) else None
+    
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+    
+    def expression(self) -> Tuple:
+        node = self.term()
+        while self.peek() in ('+', '-'):
+            operator = self.take()[1]
+            right = self.term()
+            if right[0] == 'percent':
+                node = ('percent_of', operator, node, right[1])
+            else:
+                node = ('binary', operator, node, right)
+        return node
+    
+    def term(self) -> Tuple:
+        node = self.unary()
+        while self.peek() in ('*', '/'):
+            operator = self.take()[1]
+            node = ('binary', operator, node, self.unary())
+        return node
+    
+    def unary(self) -> Tuple:
+        if self.peek() in ('+', '-'):
+            operator = self.take()[1]
+            operand = self.unary()
+            return ('negate', operand) if operator == '-' else operand
+        return self.power()
+    
+    def power(self) -> Tuple:
+        base = self.postfix()
+        if self.peek() in ('^', '**'):
+            self.take()
+            return ('binary', '^', base, self.unary())
+        return base
+    
+    def postfix(self) -> Tuple:
+        node = self.atom()
+        while self.peek() == '%':
+            self.take()
+            node = ('percent', node)
+        return node
+    
+    def atom(self) -> Tuple:
+        if self.position >= len(self.tokens):
+            raise SyntaxError('unexpected end')
+        kind, value = self.take()
+        if kind == 'number':
+            if len(value) > NUMBER_MAX_DIGITS:
+                raise SyntaxError('number too long')
+            return ('number', float(value))
+        if value == '(':
+            self.depth += 1
+            if self.depth > MAX_NESTING_DEPTH:
+                raise SyntaxError('too deep')
+            node = self.expression()
+            if self.peek() != ')':
+                raise SyntaxError('missing )')
+            self.take()
+            self.depth -= 1
+            return node
+        raise SyntaxError(f'unexpected {value}')
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise SyntaxError(f'bad character at {position}')
+        if match.group(1) is not None:
+            tokens.append(('number', match.group(1)))
+        else:
+            tokens.append(('operator', match.group(2)))
+        position = match.end()
+        if len(tokens) > MAX_EXPRESSION_TOKENS:
+            raise SyntaxError('too many tokens')
+    return tokens
+
+@lru_cache(maxsize=CALC_CACHE_SIZE)
+def compile_expression(text: str) -> Optional[Tuple]:
+    '''
+    Разбирает выражение в дерево; None, если это не арифметика.
+    Результат кешируется, повторные вычисления не парсят строку заново.
+    '''
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        return None
+    try:
+        tokens = tokenize(text)
+        parser = _Parser(tokens)
+        tree = parser.expression()
+        if parser.position != len(tokens):
+            return None
+    except SyntaxError:
+        return None
+    # Число, число со знаком или «50%» без операции — не вычисление («+7 999», «скидка 50%»)
+    if not _has_operation(tree):
+        return None
+    return tree
+
+def _has_operation(node: Tuple) -> bool:
+    if node[0] in ('binary', 'percent_of'):
+        return True
+    if node[0] in ('negate', 'percent'):
+        return _has_operation(node[1])
+    return False
+
+def evaluate_tree(node: Tuple) -> float:
+    kind = node[0]
+    if kind == 'number':
+        return node[1]
+    if kind == 'negate':
+        return -evaluate_tree(node[1])
+    if kind == 'percent':
+        return evaluate_tree(node[1]) / 100
+    if kind == 'percent_of':
+        base = evaluate_tree(node[2])
+        delta = base * evaluate_tree(node[3]) / 100
+        return base + delta if node[1] == '+' else base - delta
+    
+    operator, left, right = node[1], evaluate_tree(node[2]), evaluate_tree(node[3])
+    if operator == '+':
+        return left + right
+    if operator == '-':
+        return left - right
+    if operator == '*':
+        return left * right
+    if operator == '/':
+        if right == 0:
+            raise CalculationError('Деление на ноль невозможно')
+        return left / right
+    if abs(right) > MAX_EXPONENT:
+        raise CalculationError(f'Показатель степени больше {MAX_EXPONENT}')
+    if left < 0 and not float(right).is_integer():
+        raise CalculationError('Дробная степень отрицательного числа')
+    if left == 0 and right < 0:
+        raise CalculationError('Деление на ноль невозможно')
+    return left ** right
+
+def evaluate(text: str) -> float:
+    '''Вычисляет одно выражение; SyntaxError — не арифметика, CalculationError — ошибка вычисления'''
+    tree = compile_expression(text)
+    if tree is None:
+        raise SyntaxError('not an arithmetic expression')
+    try:
+        result = evaluate_tree(tree)
+    except OverflowError:
+        raise CalculationError('Слишком большое число')
+    if math.isinf(result) or math.isnan(result):
+        raise CalculationError('Слишком большое число')
+    return result
+
+def format_number(value: float) -> str:
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f'{value:.10g}'
+
+def format_expression(text: str) -> str:
+    '''Расставляет пробелы вокруг операторов, чтобы `*` не превращался в курсив markdown'''
+    formatted = ''
+    previous = None
+    for kind, value in tokenize(text):
+        if kind == 'number' or value == '(':
+            formatted += value if previous in (None, '(', 'sign') else ' ' + value
+            previous = 'value' if kind == 'number' else '('
+        elif value in (')', '%'):
+            formatted += value
+            previous = 'value'
+        elif value in ('+', '-') and previous != 'value':
+            formatted += value if previous in (None, '(') else ' ' + value
+            previous = 'sign'
+        else:
+            formatted += ' ' + value
+            previous = 'operator'
+    return formatted
+
+def normalize_expression_text(text: str) -> str:
+    text = text.lower()
+    for pattern, replacement in WORD_OPERATORS:
+        text = pattern.sub(replacement, text)
+    return text
+
+def extract_expressions(message: str) -> List[str]:
+    '''Находит в сообщении фрагменты, похожие на арифметику'''
+    expressions = []
+    for match in EXPRESSION_CANDIDATE.finditer(normalize_expression_text(message)):
+        candidate = ' '.join(match.group(0).split())
+        if DATE_LIKE.match(candidate) or PHONE_LIKE.match(candidate):
+            continue
+        if any(character.isdigit() for character in candidate) and compile_expression(candidate) is not None:
+            expressions.append(candidate)
+            if len(expressions) >= MAX_EXPRESSIONS_PER_MESSAGE:
+                break
+    return expressions
+
+def calculate_expressions(message: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    '''Возвращает (выражение, результат, ошибка) для каждого выражения в сообщении'''
+    results = []
+    for expression in extract_expressions(message):
+        try:
+            results.append((expression, format_number(evaluate(expression)), None))
+        except CalculationError as e:
+            results.append((expression, None, str(e)))
+    return results
+
+def evaluate_batch(expressions: List[str]) -> List[Dict[str, Any]]:
+    '''Вычисляет список выражений за один вызов, ошибка одного не мешает остальным'''
+    if len(expressions) > MAX_BATCH_SIZE:
+        raise ValueError(f'Не больше {MAX_BATCH_SIZE} выражений за запрос')
+    
+    results = []
+    for expression in expressions:
+        text = ' '.join(normalize_expression_text(str(expression)).split())
+        try:
+            results.append({'expression': expression, 'result': format_number(evaluate(text))})
+        except SyntaxError:
+            results.append({'expression': expression, 'error': 'Не удалось разобрать выражение'})
+        except CalculationError as e:
+            results.append({'expression': expression, 'error': str(e)})
+    return results
@@ -0,0 +1,171 @@
+import heapq
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple, Set
+from runtime import log_stats
+
+ENTITY_INDEX_ENABLED = os.environ.get('ENTITY_INDEX_ENABLED', 'true').lower() == 'true'
+ENTITY_INDEX_CHECK_SECONDS = float(os.environ.get('ENTITY_INDEX_CHECK_SECONDS', '30'))
+ENTITY_INDEX_MAX_AGE_SECONDS = float(os.environ.get('ENTITY_INDEX_MAX_AGE_SECONDS', '600'))
+# Поиск в памяти — проход по всем строкам: на 100k записей он дороже индексированного SQL
+# (retrieve_candidates в index.py), поэтому выше этого числа строк индекс не загружается
+ENTITY_INDEX_MAX_ROWS = int(os.environ.get('ENTITY_INDEX_MAX_ROWS', '20000'))
+
+DEFAULT_CREATOR_INFO = "MadAI создал Мад Сатору в 2025 году"
+
+VERSION_QUERY = """
+    SELECT
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(id), 0) FROM games_database),
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(id), 0) FROM celebrities_database),
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(id), 0) FROM creator_info)
+"""
+
+class EntityTable:
+    '''Строки одной таблицы с инвертированным индексом по ключевым словам'''
+    
+    def __init__(self, rows: List[Tuple], text_columns: Tuple[int, ...]):
+        # rows: (id, keywords, *поля ответа); text_columns — индексы полей для поиска подстроки,
+        # первое из них определяет ранг (точное совпадение / подстрока)
+        self.rows = rows
+        self.texts = [tuple((row[i] or '').lower() for i in text_columns) for row in rows]
+        self.max_text_length = max((len(t) for texts in self.texts for t in texts), default=0)
+        self.by_keyword: Dict[str, Set[int]] = {}
+        for position, row in enumerate(rows):
+            for keyword in row[1] or []:
+                self.by_keyword.setdefault(keyword, set()).add(position)
+    
+    def search(self, query_lower: str, limit: int) -> List[Tuple]:
+        '''
+        Те же ступени, что ENTITY_MATCH_TIERS в index.py: точное совпадение первого поля,
+        подстрока, общее ключевое слово; внутри ступени — меньший id. Поэтому ответ не зависит
+        от того, загружен индекс или таблицы больше ENTITY_INDEX_MAX_ROWS и поиск идёт в SQL.
+        '''
+        candidates: Set[int] = set()
+        for word in query_lower.split():
+            candidates |= self.by_keyword.get(word, set())
+        
+        if query_lower and len(query_lower) <= self.max_text_length:
+            for position, texts in enumerate(self.texts):
+                if any(query_lower in text for text in texts):
+                    candidates.add(position)
+        
+        def rank(position: int) -> Tuple[int, int]:
+            primary = self.texts[position][0]
+            if primary == query_lower:
+                return (1, self.rows[position][0])
+            if query_lower in primary:
+                return (2, self.rows[position][0])
+            return (3, self.rows[position][0])
+        
+        return [self.rows[position][2:] for position in heapq.nsmallest(limit, candidates, key=rank)]
+
+class EntityIndex:
+    '''
+    Снимок игр, артистов и сведений о создателе в памяти тёплого контейнера. Статей базы
+    знаний здесь нет намеренно: чат ищет их тем же SQL, что и lua-knowledge (runtime.search),
+    и это единственное обращение к базе при поиске ответа с загруженным индексом.
+    '''
+    
+    def __init__(self, conn):
+        cursor = conn.cursor()
+        
+        cursor.execute(VERSION_QUERY)
+        self.version = cursor.fetchone()
+        
+        cursor.execute("""
+            SELECT id, keywords, name, developer, publisher, release_year, genre, platform, description
+            FROM games_database
+        """)
+        self.games = EntityTable(cursor.fetchall(), (2,))
+        
+        cursor.execute("""
+            SELECT id, keywords, name, profession, birth_year, nationality, known_for, description
+            FROM celebrities_database
+        """)
+        self.celebrities = EntityTable(cursor.fetchall(), (2,))
+        
+        cursor.execute("SELECT value FROM creator_info WHERE key = 'creator_full'")
+        result = cursor.fetchone()
+        self.creator_full = result[0] if result else DEFAULT_CREATOR_INFO
+        
+        cursor.close()
+        conn.commit()
+        
+        self.loaded_at = time.monotonic()
+        self.checked_at = self.loaded_at
+    
+    def find_game(self, query: str) -> Optional[Tuple]:
+        rows = self.games.search(query.lower(), 1)
+        return rows[0] if rows else None
+    
+    def find_celebrity(self, query: str) -> Optional[Tuple]:
+        rows = self.celebrities.search(query.lower(), 1)
+        return rows[0] if rows else None
+
+_entity_index: Optional[EntityIndex] = None
+_sql_fallback_checked_at: Optional[float] = None
+entity_index_stats: Dict[str, int] = {'loads': 0, 'version_checks': 0, 'sql_fallbacks': 0}
+
+def _stats_snapshot() -> Dict[str, Any]:
+    index = _entity_index
+    return {
+        **entity_index_stats,
+        'rows': len(index.games.rows) + len(index.celebrities.rows) if index is not None else 0,
+        'sql_fallback': _sql_fallback_checked_at is not None
+    }
+
+log_stats('entity_index', _stats_snapshot)
+
+def searched_rows(version: Tuple) -> int:
+    '''Строк в играх и артистах по версии из VERSION_QUERY ("число:max(id)")'''
+    return sum(int(part.split(':', 1)[0]) for part in version[:2])
+
+def get_entity_index(conn) -> Optional[EntityIndex]:
+    '''
+    Возвращает индекс сущностей, перезагружая его при смене версии таблиц.
+    Версия сверяется не чаще раза в ENTITY_INDEX_CHECK_SECONDS, так что новая
+    игра или артист видны в чате не позже этого интервала.
+    None — искать индексированным SQL: индекс выключен или в таблицах больше
+    ENTITY_INDEX_MAX_ROWS строк; размер перепроверяется с тем же интервалом.
+    '''
+    global _entity_index, _sql_fallback_checked_at
+    
+    if not ENTITY_INDEX_ENABLED:
+        return None
+    
+    now = time.monotonic()
+    if _sql_fallback_checked_at is not None and now - _sql_fallback_checked_at < ENTITY_INDEX_CHECK_SECONDS:
+        return None
+    
+    index = _entity_index
+    fresh = index is not None and now - index.loaded_at < ENTITY_INDEX_MAX_AGE_SECONDS
+    if fresh and now - index.checked_at < ENTITY_INDEX_CHECK_SECONDS:
+        return index
+    
+    cursor = conn.cursor()
+    cursor.execute(VERSION_QUERY)
+    version = cursor.fetchone()
+    cursor.close()
+    conn.commit()
+    entity_index_stats['version_checks'] += 1
+    
+    if searched_rows(version) > ENTITY_INDEX_MAX_ROWS:
+        _entity_index = None
+        _sql_fallback_checked_at = now
+        entity_index_stats['sql_fallbacks'] += 1
+        return None
+    _sql_fallback_checked_at = None
+    
+    if fresh and version == index.version:
+        index.checked_at = now
+        return index
+    
+    _entity_index = EntityIndex(conn)
+    entity_index_stats['loads'] += 1
+    return _entity_index
+
+def reset_entity_index() -> None:
+    '''Сбрасывает индекс, следующий запрос загрузит его заново'''
+    global _entity_index, _sql_fallback_checked_at
+    _entity_index = None
+    _sql_fallback_checked_at = None
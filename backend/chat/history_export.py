@@ -0,0 +1,148 @@
+import base64
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from json.encoder import encode_basestring
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+from runtime.responses import CORS_HEADERS
+
+CHAT_EXPORT_ITERSIZE = int(os.environ.get('CHAT_EXPORT_ITERSIZE', '2000'))
+CHAT_EXPORT_MAX_ROWS = int(os.environ.get('CHAT_EXPORT_MAX_ROWS', '100000'))
+CHAT_EXPORT_GZIP_LEVEL = int(os.environ.get('CHAT_EXPORT_GZIP_LEVEL', '4'))
+
+EXPORT_FIELDS = ('id', 'role', 'content', 'timestamp')
+EXPORT_CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def parse_export_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    '''Разбирает export, chat_id, since, until и after_id; ValueError на мусор'''
+    fmt = params.get('export')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        raise ValueError(f'формат выгрузки: {", ".join(EXPORT_CONTENT_TYPES)}')
+    parsed: Dict[str, Any] = {'fmt': fmt}
+    for name in ('chat_id', 'after_id'):
+        value = params.get(name)
+        parsed[name] = int(value) if value not in (None, '') else None
+    for name in ('since', 'until'):
+        value = params.get(name)
+        parsed[name] = datetime.fromisoformat(value) if value not in (None, '') else None
+    return parsed
+
+def iter_messages(conn, chat_id: Optional[int] = None, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, after_id: Optional[int] = None,
+                  limit: int = CHAT_EXPORT_MAX_ROWS) -> Iterator[Sequence]:
+    '''
+    Сообщения чата за [since, until) в порядке (created_at, id) через именованный курсор:
+    сервер отдаёт их порциями по CHAT_EXPORT_ITERSIZE, в памяти только текущая порция.
+    after_id продолжает выгрузку с места, где остановилась предыдущая.
+    '''
+    conditions = ['chat_id IS NULL' if chat_id is None else 'chat_id = %(chat_id)s']
+    if since is not None:
+        conditions.append('created_at >= %(since)s')
+    if until is not None:
+        conditions.append('created_at < %(until)s')
+    if after_id is not None:
+        conditions.append("""(created_at, id) > (
+            COALESCE((SELECT created_at FROM chat_messages WHERE id = %(after_id)s), '-infinity'),
+            %(after_id)s)""")
+    
+    cursor = conn.cursor(name='chat_export')
+    cursor.itersize = CHAT_EXPORT_ITERSIZE
+    try:
+        cursor.execute(f"""
+            SELECT id, role, content, timestamp
+            FROM chat_messages
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at, id
+            LIMIT %(limit)s
+        """, {'chat_id': chat_id, 'since': since, 'until': until, 'after_id': after_id, 'limit': limit})
+        yield from cursor
+    finally:
+        cursor.close()
+
+def _ndjson_lines(rows: List[Sequence]) -> str:
+    # Строка собирается по шаблону: тот же JSON, что json.dumps(..., ensure_ascii=False) для
+    # словаря из _message_row, но без словаря и кодировщика на каждое сообщение — вдвое быстрее
+    return ''.join(
+        f'{{"id": {row[0]}, "role": {encode_basestring(row[1])}, "content": {encode_basestring(row[2])}, '
+        f'"timestamp": {encode_basestring(row[3].isoformat()) if row[3] else "null"}}}\n'
+        for row in rows
+    )
+
+def _csv_lines(rows: List[Sequence], writer, buffer: io.StringIO) -> str:
+    buffer.seek(0)
+    buffer.truncate()
+    writer.writerows((row[0], row[1], row[2], row[3].isoformat() if row[3] else '') for row in rows)
+    return buffer.getvalue()
+
+def encode_export(rows: Iterator[Sequence], fmt: str) -> Iterator[bytes]:
+    '''Кодирует строки в NDJSON или CSV порциями по CHAT_EXPORT_ITERSIZE; CSV начинается с заголовка'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+        yield buffer.getvalue().encode('utf-8')
+    
+    batch: List[Sequence] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHAT_EXPORT_ITERSIZE:
+            yield (_ndjson_lines(batch) if fmt == 'ndjson' else _csv_lines(batch, writer, buffer)).encode('utf-8')
+            batch.clear()
+    if batch:
+        yield (_ndjson_lines(batch) if fmt == 'ndjson' else _csv_lines(batch, writer, buffer)).encode('utf-8')
+
+def export_history(conn, fmt: str, chat_id: Optional[int] = None, since: Optional[datetime] = None,
+                   until: Optional[datetime] = None, after_id: Optional[int] = None,
+                   max_rows: int = CHAT_EXPORT_MAX_ROWS) -> Dict[str, Any]:
+    '''
+    Выгрузка истории файлом .ndjson.gz / .csv.gz. Порции сразу уходят в gzip, так что
+    в памяти держится только сжатый результат, а не список словарей и его JSON.
+    Больше max_rows строк за раз не отдаётся: в next_after_id — id, с которого продолжать.
+    '''
+    compressor = zlib.compressobj(CHAT_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    compressed: List[bytes] = []
+    stats = {'rows': 0, 'last_id': None, 'bytes': 0}
+    
+    def counted(rows: Iterator[Sequence]) -> Iterator[Sequence]:
+        for row in rows:
+            if stats['rows'] == max_rows:
+                stats['truncated'] = True
+                return
+            stats['rows'] += 1
+            stats['last_id'] = row[0]
+            yield row
+    
+    rows = iter_messages(conn, chat_id, since, until, after_id, limit=max_rows + 1)
+    for chunk in encode_export(counted(rows), fmt):
+        stats['bytes'] += len(chunk)
+        compressed.append(compressor.compress(chunk))
+    rows.close()
+    compressed.append(compressor.flush())
+    
+    return {
+        'rows': stats['rows'],
+        'bytes': stats['bytes'],
+        'next_after_id': stats['last_id'] if stats.get('truncated') else None,
+        'body': base64.b64encode(b''.join(compressed)).decode('ascii')
+    }
+
+def export_response(export: Dict[str, Any], fmt: str, chat_id: Optional[int]) -> Dict[str, Any]:
+    filename = f'chat-{"web" if chat_id is None else chat_id}.{fmt}.gz'
+    headers = {
+        'Content-Type': 'application/gzip',
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Export-Format': EXPORT_CONTENT_TYPES[fmt],
+        'X-Export-Rows': str(export['rows']),
+        **CORS_HEADERS,
+        'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Rows, X-Export-Next-After-Id'
+    }
+    if export['next_after_id'] is not None:
+        headers['X-Export-Next-After-Id'] = str(export['next_after_id'])
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'isBase64Encoded': True,
+        'body': export['body']
+    }
@@ -1,66 +1,114 @@
-import json
 import os
 import psycopg2
+from psycopg2.extras import execute_values
 import urllib.parse
-import re
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple, Sequence
+from entity_index import EntityIndex, get_entity_index, DEFAULT_CREATOR_INFO
+from intent_router import route_message, INTENT_MATH, FALLBACK_ROBLOX_HELP, FALLBACK_WEB
+from calculator import calculate_expressions, evaluate_batch, format_expression
+from response_cache import RESPONSE_CACHE_ENABLED, lookup_response, store_response
+from api_key_cache import validate_api_key
+from history_export import parse_export_params, export_history, export_response
+from runtime import (
+    Router, Request, HttpError, BadRequest, Unauthorized, DB_JSON_RESPONSES, json_response, raw_json_response,
+    not_modified, etag_matches, timed
+)
+from runtime.search import LUA_KNOWLEDGE_MATCH_SQL, LUA_KNOWLEDGE_RANK_SQL, LUA_KNOWLEDGE_SCORE_SQL, search_params
+
+CHAT_BATCH_MAX_MESSAGES = int(os.environ.get('CHAT_BATCH_MAX_MESSAGES', '50'))
+CHAT_HISTORY_PAGE_SIZE = int(os.environ.get('CHAT_HISTORY_PAGE_SIZE', '100'))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.environ.get('CHAT_HISTORY_MAX_PAGE_SIZE', '500'))
 
 def calculate_math(expression: str) -> Optional[str]:
-    '''Вычисляет простые математические выражения'''
-    try:
-        expression = expression.lower()
-        expression = expression.replace('плюс', '+').replace('минус', '-')
-        expression = expression.replace('умножить', '*').replace('разделить', '/')
-        expression = expression.replace('на', '*').replace('х', '*')
-        
-        match = re.search(r'([\d\.\s]+)\s*([\+\-\*\/])\s*([\d\.\s]+)', expression)
-        if match:
-            left = float(match.group(1).strip())
-            operator = match.group(2)
-            right = float(match.group(3).strip())
-            
-            if operator == '+':
-                result = left + right
-            elif operator == '-':
-                result = left - right
-            elif operator == '*':
-                result = left * right
-            elif operator == '/':
-                if right == 0:
-                    return "**Ошибка:** Деление на ноль невозможно"
-                result = left / right
-            else:
-                return None
-            
-            return f"**Результат:** {left} {operator} {right} = **{result}**"
-    except:
-        pass
-    return None
+    '''Вычисляет математические выражения из сообщения'''
+    results = calculate_expressions(expression)
+    if not results:
+        return None
+    
+    if len(results) == 1:
+        text, result, error = results[0]
+        if error:
+            return f"**Ошибка:** {error}"
+        return f"**Результат:** {format_expression(text)} = **{result}**"
+    
+    lines = ["**Результаты:**"]
+    for text, result, error in results:
+        if error:
+            lines.append(f"• {format_expression(text)} — **Ошибка:** {error}")
+        else:
+            lines.append(f"• {format_expression(text)} = **{result}**")
+    return "\n".join(lines)
 
-def search_game(query: str, conn) -> Optional[str]:
-    '''Ищет информацию об игре в базе данных'''
+ENTITY_KINDS = ('game', 'celebrity', 'lua')
+
+# Ступени поиска игры или артиста — те же, что у EntityTable.search в памяти: точное имя,
+# подстрока имени, общее ключевое слово; внутри ступени — меньший id. Каждая ступень
+# берёт id совпавших строк по своему индексу (триграммный GIN по LOWER(name) отвечает и
+# на =, и на LIKE, GIN по keywords — на &&) и оставляет один; поля ответа собираются
+# только для победителя. OFFSET 0 не даёт планировщику заменить индекс обходом первичного
+# ключа ради ORDER BY id LIMIT 1: без совпадений такой обход читает всю таблицу
+ENTITY_MATCH_TIERS = (
+    (1, "LOWER(name) = %(query)s"),
+    (2, "LOWER(name) LIKE %(pattern)s"),
+    (3, "keywords && %(keywords)s::text[]"),
+)
+
+def _entity_candidate_query(kind: str, priority: int, table: str, fields: str) -> str:
+    tiers = " UNION ALL ".join(
+        f"(SELECT {rank} AS rank, id FROM (SELECT id FROM {table} WHERE {condition} OFFSET 0) matched "
+        f"ORDER BY id LIMIT 1)"
+        for rank, condition in ENTITY_MATCH_TIERS
+    )
+    return f"""
+        (SELECT '{kind}' AS kind, {priority} AS priority, best.rank, 0::real AS score, best.id,
+                json_build_array({fields}) AS fields
+         FROM (SELECT rank, id FROM ({tiers}) tiers ORDER BY rank LIMIT 1) best
+         JOIN {table} USING (id))
+    """
+
+ENTITY_CANDIDATE_QUERIES = {
+    'game': _entity_candidate_query('game', 1, 'games_database',
+                                    'name, developer, publisher, release_year, genre, platform, description'),
+    'celebrity': _entity_candidate_query('celebrity', 2, 'celebrities_database',
+                                         'name, profession, birth_year, nationality, known_for, description'),
+    'lua': f"""
+        (SELECT 'lua' AS kind, 3 AS priority, rank, score, id,
+                json_build_array(topic, description, code_example, explanation, is_roblox) AS fields
+         FROM (
+             SELECT *,
+                 {LUA_KNOWLEDGE_RANK_SQL} AS rank,
+                 {LUA_KNOWLEDGE_SCORE_SQL} AS score
+             FROM lua_knowledge_base
+             WHERE {LUA_KNOWLEDGE_MATCH_SQL}
+         ) matched
+         ORDER BY rank, score DESC, id
+         LIMIT 3)
+    """
+}
+
+def retrieve_candidates(query: str, conn, kinds: Tuple[str, ...] = ENTITY_KINDS) -> List[Tuple[str, int, List]]:
+    '''
+    Ищет кандидатов сразу в играх, артистах и базе знаний одним запросом.
+    Возвращает (тип, ранг, поля) в порядке: игра, артист, статьи Lua. Игра и артист
+    выбираются как в индексе в памяти (ранг совпадения, затем id), статьи — по рангу,
+    ts_rank и триграммной близости, как в поиске lua-knowledge.
+    '''
     cursor = conn.cursor()
-    query_lower = query.lower()
-    keywords = query_lower.split()
-    
-    cursor.execute("""
-        SELECT name, developer, publisher, release_year, genre, platform, description
-        FROM games_database
-        WHERE keywords && %s::text[]
-           OR LOWER(name) LIKE %s
-        ORDER BY 
-            CASE 
-                WHEN LOWER(name) = %s THEN 1
-                WHEN LOWER(name) LIKE %s THEN 2
-                ELSE 3
-            END
-        LIMIT 1
-    """, (keywords, f'%{query_lower}%', query_lower, f'%{query_lower}%'))
     
-    result = cursor.fetchone()
+    cursor.execute(
+        "SELECT kind, rank, fields FROM ("
+        + " UNION ALL ".join(ENTITY_CANDIDATE_QUERIES[kind] for kind in kinds)
+        + ") candidates ORDER BY priority, rank, score DESC, id",
+        search_params(query)
+    )
+    
+    results = cursor.fetchall()
     cursor.close()
     
+    return results
+
+def format_game(result: Optional[Sequence]) -> Optional[str]:
+    '''Форматирует карточку игры'''
     if result:
         name, developer, publisher, year, genre, platform, description = result
         response = f"🎮 **{name}**\n\n"
@@ -80,29 +128,16 @@ def search_game(query: str, conn) -> Optional[str]:
     
     return None
 
-def search_celebrity(query: str, conn) -> Optional[str]:
-    '''Ищет информацию об артисте/знаменитости'''
-    cursor = conn.cursor()
-    query_lower = query.lower()
-    keywords = query_lower.split()
-    
-    cursor.execute("""
-        SELECT name, profession, birth_year, nationality, known_for, description
-        FROM celebrities_database
-        WHERE keywords && %s::text[]
-           OR LOWER(name) LIKE %s
-        ORDER BY 
-            CASE 
-                WHEN LOWER(name) = %s THEN 1
-                WHEN LOWER(name) LIKE %s THEN 2
-                ELSE 3
-            END
-        LIMIT 1
-    """, (keywords, f'%{query_lower}%', query_lower, f'%{query_lower}%'))
-    
-    result = cursor.fetchone()
-    cursor.close()
+def search_game(query: str, conn, entity_index: Optional[EntityIndex] = None) -> Optional[str]:
+    '''Ищет информацию об игре в базе данных'''
+    if entity_index is not None:
+        return format_game(entity_index.find_game(query))
     
+    candidates = retrieve_candidates(query, conn, ('game',))
+    return format_game(candidates[0][2] if candidates else None)
+
+def format_celebrity(result: Optional[Sequence]) -> Optional[str]:
+    '''Форматирует карточку артиста/знаменитости'''
     if result:
         name, profession, birth_year, nationality, known_for, description = result
         response = f"🎤 **{name}**\n\n"
@@ -120,8 +155,19 @@ def search_celebrity(query: str, conn) -> Optional[str]:
     
     return None
 
-def get_creator_info(conn) -> str:
+def search_celebrity(query: str, conn, entity_index: Optional[EntityIndex] = None) -> Optional[str]:
+    '''Ищет информацию об артисте/знаменитости'''
+    if entity_index is not None:
+        return format_celebrity(entity_index.find_celebrity(query))
+    
+    candidates = retrieve_candidates(query, conn, ('celebrity',))
+    return format_celebrity(candidates[0][2] if candidates else None)
+
+def get_creator_info(conn, entity_index: Optional[EntityIndex] = None) -> str:
     '''Возвращает информацию о создателе'''
+    if entity_index is not None:
+        return entity_index.creator_full
+    
     cursor = conn.cursor()
     cursor.execute("SELECT value FROM creator_info WHERE key = 'creator_full'")
     result = cursor.fetchone()
@@ -129,7 +175,7 @@ def get_creator_info(conn) -> str:
     
     if result:
         return result[0]
-    return "MadAI создал Мад Сатору в 2025 году"
+    return DEFAULT_CREATOR_INFO
 
 def search_web(query: str) -> str:
     '''Возвращает прямые ссылки на поиск'''
@@ -145,31 +191,8 @@ def search_web(query: str) -> str:
 
 Нажмите на ссылку для поиска в интернете!"""
 
-def get_lua_knowledge(query: str, conn) -> Optional[str]:
-    '''Ищет знания о Lua/Roblox'''
-    cursor = conn.cursor()
-    query_lower = query.lower()
-    keywords = query_lower.split()
-    
-    cursor.execute("""
-        SELECT topic, description, code_example, explanation, is_roblox
-        FROM lua_knowledge_base
-        WHERE 
-            keywords && %s::text[]
-            OR LOWER(topic) LIKE %s
-            OR LOWER(description) LIKE %s
-        ORDER BY 
-            CASE 
-                WHEN LOWER(topic) = %s THEN 1
-                WHEN LOWER(topic) LIKE %s THEN 2
-                ELSE 3
-            END
-        LIMIT 3
-    """, (keywords, f'%{query_lower}%', f'%{query_lower}%', query_lower, f'%{query_lower}%'))
-    
-    results = cursor.fetchall()
-    cursor.close()
-    
+def format_lua_knowledge(results: List[Sequence]) -> Optional[str]:
+    '''Форматирует найденные статьи базы знаний Lua/Roblox'''
     if results:
         response_parts = []
         for topic, description, code_example, explanation, is_roblox in results:
@@ -191,33 +214,36 @@ def get_lua_knowledge(query: str, conn) -> Optional[str]:
     
     return None
 
-def generate_ai_response(message: str, conn) -> str:
-    '''Генерирует умный ответ на основе запроса'''
-    message_lower = message.lower()
-    
-    math_result = calculate_math(message)
-    if math_result:
-        return math_result
-    
-    if 'создал' in message_lower and 'madai' in message_lower or 'кто создал' in message_lower or 'автор' in message_lower:
-        return get_creator_info(conn)
-    
-    game_info = search_game(message, conn)
-    if game_info:
-        return game_info
-    
-    celebrity_info = search_celebrity(message, conn)
-    if celebrity_info:
-        return celebrity_info
-    
-    knowledge_response = get_lua_knowledge(message, conn)
-    if knowledge_response:
-        return knowledge_response
-    
-    if any(keyword in message_lower for keyword in ['function', 'функция', 'table', 'таблица', 'loop', 'цикл', 
-                                                      'roblox', 'script', 'game', 'workspace', 'part']):
-        if 'roblox' in message_lower:
-            return """**Roblox Studio Scripting**
+def get_lua_knowledge(query: str, conn) -> Optional[str]:
+    '''Ищет знания о Lua/Roblox тем же ранжированием, что и поиск ?q= в lua-knowledge'''
+    candidates = retrieve_candidates(query, conn, ('lua',))
+    return format_lua_knowledge([fields for _, _, fields in candidates])
+
+def find_entity_answer(message: str, conn, entity_index: Optional[EntityIndex] = None) -> Optional[str]:
+    '''
+    Ищет игру, затем артиста, затем статьи базы знаний; без индекса — одним запросом.
+    С индексом игры, артисты и создатель отвечаются из памяти, а статьи Lua — единственное
+    исключение: когда игра и артист не нашлись, идёт один SQL-запрос. Ранжирование статей
+    (ts_rank, русская морфология, триграммы) общее с поиском ?q= в lua-knowledge, и в Python
+    его не повторить, не разойдясь с ним.
+    '''
+    if entity_index is not None:
+        return (search_game(message, conn, entity_index)
+                or search_celebrity(message, conn, entity_index)
+                or get_lua_knowledge(message, conn))
+    
+    candidates = retrieve_candidates(message, conn)
+    if not candidates:
+        return None
+    
+    kind = candidates[0][0]
+    if kind == 'game':
+        return format_game(candidates[0][2])
+    if kind == 'celebrity':
+        return format_celebrity(candidates[0][2])
+    return format_lua_knowledge([fields for _, _, fields in candidates])
+
+ROBLOX_HELP_ANSWER = """**Roblox Studio Scripting**
 
 Я могу помочь с:
 • Основами Lua для Roblox
@@ -227,8 +253,8 @@ def generate_ai_response(message: str, conn) -> str:
 • RemoteEvent/RemoteFunction
 
 Спросите конкретнее, например: "Как создать Part в Roblox?" """
-        else:
-            return """**Lua Программирование**
+
+LUA_HELP_ANSWER = """**Lua Программирование**
 
 Я эксперт по Lua! Могу помочь с:
 • Функциями и переменными
@@ -238,70 +264,342 @@ def generate_ai_response(message: str, conn) -> str:
 • Корутинами
 
 Задайте конкретный вопрос, например: "Как работают таблицы в Lua?" """
+
+# Запись кеша ответов вместо ссылок на веб-поиск: ссылки собираются из текущего сообщения
+WEB_SEARCH_CACHED = '@web_search'
+
+def compose_response(message: str, conn) -> Tuple[str, Optional[str]]:
+    '''
+    Ответ на сообщение и то, что из него кладётся в кеш ответов. Калькулятор и веб-поиск
+    повторяют текст сообщения, а ключ кеша общий для «Привет» и «привет», поэтому результат
+    калькулятора не кешируется (None), а вместо ссылок кешируется WEB_SEARCH_CACHED.
+    '''
+    route = route_message(message.lower())
+    
+    if route.intent == INTENT_MATH:
+        math_result = calculate_math(message)
+        if math_result:
+            return math_result, None
+    
+    with timed('search'):
+        entity_index = get_entity_index(conn)
+        
+        if route.creator:
+            creator_info = get_creator_info(conn, entity_index)
+            return creator_info, creator_info
+        
+        entity_answer = find_entity_answer(message, conn, entity_index)
+    if entity_answer:
+        return entity_answer, entity_answer
     
-    return search_web(message)
+    if route.fallback != FALLBACK_WEB:
+        help_answer = ROBLOX_HELP_ANSWER if route.fallback == FALLBACK_ROBLOX_HELP else LUA_HELP_ANSWER
+        return help_answer, help_answer
+    
+    return search_web(message), WEB_SEARCH_CACHED
 
-def get_messages(conn) -> List[Dict]:
-    '''Получает историю сообщений'''
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, role, content, timestamp
+def generate_ai_response(message: str, conn) -> str:
+    '''Генерирует умный ответ на основе запроса'''
+    return compose_response(message, conn)[0]
+
+def answer_message(message: str, conn) -> str:
+    '''Ответ из кеша по нормализованному запросу или сгенерированный заново'''
+    if not RESPONSE_CACHE_ENABLED:
+        return generate_ai_response(message, conn)
+    
+    with timed('cache'):
+        key, version, cached_response = lookup_response(message, conn)
+    if cached_response == WEB_SEARCH_CACHED:
+        return search_web(message)
+    if cached_response is not None:
+        return cached_response
+    
+    response, cached = compose_response(message, conn)
+    if cached is not None:
+        with timed('cache'):
+            store_response(key, version, cached, conn)
+    return response
+
+def _history_scope(chat_id: Optional[int]) -> str:
+    # Сообщения веб-чата хранятся без chat_id; отдельные условия, чтобы оба варианта шли по индексу
+    return 'chat_id IS NULL' if chat_id is None else 'chat_id = %(chat_id)s'
+
+def _message_row(row: Sequence) -> Dict:
+    return {
+        'id': row[0],
+        'role': row[1],
+        'content': row[2],
+        'timestamp': row[3].isoformat() if row[3] else None
+    }
+
+def _history_page_query(chat_id: Optional[int], before_id: Optional[int], after_id: Optional[int],
+                        limit: int) -> Tuple[str, Dict[str, Any], str]:
+    '''SQL страницы истории, его параметры и направление обхода индекса'''
+    params = {'chat_id': chat_id, 'limit': limit, 'cursor_id': after_id if after_id is not None else before_id}
+    
+    if after_id is not None:
+        cursor_condition = """AND (created_at, id) > (
+            COALESCE((SELECT created_at FROM chat_messages WHERE id = %(cursor_id)s), '-infinity'),
+            %(cursor_id)s)"""
+        order = 'ASC'
+    elif before_id is not None:
+        cursor_condition = """AND (created_at, id) < (
+            COALESCE((SELECT created_at FROM chat_messages WHERE id = %(cursor_id)s), '-infinity'),
+            %(cursor_id)s)"""
+        order = 'DESC'
+    else:
+        cursor_condition = ''
+        order = 'DESC'
+    
+    sql = f"""
+        SELECT id, role, content, timestamp, created_at
         FROM chat_messages
-        ORDER BY timestamp ASC
-        LIMIT 100
-    """)
+        WHERE {_history_scope(chat_id)} {cursor_condition}
+        ORDER BY created_at {order}, id {order}
+        LIMIT %(limit)s
+    """
+    return sql, params, order
+
+def get_messages(conn, chat_id: Optional[int] = None, before_id: Optional[int] = None,
+                 after_id: Optional[int] = None, limit: int = CHAT_HISTORY_PAGE_SIZE) -> List[Dict]:
+    '''
+    Страница истории одного чата в хронологическом порядке.
+    Без курсора — последние limit сообщений, before_id — более старые, after_id — более новые.
+    Курсор сравнивается по (created_at, id), страница — один проход по индексу
+    (chat_id, created_at, id). Удалённая очисткой строка-курсор старше всех оставшихся.
+    '''
+    sql, params, order = _history_page_query(chat_id, before_id, after_id, limit)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
     
     results = cursor.fetchall()
     cursor.close()
     
-    messages = []
-    for row in results:
-        messages.append({
-            'id': row[0],
-            'role': row[1],
-            'content': row[2],
-            'timestamp': row[3].isoformat() if row[3] else None
-        })
+    if order == 'DESC':
+        results.reverse()
     
-    return messages
+    return [_message_row(row) for row in results]
 
-def cleanup_old_messages(conn, days_to_keep: int = 1) -> int:
-    '''Удаляет старые сообщения'''
+def get_messages_json(conn, chat_id: Optional[int] = None, before_id: Optional[int] = None,
+                      after_id: Optional[int] = None, limit: int = CHAT_HISTORY_PAGE_SIZE) -> str:
+    '''Та же страница, что get_messages, готовым JSON из запроса: json_agg сразу в хронологическом порядке'''
+    sql, params, _ = _history_page_query(chat_id, before_id, after_id, limit)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT COALESCE(json_agg(json_build_object(
+            'id', page.id,
+            'role', page.role,
+            'content', page.content,
+            'timestamp', py_isoformat(page.timestamp)
+        ) ORDER BY page.created_at, page.id), '[]')::text
+        FROM ({sql}) page
+    """, params)
+    body = cursor.fetchone()[0]
+    cursor.close()
+    return body
+
+def get_latest_message_id(conn, chat_id: Optional[int] = None) -> Optional[int]:
+    '''Id самого нового сообщения чата: одна строка с конца индекса, без загрузки истории'''
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id FROM chat_messages
+        WHERE {_history_scope(chat_id)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1
+    """, {'chat_id': chat_id})
+    result = cursor.fetchone()
+    cursor.close()
+    return result[0] if result else None
+
+def get_history_etag(conn, chat_id: Optional[int] = None) -> str:
+    '''
+    Версия истории чата: число сообщений и max(id) по индексу, без чтения содержимого.
+    Сообщения не редактируются, так что новые строки и очистка всегда меняют версию.
+    '''
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT COUNT(*), COALESCE(MAX(id), 0) FROM chat_messages
+        WHERE {_history_scope(chat_id)}
+    """, {'chat_id': chat_id})
+    count, max_id = cursor.fetchone()
+    cursor.close()
+    return f'W/"chat-{"web" if chat_id is None else chat_id}-{count}-{max_id}"'
+
+def parse_history_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    '''Разбирает chat_id, before_id, after_id и limit из query string; ValueError на мусор'''
+    parsed: Dict[str, Any] = {}
+    for name in ('chat_id', 'before_id', 'after_id'):
+        value = params.get(name)
+        parsed[name] = int(value) if value not in (None, '') else None
+    if parsed['before_id'] is not None and parsed['after_id'] is not None:
+        raise ValueError('before_id и after_id нельзя указывать вместе')
+    limit = int(params.get('limit') or CHAT_HISTORY_PAGE_SIZE)
+    parsed['limit'] = max(1, min(limit, CHAT_HISTORY_MAX_PAGE_SIZE))
+    return parsed
+
+def save_messages(messages: List[Tuple[str, str]], conn, chat_id: Optional[int] = None) -> List[Dict]:
+    '''Сохраняет пары (role, content) одним многострочным INSERT; фиксирует транзакцию вызывающий'''
     cursor = conn.cursor()
     
-    cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-    
-    cursor.execute("""
-        DELETE FROM chat_messages
-        WHERE created_at < %s
-    """, (cutoff_date,))
+    results = execute_values(cursor, """
+        INSERT INTO chat_messages (role, content, chat_id)
+        VALUES %s
+        RETURNING id, role, content, timestamp
+    """, [(role, content, chat_id) for role, content in messages],
+        page_size=max(len(messages), 1), fetch=True)
     
-    deleted_count = cursor.rowcount
-    conn.commit()
     cursor.close()
+    results.sort(key=lambda row: row[0])
     
-    return deleted_count
+    return [_message_row(row) for row in results]
+
+def rollback_batch_item(conn, cursor) -> None:
+    '''
+    Откатывает записи упавшего сообщения пакета до его SAVEPOINT. Точки не отпускаются:
+    одноимённые допустимы, ROLLBACK TO берёт последнюю. Если по пути был коммит (сверка
+    версии индекса фиксирует транзакцию), точки уже нет — всё до коммита записано,
+    и откатывается только остаток транзакции этого сообщения.
+    '''
+    try:
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+    except psycopg2.Error:
+        conn.rollback()
 
-def save_message(role: str, content: str, conn) -> Dict:
-    '''Сохраняет сообщение в БД'''
+def answer_batch(items: List[Any], conn, chat_id: Optional[int] = None) -> List[Dict]:
+    '''
+    Отвечает на каждое сообщение пакета и сохраняет все пары одним INSERT в одной транзакции.
+    Ошибка в одном сообщении возвращается в его позиции и не ломает остальные: каждое
+    сообщение идёт под своим SAVEPOINT, и откат не трогает уже сделанные записи
+    предыдущих (store_response при RESPONSE_CACHE_SHARED).
+    '''
+    results: List[Dict] = []
+    rows: List[Tuple[str, str]] = []
+    answered_positions: List[int] = []
     cursor = conn.cursor()
     
-    cursor.execute("""
-        INSERT INTO chat_messages (role, content)
-        VALUES (%s, %s)
-        RETURNING id, role, content, timestamp
-    """, (role, content))
+    for item in items:
+        message = item.get('message') if isinstance(item, dict) else item
+        if not isinstance(message, str) or not message.strip():
+            results.append({'error': 'Сообщение не может быть пустым'})
+            continue
+        
+        message = message.strip()
+        cursor.execute("SAVEPOINT batch_item")
+        try:
+            ai_response = answer_message(message, conn)
+        except Exception as e:
+            rollback_batch_item(conn, cursor)
+            results.append({'error': str(e)})
+            continue
+        
+        answered_positions.append(len(results))
+        results.append({})
+        rows.append(('user', message))
+        rows.append(('assistant', ai_response))
     
-    result = cursor.fetchone()
-    conn.commit()
     cursor.close()
     
-    return {
-        'id': result[0],
-        'role': result[1],
-        'content': result[2],
-        'timestamp': result[3].isoformat() if result[3] else None
-    }
+    if rows:
+        with timed('save'):
+            saved = save_messages(rows, conn, chat_id)
+            conn.commit()
+        for pair, position in enumerate(answered_positions):
+            results[position] = {'user_message': saved[2 * pair], 'ai_response': saved[2 * pair + 1]}
+    
+    return results
+
+app = Router(allow_headers='Content-Type, X-Api-Key, If-None-Match')
+
+def check_api_key(request: Request) -> None:
+    '''Запрос без X-Api-Key — веб-чат; неизвестный или отозванный ключ — 401'''
+    api_key = request.header('X-Api-Key')
+    if api_key:
+        conn = request.conn
+        with timed('auth'):
+            key_id = validate_api_key(api_key, conn)
+        if key_id is None:
+            raise Unauthorized('Недействительный или отозванный API-ключ')
+
+@app.route('GET')
+def read_history(request: Request) -> Dict[str, Any]:
+    check_api_key(request)
+    conn = request.conn
+    
+    if request.query.get('export'):
+        # Выгрузка истории файлом: ?export=ndjson|csv&chat_id=&since=&until=&after_id=
+        try:
+            export_params = parse_export_params(request.query)
+        except ValueError as e:
+            raise BadRequest(f'Некорректные параметры выгрузки: {e}')
+        with timed('export'):
+            export = export_history(conn, **export_params)
+        return export_response(export, export_params['fmt'], export_params['chat_id'])
+    
+    try:
+        history = parse_history_params(request.query)
+    except ValueError as e:
+        raise BadRequest(f'Некорректные параметры истории: {e}')
+    
+    if request.query.get('poll'):
+        # Дешёвая проверка для фронтенда: есть ли что-то новее after_id, без самих сообщений
+        latest_id = get_latest_message_id(conn, history['chat_id'])
+        has_new = latest_id is not None and latest_id != history['after_id']
+        return json_response({'has_new': has_new, 'latest_id': latest_id})
+    
+    with timed('etag'):
+        etag = get_history_etag(conn, history['chat_id'])
+    if etag_matches(request.header('If-None-Match'), etag):
+        return not_modified(etag)
+    
+    with timed('history'):
+        if DB_JSON_RESPONSES:
+            return raw_json_response(get_messages_json(conn, **history), etag=etag)
+        messages = get_messages(conn, **history)
+    return json_response(messages, etag=etag)
+
+@app.route('POST')
+def post_message(request: Request) -> Dict[str, Any]:
+    check_api_key(request)
+    conn = request.conn
+    body_data = request.json()
+    
+    try:
+        chat_id = int(body_data['chat_id']) if body_data.get('chat_id') is not None else None
+    except (TypeError, ValueError):
+        raise BadRequest('chat_id должен быть числом')
+    
+    # Историю удаляет только cleanup-cron: сначала сверенный архив, потом удаление
+    if body_data.get('cleanup'):
+        raise HttpError('Очистка истории через чат отключена: её выполняет cleanup-cron с архивом', 410)
+    
+    if isinstance(body_data.get('expressions'), list):
+        try:
+            results = evaluate_batch(body_data['expressions'])
+        except ValueError as e:
+            raise BadRequest(str(e))
+        return json_response({'results': results})
+    
+    if isinstance(body_data.get('messages'), list):
+        items = body_data['messages']
+        if len(items) > CHAT_BATCH_MAX_MESSAGES:
+            raise BadRequest(f'Не больше {CHAT_BATCH_MAX_MESSAGES} сообщений за запрос')
+        return json_response({'results': answer_batch(items, conn, chat_id)})
+    
+    user_message = body_data.get('message', '').strip()
+    if not user_message:
+        raise BadRequest('Сообщение не может быть пустым')
+    
+    # Ответ считается до записи: обе строки сохраняются одним INSERT и одним коммитом,
+    # сбой генерации не оставляет в истории вопрос без ответа
+    ai_response = answer_message(user_message, conn)
+    with timed('save'):
+        user_msg, ai_msg = save_messages([('user', user_message), ('assistant', ai_response)], conn, chat_id)
+        conn.commit()
+    
+    return json_response({
+        'user_message': user_msg,
+        'ai_response': ai_msg
+    })
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -309,144 +607,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Args: event - HTTP запрос, context - контекст функции
     Returns: HTTP response с умным ответом
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Api-Key',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Database not configured'})
-        }
-    
-    conn = psycopg2.connect(database_url)
-    
-    headers = event.get('headers', {})
-    api_key = headers.get('X-Api-Key') or headers.get('x-api-key')
-    
-    if api_key:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id FROM api_keys 
-            WHERE key = %s AND key IS NOT NULL
-        """, (api_key,))
-        result = cursor.fetchone()
-        
-        if result:
-            cursor.execute("""
-                UPDATE api_keys 
-                SET last_used = CURRENT_TIMESTAMP 
-                WHERE id = %s
-            """, (result[0],))
-            conn.commit()
-        cursor.close()
-    
-    try:
-        if method == 'GET':
-            messages = get_messages(conn)
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps(messages)
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            
-            if body_data.get('cleanup'):
-                days_to_keep = body_data.get('days', 1)
-                deleted_count = cleanup_old_messages(conn, days_to_keep)
-                conn.close()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'success': True,
-                        'deleted_messages': deleted_count,
-                        'message': f'Удалено {deleted_count} сообщений старше {days_to_keep} дн.'
-                    })
-                }
-            
-            user_message = body_data.get('message', '').strip()
-            
-            if not user_message:
-                conn.close()
-                return {
-                    'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Сообщение не может быть пустым'})
-                }
-            
-            user_msg = save_message('user', user_message, conn)
-            
-            ai_response = generate_ai_response(user_message, conn)
-            ai_msg = save_message('assistant', ai_response, conn)
-            
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({
-                    'user_message': user_msg,
-                    'ai_response': ai_msg
-                })
-            }
-        
-        else:
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
-    
-    except Exception as e:
-        if conn:
-            conn.close()
-        
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+    return app.dispatch(event, context)
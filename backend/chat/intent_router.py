@@ -0,0 +1,66 @@
+import re
+from typing import NamedTuple, Set
+
+INTENT_MATH = 'math'
+INTENT_CREATOR = 'creator'
+INTENT_ENTITY = 'entity'
+
+FALLBACK_LUA_HELP = 'lua_help'
+FALLBACK_ROBLOX_HELP = 'roblox_help'
+FALLBACK_WEB = 'web'
+
+HELP_KEYWORDS = ['function', 'функция', 'table', 'таблица', 'loop', 'цикл',
+                 'roblox', 'script', 'game', 'workspace', 'part']
+
+# Одна альтернация литералов вместо цепочки `in`. Именованные группы и классы вроде \d
+# не используются: с ними re теряет быстрый поиск по первому символу.
+# Более длинные варианты стоят раньше, «кто создал» поглощает «создал».
+TOKEN_LABELS = {
+    'кто создал': 'creator_question',
+    'создал': 'created',
+    'madai': 'madai',
+    'автор': 'author',
+    'roblox': 'roblox',
+}
+TOKEN_LABELS.update({keyword: 'help' for keyword in HELP_KEYWORDS if keyword not in TOKEN_LABELS})
+TOKEN_LABELS.update({digit: 'digit' for digit in '0123456789'})
+
+ROUTER_PATTERN = re.compile('|'.join(re.escape(token) for token in TOKEN_LABELS))
+
+class Route(NamedTuple):
+    intent: str
+    creator: bool
+    fallback: str
+
+def scan_tokens(message_lower: str) -> Set[str]:
+    '''Один проход по тексту: множество сработавших меток'''
+    found = {TOKEN_LABELS[token] for token in ROUTER_PATTERN.findall(message_lower)}
+    if 'creator_question' in found:
+        found.add('created')
+    return found
+
+def route_message(message_lower: str) -> Route:
+    '''
+    Классифицирует сообщение: математика, вопрос о создателе или поиск сущности,
+    и заранее выбирает ответ на случай, если поиск ничего не найдёт.
+    Без цифр вычислять нечего, поэтому калькулятор вызывается только для INTENT_MATH;
+    creator проверяется и после неудачного вычисления.
+    '''
+    tokens = scan_tokens(message_lower)
+    creator = 'created' in tokens and 'madai' in tokens or 'creator_question' in tokens or 'author' in tokens
+    
+    if 'roblox' in tokens:
+        fallback = FALLBACK_ROBLOX_HELP
+    elif 'help' in tokens:
+        fallback = FALLBACK_LUA_HELP
+    else:
+        fallback = FALLBACK_WEB
+    
+    if 'digit' in tokens:
+        intent = INTENT_MATH
+    elif creator:
+        intent = INTENT_CREATOR
+    else:
+        intent = INTENT_ENTITY
+    
+    return Route(intent, creator, fallback)
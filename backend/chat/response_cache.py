@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from entity_index import reset_entity_index
+from runtime import annotate, log_stats
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_SHARED = os.environ.get('RESPONSE_CACHE_SHARED', 'false').lower() == 'true'
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '1024'))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '300'))
+RESPONSE_CACHE_VERSION_CHECK_SECONDS = float(os.environ.get('RESPONSE_CACHE_VERSION_CHECK_SECONDS', '10'))
+
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_query(message: str) -> str:
+    '''Ключ кеша: регистр, ё→е и пробелы не влияют на ответ'''
+    return WHITESPACE.sub(' ', message.casefold().replace('ё', 'е')).strip()
+
+def query_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    '''LRU с TTL для ответов чата в памяти тёплого контейнера'''
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: 'OrderedDict[str, Tuple[str, int, float]]' = OrderedDict()
+        self.stats: Dict[str, int] = {
+            'hits': 0, 'shared_hits': 0, 'misses': 0,
+            'evictions': 0, 'expirations': 0, 'invalidations': 0
+        }
+    
+    def get(self, key: str, version: int) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        response, entry_version, expires_at = entry
+        if entry_version != version or expires_at <= time.monotonic():
+            del self.entries[key]
+            self.stats['expirations' if entry_version == version else 'invalidations'] += 1
+            return None
+        self.entries.move_to_end(key)
+        return response
+    
+    def put(self, key: str, version: int, response: str) -> None:
+        self.entries[key] = (response, version, time.monotonic() + self.ttl_seconds)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    def clear(self) -> None:
+        self.stats['invalidations'] += len(self.entries)
+        self.entries.clear()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['shared_hits'] + self.stats['misses']
+        hit_ratio = (self.stats['hits'] + self.stats['shared_hits']) / lookups if lookups else 0.0
+        return {**self.stats, 'size': len(self.entries), 'hit_ratio': round(hit_ratio, 4)}
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+log_stats('response_cache', response_cache.snapshot)
+_knowledge_version: Optional[int] = None
+_knowledge_version_checked_at = 0.0
+
+def get_knowledge_version(conn) -> int:
+    '''
+    Версия базы знаний из content_versions; add_lua_knowledge и сидирование её
+    увеличивают. Сверяется не чаще раза в RESPONSE_CACHE_VERSION_CHECK_SECONDS —
+    это и есть верхняя граница устаревания кеша после изменения базы знаний.
+    '''
+    global _knowledge_version, _knowledge_version_checked_at
+    
+    now = time.monotonic()
+    if _knowledge_version is not None and now - _knowledge_version_checked_at < RESPONSE_CACHE_VERSION_CHECK_SECONDS:
+        return _knowledge_version
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM content_versions WHERE name = 'lua_knowledge'")
+    result = cursor.fetchone()
+    cursor.close()
+    
+    version = result[0] if result else 0
+    if _knowledge_version is not None and version != _knowledge_version:
+        # Иначе ответ, собранный по старому индексу сущностей, попал бы в кеш под новой версией
+        response_cache.clear()
+        reset_entity_index()
+    _knowledge_version = version
+    _knowledge_version_checked_at = now
+    return version
+
+def lookup_response(message: str, conn) -> Tuple[str, int, Optional[str]]:
+    '''Возвращает (ключ, версия, ответ или None); при промахе в памяти смотрит общий кеш в БД'''
+    key = query_key(normalize_query(message))
+    version = get_knowledge_version(conn)
+    
+    response = response_cache.get(key, version)
+    if response is not None:
+        response_cache.stats['hits'] += 1
+        annotate('response_cache', 'hit')
+        return key, version, response
+    
+    if RESPONSE_CACHE_SHARED:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT response FROM response_cache
+            WHERE query_key = %s AND kb_version = %s
+              AND created_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+        """, (key, version, RESPONSE_CACHE_TTL_SECONDS))
+        result = cursor.fetchone()
+        cursor.close()
+        
+        if result:
+            response_cache.put(key, version, result[0])
+            response_cache.stats['shared_hits'] += 1
+            annotate('response_cache', 'shared_hit')
+            return key, version, result[0]
+    
+    response_cache.stats['misses'] += 1
+    annotate('response_cache', 'miss')
+    return key, version, None
+
+def store_response(key: str, version: int, response: str, conn) -> None:
+    '''Кладёт ответ в кеш; запись в общий кеш фиксируется вместе с транзакцией вызывающего'''
+    response_cache.put(key, version, response)
+    
+    if RESPONSE_CACHE_SHARED:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO response_cache (query_key, kb_version, response)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (query_key) DO UPDATE
+            SET kb_version = EXCLUDED.kb_version,
+                response = EXCLUDED.response,
+                created_at = CURRENT_TIMESTAMP
+        """, (key, version, response))
+        cursor.close()
@@ -1,17 +1,61 @@
-import json
 import os
-import psycopg2
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from datetime import datetime, timedelta
+from message_archive import CHAT_ARCHIVE_DIR, archive_partition, archive_target_problem
+from message_purge import messages_partitioned, purge_old_messages
+from runtime import Router, Request, json_response, pool_stats, timed, annotate
 
-def cleanup_old_messages(conn, days_to_keep: int = 1) -> int:
-    '''Удаляет сообщения старше указанного количества дней'''
+CHAT_PARTITION_DAYS_AHEAD = int(os.environ.get('CHAT_PARTITION_DAYS_AHEAD', '7'))
+CHAT_PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get('CHAT_PARTITION_LOCK_TIMEOUT_MS', '2000'))
+# Явный отказ от срока хранения: история не архивируется и не удаляется, и cron не считает это сбоем
+CHAT_RETENTION_ENABLED = os.environ.get('CHAT_RETENTION_ENABLED', 'true').lower() == 'true'
+
+def ensure_message_partitions(conn, days_ahead: int = CHAT_PARTITION_DAYS_AHEAD) -> int:
+    '''Заводит дневные секции chat_messages на days_ahead дней вперёд; возвращает число новых'''
     cursor = conn.cursor()
+    cursor.execute("SELECT ensure_chat_message_partitions(%s)", (days_ahead,))
+    created = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return created
+
+def cleanup_old_messages(conn, archive_dir: str, days_to_keep: int = 1) -> List[Tuple[str, int]]:
+    '''
+    Удаляет сообщения старше days_to_keep дней целыми дневными секциями: DETACH и DROP
+    стоят одинаково при любом объёме. Секция уходит, когда вся она старше срока, так что
+    сообщение живёт от days_to_keep до days_to_keep + 1 дня. Каждая секция сначала
+    выгружается в archive_dir и удаляется только после сверки архива; секция, которую
+    не удалось сверить или заблокировать, остаётся до следующего запуска.
+    Возвращает (секция, строк в архиве).
+    '''
+    cursor = conn.cursor()
+    cursor.execute("SELECT partition_name FROM expired_chat_message_partitions(%s * INTERVAL '1 day')",
+                   (days_to_keep,))
+    expired = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    cursor.close()
     
-    cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+    retired = []
+    archived = []
+    for partition in expired:
+        result = archive_partition(conn, partition, days_to_keep, CHAT_PARTITION_LOCK_TIMEOUT_MS, archive_dir)
+        archived.append(result)
+        if result['status'] == 'retired':
+            retired.append((partition, result['rows']))
+        elif result['status'] == 'busy':
+            break
+    if archived:
+        annotate('message_archive', archived)
+    return retired
+
+def cleanup_response_cache(conn, hours_to_keep: int = 24) -> int:
+    '''Удаляет устаревшие записи общего кеша ответов чата'''
+    cursor = conn.cursor()
+    
+    cutoff_date = datetime.now() - timedelta(hours=hours_to_keep)
     
     cursor.execute("""
-        DELETE FROM chat_messages
+        DELETE FROM response_cache
         WHERE created_at < %s
     """, (cutoff_date,))
     
@@ -21,55 +65,62 @@ def cleanup_old_messages(conn, days_to_keep: int = 1) -> int:
     
     return deleted_count
 
+app = Router()
+
+@app.route('*')
+def run_cleanup(request: Request) -> Dict[str, Any]:
+    # Удаляем сообщения старше 1 дня
+    conn = request.conn
+    created_partitions = 0
+    retired: List[Tuple[str, int]] = []
+    purge = None
+    partitioned = messages_partitioned(conn)
+    
+    if partitioned:
+        with timed('partitions'):
+            created_partitions = ensure_message_partitions(conn)
+    
+    # История удаляется только после сверенного архива в постоянном хранилище. Без него
+    # сообщения копятся, поэтому cron отвечает 503, пока не задан CHAT_ARCHIVE_DIR или
+    # срок хранения не отключён явно через CHAT_RETENTION_ENABLED=false
+    retention_problem = archive_target_problem(CHAT_ARCHIVE_DIR) if CHAT_RETENTION_ENABLED else None
+    if CHAT_RETENTION_ENABLED and not retention_problem:
+        # С секциями срок хранения держат DETACH/DROP, а пачками дочищается только секция
+        # по умолчанию; без секций (до V0012) пачками чистится вся история
+        if partitioned:
+            with timed('messages'):
+                retired = cleanup_old_messages(conn, CHAT_ARCHIVE_DIR, days_to_keep=1)
+        with timed('purge'):
+            purge = purge_old_messages(conn, days_to_keep=1,
+                                       table='chat_messages_default' if partitioned else 'chat_messages',
+                                       archive_dir=CHAT_ARCHIVE_DIR)
+        annotate('message_purge', purge)
+    else:
+        annotate('message_retention', {'skipped': retention_problem or 'disabled'})
+    
+    with timed('cache'):
+        deleted_cache_entries = cleanup_response_cache(conn)
+    
+    deleted_count = sum(rows for _, rows in retired) + (purge['deleted'] if purge else 0)
+    return json_response({
+        'success': retention_problem is None,
+        'deleted_messages': deleted_count,
+        'retired_partitions': [name for name, _ in retired],
+        'created_partitions': created_partitions,
+        'purge': purge,
+        'retention_enabled': CHAT_RETENTION_ENABLED,
+        'retention_skipped': retention_problem,
+        'deleted_cache_entries': deleted_cache_entries,
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': dict(pool_stats),
+        'message': f'Автоочистка истории не выполнена: {retention_problem}' if retention_problem
+                   else f'Автоочистка: удалено {deleted_count} сообщений'
+    }, 503 if retention_problem else 200)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Автоматическая очистка старых сообщений по расписанию
     Args: event - триггер от cron, context - контекст функции
     Returns: HTTP response с результатом очистки
     '''
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Database not configured'})
-        }
-    
-    conn = psycopg2.connect(database_url)
-    
-    try:
-        # Удаляем сообщения старше 1 дня
-        deleted_count = cleanup_old_messages(conn, days_to_keep=1)
-        conn.close()
-        
-        result = {
-            'success': True,
-            'deleted_messages': deleted_count,
-            'timestamp': datetime.now().isoformat(),
-            'message': f'Автоочистка: удалено {deleted_count} сообщений'
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps(result)
-        }
-    
-    except Exception as e:
-        if conn:
-            conn.close()
-        
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
+    return app.dispatch(event, context)
@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import psycopg2
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+CHAT_ARCHIVE_DIR = os.environ.get('CHAT_ARCHIVE_DIR', '')
+CHAT_ARCHIVE_ITERSIZE = int(os.environ.get('CHAT_ARCHIVE_ITERSIZE', '2000'))
+CHAT_ARCHIVE_COMPRESSLEVEL = int(os.environ.get('CHAT_ARCHIVE_COMPRESSLEVEL', '6'))
+
+PARTITION_NAME = re.compile(r'^chat_messages_p\d{8}$')
+
+# Строка архива — row_to_json(m) как есть: формат полей и дат задаёт Postgres, и ту же
+# строку база хеширует при сверке удаляемых строк. Контрольная сумма — сумма первых
+# 64 бит md5 каждой строки: не зависит от порядка и считается за один проход.
+ROW_HASH_SQL = "('x' || left(md5(row_to_json({alias})::text), 16))::bit(64)::bigint"
+
+class ArchiveVerificationError(Exception):
+    '''Архив не совпал с удаляемыми строками по числу строк или контрольной сумме'''
+
+def archive_target_problem(archive_dir: str) -> Optional[str]:
+    '''
+    Почему archive_dir не годится для архива, или None. Нужен явно заданный абсолютный
+    путь к уже существующему каталогу вне временного каталога функции — смонтированный
+    бакет или том: архив в /tmp пропадает вместе с экземпляром, и удаление после него
+    ничего не защищает. Каталог не создаётся, чтобы не подменить несмонтированный том.
+    '''
+    if not archive_dir:
+        return 'CHAT_ARCHIVE_DIR не задан'
+    if not os.path.isabs(archive_dir):
+        return f'CHAT_ARCHIVE_DIR должен быть абсолютным путём: {archive_dir}'
+    real_dir = os.path.realpath(archive_dir)
+    for temp_dir in {tempfile.gettempdir(), '/tmp'}:
+        temp_dir = os.path.realpath(temp_dir)
+        if real_dir == temp_dir or real_dir.startswith(temp_dir + os.sep):
+            return f'CHAT_ARCHIVE_DIR во временном каталоге функции: {archive_dir}'
+    if not os.path.isdir(archive_dir):
+        return f'каталог CHAT_ARCHIVE_DIR не существует: {archive_dir}'
+    return None
+
+def row_hash(line: bytes) -> int:
+    return int.from_bytes(hashlib.md5(line).digest()[:8], 'big', signed=True)
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_archive(stream, archive_dir: str, name: str) -> Dict[str, Any]:
+    '''
+    Пишет строки курсора (id, row_to_json) в archive_dir/name.ndjson.gz.part по мере чтения:
+    в памяти только очередная порция itersize. Возвращает манифест с числом строк,
+    контрольной суммой и диапазоном id — по нему сверяются файл и удаляемые строки.
+    '''
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.ndjson.gz')
+    rows = 0
+    checksum = 0
+    first_id: Optional[int] = None
+    last_id: Optional[int] = None
+    
+    with gzip.open(path + '.part', 'wb', compresslevel=CHAT_ARCHIVE_COMPRESSLEVEL) as f:
+        for row_id, line in stream:
+            encoded = line.encode('utf-8')
+            f.write(encoded)
+            f.write(b'\n')
+            rows += 1
+            checksum += row_hash(encoded)
+            if first_id is None:
+                first_id = row_id
+            last_id = row_id
+    
+    return {
+        'file': os.path.basename(path),
+        'path': path,
+        'rows': rows,
+        'checksum': checksum,
+        'first_id': first_id,
+        'last_id': last_id
+    }
+
+def verify_archive(manifest: Dict[str, Any]) -> None:
+    '''Перечитывает записанный .part и сверяет число строк и контрольную сумму с манифестом'''
+    rows = 0
+    checksum = 0
+    with gzip.open(manifest['path'] + '.part', 'rb') as f:
+        for line in f:
+            rows += 1
+            checksum += row_hash(line.rstrip(b'\n'))
+    if rows != manifest['rows'] or checksum != manifest['checksum']:
+        raise ArchiveVerificationError(
+            f"{manifest['file']}: в файле {rows} строк, ожидалось {manifest['rows']}"
+            if rows != manifest['rows'] else f"{manifest['file']}: контрольная сумма файла не совпала"
+        )
+
+def publish_archive(manifest: Dict[str, Any]) -> None:
+    '''
+    Переименовывает сверенный .part в итоговый файл и кладёт рядом name.manifest.json.
+    Публикация идёт до коммита удаления: сбой между ними оставит строки в базе и архив
+    на диске, следующий запуск перезапишет или продублирует его, но не потеряет строки.
+    '''
+    path = manifest['path']
+    os.replace(path + '.part', path)
+    record = {key: value for key, value in manifest.items() if key != 'path'}
+    record['checksum'] = str(manifest['checksum'])
+    record['bytes'] = os.path.getsize(path)
+    record['sha256'] = _file_sha256(path)
+    record['archived_at'] = datetime.now().isoformat()
+    manifest_path = path[:-len('.ndjson.gz')] + '.manifest.json'
+    with open(manifest_path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(manifest_path + '.part', manifest_path)
+
+def discard_archive(manifest: Optional[Dict[str, Any]]) -> None:
+    if manifest and os.path.exists(manifest['path'] + '.part'):
+        os.remove(manifest['path'] + '.part')
+
+def archive_partition(conn, partition: str, days_to_keep: int, lock_timeout_ms: int,
+                      archive_dir: str) -> Dict[str, Any]:
+    '''
+    Архивирует устаревшую секцию и удаляет её в одной транзакции. SHARE-блокировка секции
+    не даёт изменить её строки между выгрузкой и DROP, а вставки в текущие секции не задевает.
+    Секция удаляется, только если перечитанный файл сошёлся с выгрузкой; иначе остаётся
+    до следующего запуска. Возвращает манифест и статус: retired / busy / mismatch,
+    при mismatch — с причиной в error.
+    '''
+    if not PARTITION_NAME.match(partition):
+        raise ValueError(f'{partition} не похожа на дневную секцию chat_messages')
+    
+    cursor = conn.cursor()
+    manifest = None
+    error = None
+    try:
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", (f'{lock_timeout_ms}ms',))
+        cursor.execute(f'LOCK TABLE {partition} IN SHARE MODE')
+        
+        stream = conn.cursor(name=f'archive_{partition}')
+        stream.itersize = CHAT_ARCHIVE_ITERSIZE
+        stream.execute(f'SELECT m.id, row_to_json(m)::text FROM {partition} m ORDER BY m.id')
+        manifest = write_archive(stream, archive_dir, partition)
+        stream.close()
+        verify_archive(manifest)
+        publish_archive(manifest)
+        
+        cursor.execute("""
+            SELECT partition_name, estimated_rows
+            FROM retire_chat_message_partitions(%s * INTERVAL '1 day', %s, %s)
+        """, (days_to_keep, lock_timeout_ms, partition))
+        retired = cursor.fetchall()
+        conn.commit()
+        status = 'retired' if retired else 'busy'
+    except ArchiveVerificationError as e:
+        conn.rollback()
+        discard_archive(manifest)
+        error = str(e)
+        status = 'mismatch'
+    except psycopg2.errors.LockNotAvailable:
+        conn.rollback()
+        discard_archive(manifest)
+        status = 'busy'
+    except Exception:
+        conn.rollback()
+        discard_archive(manifest)
+        raise
+    finally:
+        cursor.close()
+    
+    return {
+        'partition': partition,
+        'status': status,
+        'rows': manifest['rows'] if manifest else 0,
+        'file': manifest['file'] if manifest and status != 'mismatch' else None,
+        'error': error
+    }
+
+def archive_and_delete_chunk(conn, table: str, cutoff, after_id: int, chunk_rows: int,
+                             archive_dir: str) -> Dict[str, Any]:
+    '''
+    Одна пачка purge с архивом: строки пачки блокируются FOR UPDATE и выгружаются через
+    именованный курсор, файл перечитывается и сверяется, затем DELETE возвращает число и
+    контрольную сумму реально удалённых строк. Любое расхождение — откат транзакции и
+    ArchiveVerificationError, строки остаются в базе. Коммит — на вызывающем.
+    '''
+    name = f"{table}-{cutoff.strftime('%Y%m%d%H%M%S')}-after{after_id}"
+    manifest = None
+    try:
+        stream = conn.cursor(name=f'archive_{table}_chunk')
+        stream.itersize = CHAT_ARCHIVE_ITERSIZE
+        stream.execute(f"""
+            SELECT m.id, row_to_json(m)::text FROM {table} m
+            WHERE m.created_at < %(cutoff)s AND m.id > %(after_id)s
+            ORDER BY m.id
+            LIMIT %(chunk)s
+            FOR UPDATE
+        """, {'cutoff': cutoff, 'after_id': after_id, 'chunk': chunk_rows})
+        manifest = write_archive(stream, archive_dir, name)
+        stream.close()
+        if manifest['rows'] == 0:
+            discard_archive(manifest)
+            return manifest
+        
+        verify_archive(manifest)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            WITH gone AS (
+                DELETE FROM {table} m
+                WHERE m.created_at < %(cutoff)s AND m.id BETWEEN %(first_id)s AND %(last_id)s
+                RETURNING {ROW_HASH_SQL.format(alias='m')} AS hash
+            )
+            SELECT COUNT(*), COALESCE(SUM(hash), 0) FROM gone
+        """, {'cutoff': cutoff, 'first_id': manifest['first_id'], 'last_id': manifest['last_id']})
+        deleted, checksum = cursor.fetchone()
+        cursor.close()
+        if deleted != manifest['rows'] or checksum != manifest['checksum']:
+            raise ArchiveVerificationError(
+                f"{manifest['file']}: удаляется {deleted} строк, в архиве {manifest['rows']}"
+                if deleted != manifest['rows'] else f"{manifest['file']}: контрольная сумма удаляемых строк не совпала"
+            )
+        publish_archive(manifest)
+    except Exception:
+        conn.rollback()
+        discard_archive(manifest)
+        raise
+    return manifest
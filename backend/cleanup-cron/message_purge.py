@@ -0,0 +1,131 @@
+import os
+import time
+import psycopg2
+from typing import Dict, Any, Optional
+from message_archive import ArchiveVerificationError, archive_and_delete_chunk
+from runtime import annotate
+
+CLEANUP_PURGE_CHUNK_ROWS = int(os.environ.get('CLEANUP_PURGE_CHUNK_ROWS', '5000'))
+CLEANUP_PURGE_BUDGET_SECONDS = float(os.environ.get('CLEANUP_PURGE_BUDGET_SECONDS', '20'))
+CLEANUP_BACKLOG_COUNT_LIMIT = int(os.environ.get('CLEANUP_BACKLOG_COUNT_LIMIT', '100000'))
+
+# Таблицы, которые умеет чистить purge: вся история или только секция по умолчанию
+PURGE_TABLES = ('chat_messages', 'chat_messages_default')
+
+# Очередная пачка — самые старые по id строки до срока; id > after_id не даёт
+# заново проходить по индексу, где уже лежат удалённые в этом запуске строки
+CHUNK_SQL = """
+    WITH doomed AS (
+        SELECT id FROM {table}
+        WHERE created_at < %(cutoff)s AND id > %(after_id)s
+        ORDER BY id
+        LIMIT %(chunk)s
+    )
+    DELETE FROM {table} m
+    USING doomed
+    WHERE m.id = doomed.id AND m.created_at < %(cutoff)s
+    RETURNING m.id
+"""
+
+def messages_partitioned(conn) -> bool:
+    '''Применена ли V0012: до неё chat_messages — обычная таблица и срок хранения держит только purge'''
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'chat_messages'::regclass)
+    """)
+    partitioned = cursor.fetchone()[0]
+    cursor.close()
+    conn.commit()
+    return partitioned
+
+def count_backlog(conn, table: str, cutoff) -> Dict[str, Any]:
+    '''Сколько строк старше срока осталось; считается не дальше CLEANUP_BACKLOG_COUNT_LIMIT'''
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM {table} WHERE created_at < %s LIMIT %s
+        ) backlog
+    """, (cutoff, CLEANUP_BACKLOG_COUNT_LIMIT))
+    backlog = cursor.fetchone()[0]
+    cursor.close()
+    conn.commit()
+    return {'backlog': backlog, 'backlog_capped': backlog >= CLEANUP_BACKLOG_COUNT_LIMIT}
+
+def purge_old_messages(conn, days_to_keep: int = 1, table: str = 'chat_messages',
+                       budget_seconds: float = CLEANUP_PURGE_BUDGET_SECONDS,
+                       chunk_rows: int = CLEANUP_PURGE_CHUNK_ROWS,
+                       archive_dir: Optional[str] = None) -> Dict[str, Any]:
+    '''
+    Удаляет сообщения старше days_to_keep дней пачками по chunk_rows в порядке id,
+    с коммитом после каждой: блокировки строк и WAL одной транзакции ограничены пачкой.
+    Останавливается, когда следующая пачка не укладывается в budget_seconds, — остаток
+    (backlog) дочистит следующий запуск cron. Каждая пачка ограничена statement_timeout
+    по оставшемуся бюджету, так что зависшая пачка не выводит функцию за таймаут.
+    С archive_dir каждая пачка сначала уходит в сверенный архив (message_archive);
+    несовпадение архива останавливает purge со stopped='mismatch' и причиной в error,
+    строки остаются.
+    '''
+    if table not in PURGE_TABLES:
+        raise ValueError(f'purge не работает с таблицей {table}')
+    
+    started = time.monotonic()
+    cursor = conn.cursor()
+    cursor.execute("SELECT LOCALTIMESTAMP - %s * INTERVAL '1 day'", (days_to_keep,))
+    cutoff = cursor.fetchone()[0]
+    conn.commit()
+    
+    deleted = 0
+    chunks = 0
+    after_id = 0
+    slowest_chunk = 0.0
+    stopped = 'done'
+    error = None
+    sql = CHUNK_SQL.format(table=table)
+    
+    while True:
+        remaining = budget_seconds - (time.monotonic() - started)
+        if remaining <= slowest_chunk:
+            stopped = 'budget'
+            break
+        
+        chunk_started = time.monotonic()
+        try:
+            cursor.execute("SET LOCAL statement_timeout = %s", (max(1, int(remaining * 1000)),))
+            if archive_dir:
+                manifest = archive_and_delete_chunk(conn, table, cutoff, after_id, chunk_rows, archive_dir)
+                rows, last_id = manifest['rows'], manifest['last_id']
+            else:
+                cursor.execute(sql, {'cutoff': cutoff, 'after_id': after_id, 'chunk': chunk_rows})
+                ids = [row[0] for row in cursor.fetchall()]
+                rows, last_id = len(ids), max(ids, default=None)
+            conn.commit()
+        except psycopg2.errors.QueryCanceled:
+            conn.rollback()
+            stopped = 'timeout'
+            break
+        except ArchiveVerificationError as e:
+            error = str(e)
+            annotate('archive_error', {'table': table, 'error': error})
+            stopped = 'mismatch'
+            break
+        slowest_chunk = max(slowest_chunk, time.monotonic() - chunk_started)
+        
+        if rows:
+            chunks += 1
+            deleted += rows
+            after_id = last_id
+        if rows < chunk_rows:
+            break
+    
+    cursor.close()
+    elapsed = time.monotonic() - started
+    return {
+        'table': table,
+        'deleted': deleted,
+        'chunks': chunks,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(deleted / elapsed, 1) if elapsed > 0 else None,
+        'stopped': stopped,
+        'error': error,
+        **count_backlog(conn, table, cutoff)
+    }
@@ -0,0 +1,22 @@
+class HttpError(Exception):
+    '''Ошибка, которую роутер превращает в JSON-ответ с этим статусом и сообщением'''
+    
+    status_code = 500
+    
+    def __init__(self, message: str, status_code: int = 0):
+        super().__init__(message)
+        self.message = message
+        if status_code:
+            self.status_code = status_code
+
+class BadRequest(HttpError):
+    status_code = 400
+
+class Unauthorized(HttpError):
+    status_code = 401
+
+class NotFound(HttpError):
+    status_code = 404
+
+class MethodNotAllowed(HttpError):
+    status_code = 405
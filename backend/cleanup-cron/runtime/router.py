@@ -0,0 +1,105 @@
+import json
+import os
+from typing import Dict, Any, Callable, Optional
+from .db import acquire_connection, release_connection
+from .errors import HttpError, BadRequest, MethodNotAllowed
+from .responses import compress_response, error_response, get_header, preflight_response
+from .timing import Timings, start_request, finish_request, timed
+
+class Request:
+    '''Разобранный event; соединение с БД берётся из пула при первом обращении к conn'''
+    
+    def __init__(self, event: Dict[str, Any], context: Any, database_url: str):
+        self.event = event
+        self.context = context
+        self.method: str = event.get('httpMethod', 'GET')
+        self.query: Dict[str, Any] = event.get('queryStringParameters') or {}
+        self.database_url = database_url
+        self._conn = None
+    
+    def header(self, name: str) -> Optional[str]:
+        return get_header(self.event, name)
+    
+    def json(self) -> Any:
+        try:
+            return json.loads(self.event.get('body') or '{}')
+        except json.JSONDecodeError:
+            raise BadRequest('Некорректный JSON в теле запроса')
+    
+    @property
+    def conn(self):
+        if self._conn is None:
+            with timed('connect'):
+                self._conn = acquire_connection(self.database_url)
+        return self._conn
+    
+    def release(self) -> None:
+        if self._conn is not None:
+            release_connection(self._conn)
+            self._conn = None
+
+class Router:
+    '''
+    Общий каркас обработчика: CORS-preflight, проверка DATABASE_URL, выбор функции
+    по методу, соединение из пула, сжатие ответа и единое отображение ошибок.
+    HttpError превращается в ответ со своим статусом, прочие исключения — в 500.
+    Каждый ответ несёт Server-Timing с этапами из timed() и общим временем.
+    '''
+    
+    def __init__(self, allow_headers: str = 'Content-Type'):
+        self.allow_headers = allow_headers
+        self.routes: Dict[str, Callable[[Request], Dict[str, Any]]] = {}
+    
+    def route(self, *methods: str) -> Callable:
+        '''Регистрирует функцию для методов; '*' — для любого метода (cron-триггер приходит без httpMethod)'''
+        def register(fn: Callable[[Request], Dict[str, Any]]) -> Callable[[Request], Dict[str, Any]]:
+            for method in methods:
+                self.routes[method] = fn
+            return fn
+        return register
+    
+    def find_route(self, method: str) -> Callable[[Request], Dict[str, Any]]:
+        route = self.routes.get(method) or self.routes.get('*')
+        if route is None:
+            raise MethodNotAllowed('Method not allowed')
+        return route
+    
+    def allowed_methods(self) -> str:
+        methods = [method for method in self.routes if method != '*'] or ['GET', 'POST']
+        return ', '.join(methods + ['OPTIONS'])
+    
+    def dispatch(self, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        timings = start_request()
+        if timings is None:
+            return compress_response(event, self._dispatch(event, context))
+        
+        response = self._dispatch(event, context, timings)
+        with timings.stage('gzip'):
+            response = compress_response(event, response)
+        return finish_request(timings, response, context)
+    
+    def _dispatch(self, event: Dict[str, Any], context: Any, timings: Optional[Timings] = None) -> Dict[str, Any]:
+        method = event.get('httpMethod', 'GET')
+        if method == 'OPTIONS' and 'OPTIONS' not in self.routes:
+            return preflight_response(self.allowed_methods(), self.allow_headers)
+        
+        try:
+            route = self.find_route(method)
+        except MethodNotAllowed as e:
+            return error_response(e.status_code, e.message)
+        if timings is not None:
+            timings.route = route.__name__
+        
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            return error_response(500, 'Database not configured')
+        
+        request = Request(event, context, database_url)
+        try:
+            return route(request)
+        except HttpError as e:
+            return error_response(e.status_code, e.message)
+        except Exception as e:
+            return error_response(500, str(e))
+        finally:
+            request.release()
@@ -0,0 +1,28 @@
+'''
+Полнотекстовый отбор и ранжирование статей базы знаний Lua. Одни и те же фрагменты SQL
+собирают ответ чата (retrieve_candidates) и поиск ?q= функции lua-knowledge, поэтому
+обе выдачи ранжируют статьи одинаково.
+'''
+from typing import Dict, Any
+
+# Все слова запроса (AND) для отбора и любое из них (OR) для ранжирования;
+# plainto_tsquery с константным конфигом сворачивается планировщиком в константу
+ALL_TERMS_SQL = "(plainto_tsquery('russian', %(query)s) || plainto_tsquery('simple', %(query)s))"
+ANY_TERMS_SQL = f"replace({ALL_TERMS_SQL}::text, ' & ', ' | ')::tsquery"
+
+# Точное совпадение темы, затем подстрока, затем остальное; внутри ранга — ts_rank + similarity
+LUA_KNOWLEDGE_RANK_SQL = "CASE WHEN LOWER(topic) = %(query)s THEN 1 WHEN LOWER(topic) LIKE %(pattern)s THEN 2 ELSE 3 END"
+LUA_KNOWLEDGE_SCORE_SQL = f"ts_rank(search_vector, {ANY_TERMS_SQL}) + similarity(LOWER(topic), %(query)s)"
+LUA_KNOWLEDGE_MATCH_SQL = f"""keywords && %(keywords)s::text[]
+           OR LOWER(topic) LIKE %(pattern)s
+           OR LOWER(description) LIKE %(pattern)s
+           OR search_vector @@ {ALL_TERMS_SQL}"""
+
+def search_params(query: str) -> Dict[str, Any]:
+    '''
+    Параметры фрагментов выше: запрос в нижнем регистре, шаблон подстроки и слова для keywords.
+    % и _ из запроса в шаблоне экранированы: LIKE ищет ту же подстроку, что `in` в Python.
+    '''
+    query_lower = query.lower()
+    literal = query_lower.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return {'query': query_lower, 'pattern': f'%{literal}%', 'keywords': query_lower.split()}
@@ -1,7 +1,16 @@
+import base64
+import gzip
 import json
 import os
-import psycopg2
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Optional, Sequence
+from runtime import (
+    Router, Request, HttpError, BadRequest, NotFound, DB_JSON_RESPONSES, json_response, raw_json_response, not_modified,
+    etag_matches, timed, annotate
+)
+from runtime.search import (
+    ANY_TERMS_SQL, LUA_KNOWLEDGE_MATCH_SQL, LUA_KNOWLEDGE_RANK_SQL, LUA_KNOWLEDGE_SCORE_SQL, search_params
+)
+from knowledge_import import IMPORT_FORMATS, ImportFormatError, bulk_import_knowledge, iter_csv, iter_ndjson, open_import_body
 
 def get_all_lua_knowledge(conn) -> List[Dict]:
     cursor = conn.cursor()
@@ -28,12 +37,195 @@ def get_all_lua_knowledge(conn) -> List[Dict]:
     
     return knowledge
 
+def get_all_lua_knowledge_json(conn) -> str:
+    '''Весь список, как get_all_lua_knowledge, но готовым JSON из запроса — без словарей и json.dumps'''
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COALESCE(json_agg(json_build_object(
+            'id', id,
+            'category', category,
+            'topic', topic,
+            'description', description,
+            'code_example', code_example,
+            'explanation', explanation,
+            'keywords', COALESCE(keywords, '{}')
+        ) ORDER BY category, topic), '[]')::text
+        FROM lua_knowledge_base
+    """)
+    body = cursor.fetchone()[0]
+    cursor.close()
+    return body
+
+KNOWLEDGE_FIELDS = ('id', 'category', 'topic', 'description', 'code_example', 'explanation', 'keywords', 'is_roblox')
+DEFAULT_KNOWLEDGE_FIELDS = ('id', 'category', 'topic', 'description', 'code_example', 'explanation', 'keywords')
+LISTING_PARAMS = ('fields', 'category', 'is_roblox', 'cursor', 'limit')
+LUA_KB_PAGE_SIZE = int(os.environ.get('LUA_KB_PAGE_SIZE', '50'))
+LUA_KB_MAX_PAGE_SIZE = int(os.environ.get('LUA_KB_MAX_PAGE_SIZE', '200'))
+
+def parse_fields(value: Optional[str]) -> Tuple[str, ...]:
+    '''fields=id,category,topic → кортеж колонок из белого списка; id отдаётся всегда'''
+    if not value:
+        return DEFAULT_KNOWLEDGE_FIELDS
+    fields = ['id']
+    for name in value.split(','):
+        name = name.strip()
+        if name not in KNOWLEDGE_FIELDS:
+            raise ValueError(f'неизвестное поле {name}')
+        if name not in fields:
+            fields.append(name)
+    return tuple(fields)
+
+def encode_cursor(row: Tuple[str, str, int]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(row, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    try:
+        category, topic, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(category), str(topic), int(row_id)
+    except Exception:
+        raise ValueError('некорректный cursor')
+
+def _knowledge_row(fields: Tuple[str, ...], row: Sequence) -> Dict:
+    item = dict(zip(fields, row))
+    if 'keywords' in item:
+        item['keywords'] = item['keywords'] or []
+    return item
+
+def list_lua_knowledge(conn, fields: Tuple[str, ...] = DEFAULT_KNOWLEDGE_FIELDS, category: Optional[str] = None,
+                       is_roblox: Optional[bool] = None, after: Optional[Tuple[str, str, int]] = None,
+                       limit: int = LUA_KB_PAGE_SIZE) -> Dict[str, Any]:
+    '''
+    Страница списка в порядке (category, topic, id) с фильтрами и проекцией.
+    after — разобранный курсор: позиция последней строки предыдущей страницы.
+    Клиенту он отдаётся непрозрачным, так что листать можно и без category и topic в fields.
+    '''
+    conditions = []
+    params: Dict[str, Any] = {'limit': limit + 1}
+    if category is not None:
+        conditions.append('category = %(category)s')
+        params['category'] = category
+    if is_roblox is not None:
+        conditions.append('is_roblox = %(is_roblox)s')
+        params['is_roblox'] = is_roblox
+    if after is not None:
+        params['cursor_category'], params['cursor_topic'], params['cursor_id'] = after
+        conditions.append('(category, topic, id) > (%(cursor_category)s, %(cursor_topic)s, %(cursor_id)s)')
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    db_cursor = conn.cursor()
+    db_cursor.execute(f"""
+        SELECT category, topic, {', '.join(fields)}
+        FROM lua_knowledge_base
+        {where}
+        ORDER BY category, topic, id
+        LIMIT %(limit)s
+    """, params)
+    results = db_cursor.fetchall()
+    db_cursor.close()
+    
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        next_cursor = encode_cursor((last[0], last[1], last[2 + fields.index('id')]))
+    
+    return {
+        'items': [_knowledge_row(fields, row[2:]) for row in results],
+        'next_cursor': next_cursor
+    }
+
+def get_lua_knowledge_item(conn, item_id: int, fields: Tuple[str, ...] = DEFAULT_KNOWLEDGE_FIELDS) -> Optional[Dict]:
+    '''Одна запись по id — например, code_example по требованию из списка'''
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(fields)} FROM lua_knowledge_base WHERE id = %s", (item_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    return _knowledge_row(fields, row) if row else None
+
+def parse_listing_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    '''Разбирает fields, category, is_roblox, cursor и limit; ValueError на мусор'''
+    cursor = params.get('cursor')
+    is_roblox = params.get('is_roblox')
+    if is_roblox not in (None, '', 'true', 'false'):
+        raise ValueError('is_roblox должен быть true или false')
+    limit = int(params.get('limit') or LUA_KB_PAGE_SIZE)
+    return {
+        'fields': parse_fields(params.get('fields')),
+        'category': params.get('category') or None,
+        'is_roblox': None if not is_roblox else is_roblox == 'true',
+        'after': decode_cursor(cursor) if cursor else None,
+        'limit': max(1, min(limit, LUA_KB_MAX_PAGE_SIZE))
+    }
+
+SEED_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seed_knowledge.ndjson.gz')
+LUA_KB_SEARCH_LIMIT = int(os.environ.get('LUA_KB_SEARCH_LIMIT', '10'))
+LUA_KB_SEARCH_MAX_LIMIT = int(os.environ.get('LUA_KB_SEARCH_MAX_LIMIT', '50'))
+
+# Отбор и ранжирование из runtime.search — те же, что у статей Lua в ответах чата
+SEARCH_QUERY = f"""
+    SELECT id, category, topic, rank, score,
+           ts_headline('russian', COALESCE(description, ''), {ANY_TERMS_SQL},
+                       'StartSel=**, StopSel=**, MaxWords=30, MinWords=12, MaxFragments=1') AS snippet
+    FROM (
+        SELECT id, category, topic, description,
+            {LUA_KNOWLEDGE_RANK_SQL} AS rank,
+            {LUA_KNOWLEDGE_SCORE_SQL} AS score
+        FROM lua_knowledge_base
+        WHERE {LUA_KNOWLEDGE_MATCH_SQL}
+        ORDER BY rank, score DESC, id
+        LIMIT %(limit)s
+    ) ranked
+    ORDER BY rank, score DESC, id
+"""
+
+def search_lua_knowledge(conn, query: str, limit: int = LUA_KB_SEARCH_LIMIT) -> List[Dict]:
+    '''Топ-k статей по запросу с рангом, оценкой и фрагментом описания; подсветка — только для top-k'''
+    cursor = conn.cursor()
+    cursor.execute(SEARCH_QUERY, {**search_params(query), 'limit': limit})
+    results = cursor.fetchall()
+    cursor.close()
+    
+    return [{
+        'id': row[0],
+        'category': row[1],
+        'topic': row[2],
+        'rank': row[3],
+        'score': round(float(row[4]), 4),
+        'snippet': row[5]
+    } for row in results]
+
+def get_knowledge_etag(conn) -> str:
+    '''
+    Версия списка: версия из content_versions плюс число строк и max(id) —
+    последние ловят и правки базы в обход add_lua_knowledge
+    '''
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT
+            (SELECT COALESCE(MAX(version), 0) FROM content_versions WHERE name = 'lua_knowledge'),
+            COUNT(*),
+            COALESCE(MAX(id), 0)
+        FROM lua_knowledge_base
+    """)
+    version, count, max_id = cursor.fetchone()
+    cursor.close()
+    return f'W/"lua-{version}-{count}-{max_id}"'
+
+def bump_knowledge_version(cursor) -> None:
+    '''Увеличивает версию базы знаний, чат по ней сбрасывает кеш ответов'''
+    cursor.execute("""
+        UPDATE content_versions
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE name = 'lua_knowledge'
+    """)
+
 def add_lua_knowledge(data: Dict, conn) -> Dict:
     cursor = conn.cursor()
     
     cursor.execute("""
         INSERT INTO lua_knowledge_base (category, topic, description, code_example, explanation, keywords)
         VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (category, topic) DO NOTHING
         RETURNING id
     """, (
         data['category'],
@@ -44,13 +236,24 @@ def add_lua_knowledge(data: Dict, conn) -> Dict:
         data.get('keywords', [])
     ))
     
-    new_id = cursor.fetchone()[0]
+    row = cursor.fetchone()
+    if row is None:
+        cursor.close()
+        raise HttpError('Статья с такой категорией и темой уже есть; обновить её можно импортом', 409)
+    
+    new_id = row[0]
+    bump_knowledge_version(cursor)
     conn.commit()
     cursor.close()
     
     return {'id': new_id, 'success': True}
 
-def seed_initial_knowledge(conn):
+def seed_initial_knowledge(conn) -> Optional[Dict[str, Any]]:
+    '''
+    Заполняет пустую базу знаний стартовым корпусом из SEED_DATA_PATH.
+    Файл читается только здесь и потоком идёт в bulk_import_knowledge,
+    так что обычные запросы не платят за него на холодном старте.
+    '''
     cursor = conn.cursor()
     
     cursor.execute("SELECT COUNT(*) FROM lua_knowledge_base")
@@ -58,593 +261,95 @@ def seed_initial_knowledge(conn):
     
     if count > 0:
         cursor.close()
-        return
+        return None
     
-    roblox_knowledge = [
-        {
-            'category': 'Roblox Основы',
-            'topic': 'Создание объектов в Roblox',
-            'description': 'Как создавать и изменять объекты в игре',
-            'code_example': '''-- Создание новой части (Part)
-local part = Instance.new("Part")
-part.Size = Vector3.new(10, 5, 10)
-part.Position = Vector3.new(0, 10, 0)
-part.BrickColor = BrickColor.new("Bright red")
-part.Material = Enum.Material.Neon
-part.Parent = game.Workspace
-
--- Создание модели
-local model = Instance.new("Model")
-model.Name = "MyModel"
-model.Parent = workspace
-
-local part1 = Instance.new("Part")
-part1.Parent = model''',
-            'explanation': 'Instance.new() создаёт новые объекты. Parent определяет, где объект появится в иерархии.',
-            'keywords': ['roblox', 'instance', 'part', 'создание', 'объект', 'workspace'],
-            'is_roblox': True
-        },
-        {
-            'category': 'Roblox Основы',
-            'topic': 'События и функции в Roblox',
-            'description': 'Работа с событиями игроков и объектов',
-            'code_example': '''-- Событие при касании объекта
-local part = script.Parent
-
-part.Touched:Connect(function(otherPart)
-    local humanoid = otherPart.Parent:FindFirstChild("Humanoid")
-    if humanoid then
-        print("Игрок коснулся!")
-        humanoid.Health = 0  -- урон игроку
-    end
-end)
-
--- Событие при входе игрока
-game.Players.PlayerAdded:Connect(function(player)
-    print(player.Name .. " присоединился!")
-    
-    player.CharacterAdded:Connect(function(character)
-        print("Персонаж загружен")
-    end)
-end)''',
-            'explanation': 'События Connect используются для реакции на действия. Touched срабатывает при касании, PlayerAdded — при входе игрока.',
-            'keywords': ['roblox', 'event', 'connect', 'touched', 'player', 'событие'],
-            'is_roblox': True
-        },
-        {
-            'category': 'Roblox Продвинутое',
-            'topic': 'DataStore - сохранение данных',
-            'description': 'Система сохранения игровых данных игроков',
-            'code_example': '''local DataStoreService = game:GetService("DataStoreService")
-local playerData = DataStoreService:GetDataStore("PlayerData")
-
--- Сохранение данных
-game.Players.PlayerRemoving:Connect(function(player)
-    local data = {
-        coins = player.leaderstats.Coins.Value,
-        level = player.leaderstats.Level.Value
-    }
+    with gzip.open(SEED_DATA_PATH, 'rt', encoding='utf-8') as stream:
+        result = bulk_import_knowledge(iter_ndjson(stream), conn)
     
-    local success, err = pcall(function()
-        playerData:SetAsync(player.UserId, data)
-    end)
-    
-    if success then
-        print("Данные сохранены")
-    else
-        warn("Ошибка сохранения: " .. err)
-    end
-end)
-
--- Загрузка данных
-game.Players.PlayerAdded:Connect(function(player)
-    local success, data = pcall(function()
-        return playerData:GetAsync(player.UserId)
-    end)
+    bump_knowledge_version(cursor)
+    conn.commit()
+    cursor.close()
+    annotate('lua_kb_seed', {'path': SEED_DATA_PATH, **result})
     
-    if success and data then
-        player.leaderstats.Coins.Value = data.coins
-        player.leaderstats.Level.Value = data.level
-    end
-end)''',
-            'explanation': 'DataStore позволяет сохранять данные между сессиями. Используйте pcall для обработки ошибок.',
-            'keywords': ['roblox', 'datastore', 'сохранение', 'данные', 'storage'],
-            'is_roblox': True
-        },
-        {
-            'category': 'Roblox Продвинутое',
-            'topic': 'RemoteEvent - связь клиент-сервер',
-            'description': 'Обмен данными между сервером и клиентом',
-            'code_example': '''-- ReplicatedStorage.RemoteEvent
+    return result
 
--- SERVER SCRIPT
-local ReplicatedStorage = game:GetService("ReplicatedStorage")
-local remoteEvent = ReplicatedStorage:WaitForChild("DamageEvent")
+app = Router(allow_headers='Content-Type, If-None-Match')
 
-remoteEvent.OnServerEvent:Connect(function(player, damage)
-    local character = player.Character
-    local humanoid = character:FindFirstChild("Humanoid")
+@app.route('GET')
+def read_knowledge(request: Request) -> Dict[str, Any]:
+    conn = request.conn
+    query_params = request.query
     
-    if humanoid then
-        humanoid.Health = humanoid.Health - damage
-        print(player.Name .. " получил " .. damage .. " урона")
-    end
-end)
-
--- LOCAL SCRIPT (клиент)
-local ReplicatedStorage = game:GetService("ReplicatedStorage")
-local remoteEvent = ReplicatedStorage:WaitForChild("DamageEvent")
-
--- Отправка урона на сервер
-local damageAmount = 25
-remoteEvent:FireServer(damageAmount)''',
-            'explanation': 'RemoteEvent позволяет клиенту отправлять данные на сервер. FireServer() отправляет, OnServerEvent слушает.',
-            'keywords': ['roblox', 'remoteevent', 'клиент', 'сервер', 'fireserver'],
-            'is_roblox': True
-        },
-        {
-            'category': 'Roblox Полезное',
-            'topic': 'Tweening - анимация объектов',
-            'description': 'Плавная анимация свойств объектов',
-            'code_example': '''local TweenService = game:GetService("TweenService")
-local part = script.Parent
-
--- Настройки анимации
-local tweenInfo = TweenInfo.new(
-    2,  -- время (секунды)
-    Enum.EasingStyle.Quad,  -- стиль
-    Enum.EasingDirection.Out,  -- направление
-    -1,  -- повторения (-1 = бесконечно)
-    true  -- реверс (туда-обратно)
-)
-
--- Целевые свойства
-local goal = {
-    Position = Vector3.new(0, 50, 0),
-    Size = Vector3.new(20, 20, 20),
-    Transparency = 0.5
-}
-
--- Создание и запуск анимации
-local tween = TweenService:Create(part, tweenInfo, goal)
-tween:Play()
-
--- События анимации
-tween.Completed:Connect(function()
-    print("Анимация завершена!")
-end)''',
-            'explanation': 'TweenService позволяет плавно анимировать любые свойства объектов без скриптовых циклов.',
-            'keywords': ['roblox', 'tween', 'анимация', 'tweenservice', 'плавность'],
-            'is_roblox': True
-        },
-        {
-            'category': 'Roblox Полезное',
-            'topic': 'ContextActionService - управление',
-            'description': 'Привязка действий к клавишам',
-            'code_example': '''local ContextActionService = game:GetService("ContextActionService")
-local UserInputService = game:GetService("UserInputService")
-
--- Функция действия
-local function onJumpAction(actionName, inputState, inputObject)
-    if inputState == Enum.UserInputState.Begin then
-        print("Прыжок!")
-        local character = game.Players.LocalPlayer.Character
-        local humanoid = character:FindFirstChild("Humanoid")
-        if humanoid then
-            humanoid.Jump = true
-        end
-    end
-end
-
--- Привязка к клавише
-ContextActionService:BindAction(
-    "CustomJump",  -- имя действия
-    onJumpAction,  -- функция
-    true,  -- показывать на мобильных
-    Enum.KeyCode.Space  -- клавиша
-)
-
--- Отвязка действия
--- ContextActionService:UnbindAction("CustomJump")''',
-            'explanation': 'ContextActionService управляет пользовательским вводом и автоматически создаёт кнопки для мобильных устройств.',
-            'keywords': ['roblox', 'input', 'ввод', 'клавиши', 'управление', 'contextaction'],
-            'is_roblox': True
-        }
-    ]
+    if query_params.get('seed') == 'true':
+        imported = seed_initial_knowledge(conn)
+        return json_response({'success': True, 'message': 'Knowledge base seeded', 'imported': imported})
     
-    initial_knowledge = [
-        {
-            'category': 'Основы',
-            'topic': 'Переменные и типы данных',
-            'description': 'Lua — динамически типизированный язык с 8 базовыми типами',
-            'code_example': '''-- Типы данных в Lua
-local num = 42              -- number
-local str = "Hello"         -- string
-local bool = true           -- boolean
-local tbl = {1, 2, 3}      -- table
-local func = function() end -- function
-local nothing = nil         -- nil
-
-print(type(num))   -- number
-print(type(str))   -- string''',
-            'explanation': 'В Lua переменные объявляются с помощью local (локальные) или без него (глобальные). Используйте local для избежания конфликтов.',
-            'keywords': ['переменные', 'типы', 'local', 'number', 'string', 'boolean', 'table', 'nil']
-        },
-        {
-            'category': 'Основы',
-            'topic': 'Функции',
-            'description': 'Функции в Lua — объекты первого класса',
-            'code_example': '''-- Обычная функция
-function greet(name)
-    return "Привет, " .. name
-end
-
--- Анонимная функция
-local add = function(a, b)
-    return a + b
-end
-
--- Функция с множественным возвратом
-function getCoords()
-    return 10, 20, 30
-end
-
-local x, y, z = getCoords()
-
-print(greet("Мир"))  -- Привет, Мир
-print(add(5, 3))     -- 8''',
-            'explanation': 'Функции могут возвращать несколько значений, храниться в переменных и передаваться как параметры.',
-            'keywords': ['function', 'функции', 'return', 'параметры', 'множественный возврат']
-        },
-        {
-            'category': 'Основы',
-            'topic': 'Таблицы (массивы и словари)',
-            'description': 'Таблицы — единственная структура данных в Lua',
-            'code_example': '''-- Массив (индексы с 1!)
-local fruits = {"apple", "banana", "orange"}
-print(fruits[1])  -- apple
-
--- Словарь (ассоциативный массив)
-local person = {
-    name = "John",
-    age = 30,
-    city = "Moscow"
-}
-print(person.name)  -- John
-print(person["age"])  -- 30
-
--- Смешанная таблица
-local mixed = {
-    "first",           -- [1]
-    "second",          -- [2]
-    key = "value",
-    [10] = "tenth"
-}''',
-            'explanation': 'В Lua индексация массивов начинается с 1, а не с 0! Таблицы могут содержать любые значения и использоваться как массивы, словари или объекты.',
-            'keywords': ['table', 'таблицы', 'массив', 'словарь', 'индекс', 'array']
-        },
-        {
-            'category': 'Основы',
-            'topic': 'Циклы',
-            'description': 'Различные типы циклов в Lua',
-            'code_example': '''-- Числовой for (от start до end)
-for i = 1, 5 do
-    print(i)  -- 1 2 3 4 5
-end
-
--- Числовой for с шагом
-for i = 10, 1, -2 do
-    print(i)  -- 10 8 6 4 2
-end
-
--- Generic for (итерация по массиву)
-local arr = {"a", "b", "c"}
-for index, value in ipairs(arr) do
-    print(index, value)
-end
-
--- Generic for (итерация по таблице)
-local tbl = {x=10, y=20}
-for key, value in pairs(tbl) do
-    print(key, value)
-end
-
--- While
-local count = 0
-while count < 3 do
-    count = count + 1
-    print(count)
-end
-
--- Repeat-until
-local n = 0
-repeat
-    n = n + 1
-    print(n)
-until n == 3''',
-            'explanation': 'ipairs — для массивов (целочисленные ключи), pairs — для всех элементов таблицы.',
-            'keywords': ['for', 'while', 'repeat', 'циклы', 'ipairs', 'pairs', 'итерация']
-        },
-        {
-            'category': 'Основы',
-            'topic': 'Условия',
-            'description': 'Условные конструкции if-then-else',
-            'code_example': '''local age = 18
-
-if age >= 18 then
-    print("Взрослый")
-elseif age >= 13 then
-    print("Подросток")
-else
-    print("Ребенок")
-end
-
--- Тернарный оператор (через and/or)
-local status = (age >= 18) and "adult" or "minor"
-
--- Только false и nil = ложь, всё остальное = истина
-if 0 then print("0 = true!") end  -- выполнится!
-if "" then print("Пустая строка = true!") end  -- выполнится!''',
-            'explanation': 'В Lua только false и nil считаются ложью. 0 и пустая строка — истина!',
-            'keywords': ['if', 'then', 'else', 'elseif', 'условия', 'boolean']
-        },
-        {
-            'category': 'Продвинутое',
-            'topic': 'Метатаблицы',
-            'description': 'Метатаблицы позволяют изменять поведение таблиц',
-            'code_example': '''-- Создание класса через метатаблицы
-local Vector = {}
-Vector.__index = Vector
-
-function Vector.new(x, y)
-    local self = setmetatable({}, Vector)
-    self.x = x
-    self.y = y
-    return self
-end
-
-function Vector:length()
-    return math.sqrt(self.x^2 + self.y^2)
-end
-
--- Перегрузка оператора сложения
-Vector.__add = function(a, b)
-    return Vector.new(a.x + b.x, a.y + b.y)
-end
-
-local v1 = Vector.new(3, 4)
-local v2 = Vector.new(1, 2)
-local v3 = v1 + v2  -- использует __add
-
-print(v1:length())  -- 5
-print(v3.x, v3.y)   -- 4, 6''',
-            'explanation': 'Метатаблицы — мощный инструмент для создания классов, перегрузки операторов и контроля доступа к таблицам.',
-            'keywords': ['metatable', 'метатаблицы', '__index', '__add', 'ООП', 'классы', 'setmetatable']
-        },
-        {
-            'category': 'Продвинутое',
-            'topic': 'Корутины (coroutines)',
-            'description': 'Корутины для асинхронного выполнения кода',
-            'code_example': '''-- Создание корутины
-local co = coroutine.create(function()
-    for i = 1, 3 do
-        print("Корутина:", i)
-        coroutine.yield()  -- приостановка
-    end
-end)
-
-print(coroutine.status(co))  -- suspended
-
--- Запуск корутины
-coroutine.resume(co)  -- Корутина: 1
-coroutine.resume(co)  -- Корутина: 2
-coroutine.resume(co)  -- Корутина: 3
-
--- Передача данных через yield/resume
-local producer = coroutine.create(function()
-    for i = 1, 3 do
-        coroutine.yield(i * 10)
-    end
-end)
-
-local status, value = coroutine.resume(producer)
-print(value)  -- 10''',
-            'explanation': 'Корутины позволяют приостанавливать и возобновлять выполнение функций, полезны для асинхронных операций.',
-            'keywords': ['coroutine', 'корутины', 'yield', 'resume', 'async', 'асинхронность']
-        },
-        {
-            'category': 'Продвинутое',
-            'topic': 'Модули и require',
-            'description': 'Организация кода в модули',
-            'code_example': '''-- mymodule.lua
-local M = {}
-
-function M.hello(name)
-    return "Hello, " .. name
-end
-
-function M.add(a, b)
-    return a + b
-end
-
-return M
-
--- main.lua
-local mymodule = require("mymodule")
-
-print(mymodule.hello("World"))  -- Hello, World
-print(mymodule.add(5, 3))       -- 8
-
--- Альтернативный способ
-local M = {}
-
-M.VERSION = "1.0"
-
-function M:init()
-    self.data = {}
-end
-
-return M''',
-            'explanation': 'Модули в Lua — это обычные таблицы, которые возвращаются из файла. require загружает и кэширует модуль.',
-            'keywords': ['module', 'модули', 'require', 'import', 'export']
-        },
-        {
-            'category': 'Полезное',
-            'topic': 'Работа со строками',
-            'description': 'Манипуляции со строками в Lua',
-            'code_example': '''local str = "Hello World"
-
--- Длина строки
-print(#str)  -- 11
-print(string.len(str))  -- 11
-
--- Подстрока
-print(string.sub(str, 1, 5))  -- Hello
-print(str:sub(7))  -- World
-
--- Поиск
-local pos = string.find(str, "World")
-print(pos)  -- 7
-
--- Замена
-print(string.gsub(str, "World", "Lua"))  -- Hello Lua
-
--- Регулярные выражения (паттерны)
-local text = "Мой email: test@example.com"
-local email = string.match(text, "[%w.]+@[%w.]+")
-print(email)  -- test@example.com
-
--- Разделение строки
-function split(str, delimiter)
-    local result = {}
-    for match in (str..delimiter):gmatch("(.-)"..delimiter) do
-        table.insert(result, match)
-    end
-    return result
-end
-
-local parts = split("a,b,c", ",")
--- {"a", "b", "c"}''',
-            'explanation': 'В Lua встроенная мощная система паттернов (похожа на regex). Строки иммутабельны.',
-            'keywords': ['string', 'строки', 'sub', 'find', 'gsub', 'match', 'паттерны', 'regex']
-        },
-        {
-            'category': 'Полезное',
-            'topic': 'Работа с таблицами',
-            'description': 'Полезные функции для работы с таблицами',
-            'code_example': '''local t = {10, 20, 30}
-
--- Добавление элемента
-table.insert(t, 40)  -- {10, 20, 30, 40}
-table.insert(t, 1, 5)  -- {5, 10, 20, 30, 40}
-
--- Удаление элемента
-table.remove(t)  -- удаляет последний: {5, 10, 20, 30}
-table.remove(t, 1)  -- удаляет первый: {10, 20, 30}
-
--- Сортировка
-table.sort(t)  -- {10, 20, 30}
-table.sort(t, function(a, b) return a > b end)  -- {30, 20, 10}
-
--- Объединение в строку
-print(table.concat(t, ", "))  -- 30, 20, 10
-
--- Копирование таблицы (поверхностное)
-function copy(t)
-    local result = {}
-    for k, v in pairs(t) do
-        result[k] = v
-    end
-    return result
-end
-
--- Подсчет элементов
-function count(t)
-    local n = 0
-    for _ in pairs(t) do
-        n = n + 1
-    end
-    return n
-end''',
-            'explanation': 'table.insert/remove работают только с массивами. Для словарей используйте прямое присваивание.',
-            'keywords': ['table', 'insert', 'remove', 'sort', 'concat', 'таблицы', 'массивы']
-        },
-        {
-            'category': 'Полезное',
-            'topic': 'Обработка ошибок',
-            'description': 'pcall и xpcall для безопасного выполнения кода',
-            'code_example': '''-- Функция, которая может упасть
-function riskyFunction(x)
-    if x < 0 then
-        error("x не может быть отрицательным!")
-    end
-    return math.sqrt(x)
-end
-
--- pcall (protected call)
-local success, result = pcall(riskyFunction, 16)
-if success then
-    print("Результат:", result)  -- 4
-else
-    print("Ошибка:", result)
-end
-
-local success, err = pcall(riskyFunction, -5)
-print(success)  -- false
-print(err)  -- x не может быть отрицательным!
-
--- xpcall с обработчиком ошибок
-local function errorHandler(err)
-    return "Произошла ошибка: " .. tostring(err)
-end
-
-local status, result = xpcall(
-    function() return riskyFunction(-10) end,
-    errorHandler
-)
-
-print(result)  -- Произошла ошибка: x не может быть отрицательным!
-
--- assert для проверки условий
-local function divide(a, b)
-    assert(b ~= 0, "Деление на ноль!")
-    return a / b
-end''',
-            'explanation': 'pcall возвращает статус и результат/ошибку. xpcall позволяет задать обработчик ошибок.',
-            'keywords': ['pcall', 'xpcall', 'error', 'assert', 'ошибки', 'исключения', 'try-catch']
-        }
-    ]
+    search_query = (query_params.get('q') or '').strip()
+    listing_requested = any(query_params.get(name) for name in LISTING_PARAMS)
+    try:
+        if search_query:
+            search_limit = max(1, min(int(query_params.get('limit') or LUA_KB_SEARCH_LIMIT), LUA_KB_SEARCH_MAX_LIMIT))
+        elif query_params.get('id'):
+            item_id = int(query_params['id'])
+            fields = parse_fields(query_params.get('fields'))
+        elif listing_requested:
+            listing = parse_listing_params(query_params)
+    except ValueError as e:
+        raise BadRequest(f'Некорректные параметры: {e}')
     
-    for item in roblox_knowledge:
-        cursor.execute("""
-            INSERT INTO lua_knowledge_base (category, topic, description, code_example, explanation, keywords, is_roblox)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            item['category'],
-            item['topic'],
-            item['description'],
-            item['code_example'],
-            item['explanation'],
-            item['keywords'],
-            item.get('is_roblox', False)
-        ))
+    if search_query:
+        with timed('search'):
+            knowledge = search_lua_knowledge(conn, search_query, search_limit)
+    elif query_params.get('id'):
+        with timed('query'):
+            knowledge = get_lua_knowledge_item(conn, item_id, fields)
+        if knowledge is None:
+            raise NotFound('Запись не найдена')
+    elif listing_requested:
+        with timed('query'):
+            knowledge = list_lua_knowledge(conn, **listing)
+    else:
+        # Без параметров — прежний ответ: весь список со всеми полями. ETag только у него:
+        # COUNT(*) по таблице окупается там, где 304 экономит выгрузку всей базы
+        with timed('etag'):
+            etag = get_knowledge_etag(conn)
+        if etag_matches(request.header('If-None-Match'), etag):
+            return not_modified(etag)
+        with timed('query'):
+            if DB_JSON_RESPONSES:
+                return raw_json_response(get_all_lua_knowledge_json(conn), etag=etag)
+            knowledge = get_all_lua_knowledge(conn)
+        return json_response(knowledge, etag=etag)
     
-    for item in initial_knowledge:
-        cursor.execute("""
-            INSERT INTO lua_knowledge_base (category, topic, description, code_example, explanation, keywords, is_roblox)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            item['category'],
-            item['topic'],
-            item['description'],
-            item['code_example'],
-            item['explanation'],
-            item['keywords'],
-            item.get('is_roblox', False)
-        ))
+    return json_response(knowledge)
+
+@app.route('POST')
+def write_knowledge(request: Request) -> Dict[str, Any]:
+    conn = request.conn
+    import_format = request.query.get('import')
     
-    conn.commit()
-    cursor.close()
+    if import_format:
+        if import_format not in IMPORT_FORMATS:
+            raise BadRequest(f"import должен быть одним из: {', '.join(IMPORT_FORMATS)}")
+        
+        try:
+            stream = open_import_body(request.event)
+            records = iter_ndjson(stream) if import_format == 'ndjson' else iter_csv(stream)
+            with timed('import'):
+                result = bulk_import_knowledge(records, conn)
+        except ImportFormatError as e:
+            raise BadRequest(f'Импорт отменён, {e}')
+        
+        if result['inserted'] or result['updated']:
+            cursor = conn.cursor()
+            bump_knowledge_version(cursor)
+            cursor.close()
+        conn.commit()
+        annotate('lua_kb_import', {'format': import_format, **result})
+        
+        return json_response(result)
+    
+    return json_response(add_lua_knowledge(request.json(), conn), 201)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -652,86 +357,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Args: event - HTTP запрос, context - контекст функции
     Returns: HTTP response с данными базы знаний
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
-    
-    database_url = os.environ.get('DATABASE_URL')
-    if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Database not configured'})
-        }
-    
-    conn = psycopg2.connect(database_url)
-    
-    try:
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            
-            if query_params.get('seed') == 'true':
-                seed_initial_knowledge(conn)
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True, 'message': 'Knowledge base seeded'})
-                }
-            
-            knowledge = get_all_lua_knowledge(conn)
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps(knowledge)
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            result = add_lua_knowledge(body_data, conn)
-            conn.close()
-            
-            return {
-                'statusCode': 201,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'isBase64Encoded': False,
-                'body': json.dumps(result)
-            }
-        
-        else:
-            conn.close()
-            return {
-                'statusCode': 405,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Method not allowed'})
-            }
-            
-    except Exception as e:
-        if conn:
-            conn.close()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+    return app.dispatch(event, context)
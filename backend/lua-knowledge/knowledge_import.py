@@ -0,0 +1,233 @@
+import base64
+import binascii
+import csv
+import gzip
+import io
+import json
+import time
+import zlib
+import psycopg2
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+MAX_CATEGORY_LENGTH = 100
+MAX_TOPIC_LENGTH = 255
+
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE lua_kb_import (
+        line_no INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        description TEXT,
+        code_example TEXT,
+        explanation TEXT,
+        keywords JSONB,
+        is_roblox BOOLEAN
+    ) ON COMMIT DROP
+"""
+
+# Ключ статьи — (category, topic), уникальный с V0015: при повторе в файле побеждает последняя строка.
+# Совпал content_hash — строка пропускается, иначе обновляется; новые ключи вставляются в порядке файла.
+# xmax = 0 только у вставленных строк, пропущенные в RETURNING не попадают.
+MERGE_SQL = """
+    WITH staged AS (
+        SELECT DISTINCT ON (category, topic)
+            line_no, category, topic, description, code_example, explanation,
+            ARRAY(SELECT jsonb_array_elements_text(COALESCE(keywords, '[]'::jsonb))) AS keywords,
+            COALESCE(is_roblox, false) AS is_roblox
+        FROM lua_kb_import
+        ORDER BY category, topic, line_no DESC
+    ),
+    merged AS (
+        INSERT INTO lua_knowledge_base AS kb (category, topic, description, code_example, explanation, keywords, is_roblox)
+        SELECT category, topic, description, code_example, explanation, keywords, is_roblox
+        FROM staged
+        ORDER BY line_no
+        ON CONFLICT (category, topic) DO UPDATE
+        SET description = EXCLUDED.description,
+            code_example = EXCLUDED.code_example,
+            explanation = EXCLUDED.explanation,
+            keywords = EXCLUDED.keywords,
+            is_roblox = EXCLUDED.is_roblox
+        WHERE kb.content_hash IS DISTINCT FROM lua_kb_content_hash(
+            EXCLUDED.category, EXCLUDED.topic, EXCLUDED.description, EXCLUDED.code_example,
+            EXCLUDED.explanation, EXCLUDED.keywords, EXCLUDED.is_roblox
+        )
+        RETURNING xmax = 0 AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged
+"""
+
+class ImportFormatError(ValueError):
+    '''Строка импорта не разобрана или не прошла проверку; импорт откатывается целиком'''
+
+def _normalize_keywords(value: Any) -> list:
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [keyword.strip() for keyword in value.split(',') if keyword.strip()]
+    if isinstance(value, list):
+        return [str(keyword) for keyword in value]
+    raise ValueError('keywords должен быть списком или строкой через запятую')
+
+def _normalize_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None or value == '':
+        return False
+    if str(value).lower() in ('true', '1', 'yes', 't'):
+        return True
+    if str(value).lower() in ('false', '0', 'no', 'f'):
+        return False
+    raise ValueError('is_roblox должен быть true или false')
+
+def normalize_record(record: Dict[str, Any], line_no: int) -> list:
+    '''Проверяет запись и возвращает строку для COPY в порядке колонок lua_kb_import'''
+    try:
+        if not isinstance(record, dict):
+            raise ValueError('ожидался объект')
+        category = record.get('category') or ''
+        topic = record.get('topic') or ''
+        if not isinstance(category, str) or not isinstance(topic, str):
+            raise ValueError('category и topic должны быть строками')
+        category, topic = category.strip(), topic.strip()
+        if not category or not topic:
+            raise ValueError('category и topic обязательны')
+        for name in ('description', 'code_example', 'explanation'):
+            if not isinstance(record.get(name), (str, type(None))):
+                raise ValueError(f'{name} должно быть строкой')
+        if len(category) > MAX_CATEGORY_LENGTH or len(topic) > MAX_TOPIC_LENGTH:
+            raise ValueError('category или topic слишком длинные')
+        keywords = _normalize_keywords(record.get('keywords'))
+        is_roblox = _normalize_bool(record.get('is_roblox'))
+    except ValueError as e:
+        raise ImportFormatError(f'запись {line_no}: {e}')
+    
+    return [
+        line_no, category, topic,
+        record.get('description'), record.get('code_example'), record.get('explanation'),
+        json.dumps(keywords, ensure_ascii=False), 't' if is_roblox else 'f'
+    ]
+
+def iter_ndjson(stream: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    '''Объекты из NDJSON по одному; пустые строки пропускаются'''
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f'строка {line_no}: {e.msg}')
+
+def iter_csv(stream: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    '''
+    Строки CSV с заголовком; keywords — через запятую внутри ячейки. Пустая ячейка — NULL,
+    как отсутствующее поле в NDJSON: иначе content_hash одной и той же статьи расходится
+    между форматами и повторный импорт переписывает её.
+    '''
+    reader = csv.DictReader(stream)
+    missing = {'category', 'topic'} - set(reader.fieldnames or [])
+    if missing:
+        raise ImportFormatError(f"в заголовке CSV нет колонок: {', '.join(sorted(missing))}")
+    for row in reader:
+        yield {name: value if value != '' else None for name, value in row.items()}
+
+def _body_lines(stream: io.TextIOWrapper) -> Iterator[str]:
+    # Тело разжимается и декодируется по мере чтения, так что битый gzip или не UTF-8
+    # обнаруживаются посреди импорта — это тоже ошибка формата, а не сбой функции
+    try:
+        yield from stream
+    except (OSError, EOFError, zlib.error, UnicodeDecodeError) as e:
+        raise ImportFormatError(f'тело запроса не читается: {e}')
+
+def open_import_body(event: Dict[str, Any]) -> Iterator[str]:
+    '''Строки тела запроса: base64 и gzip разворачиваются по мере чтения'''
+    body = event.get('body') or ''
+    try:
+        raw = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+    except binascii.Error as e:
+        raise ImportFormatError(f'тело запроса не в base64: {e}')
+    if raw[:2] == b'\x1f\x8b':
+        return _body_lines(io.TextIOWrapper(gzip.GzipFile(fileobj=io.BytesIO(raw)), encoding='utf-8', newline=''))
+    return _body_lines(io.TextIOWrapper(io.BytesIO(raw), encoding='utf-8', newline=''))
+
+class _CopyStream:
+    '''Файлоподобный объект для copy_expert: отдаёт CSV-строки по мере обхода записей'''
+    
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.records = iter(records)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.pending = ''
+        self.rows = 0
+        self.error: Optional[ImportFormatError] = None
+    
+    def _next_chunk(self) -> Optional[str]:
+        record = next(self.records, None)
+        if record is None:
+            return None
+        self.rows += 1
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerow(normalize_record(record, self.rows))
+        return self.buffer.getvalue()
+    
+    def read(self, size: int = -1) -> str:
+        try:
+            return self._read(size)
+        except ImportFormatError as e:
+            # psycopg2 заворачивает исключение из read() в ошибку COPY, исходное сохраняем
+            self.error = e
+            raise
+    
+    def _read(self, size: int) -> str:
+        while size < 0 or len(self.pending) < size:
+            chunk = self._next_chunk()
+            if chunk is None:
+                break
+            self.pending += chunk
+        if size < 0:
+            data, self.pending = self.pending, ''
+        else:
+            data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+    
+    readline = read
+
+def bulk_import_knowledge(records: Iterable[Dict[str, Any]], conn) -> Dict[str, Any]:
+    '''
+    Загружает записи через COPY во временную таблицу и сливает их в lua_knowledge_base
+    одним запросом. Всё в одной транзакции: ошибка в любой строке откатывает импорт.
+    Транзакцию фиксирует вызывающий; версию базы знаний поднимает он же, если что-то изменилось.
+    '''
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    
+    cursor.execute(STAGING_TABLE_SQL)
+    stream = _CopyStream(records)
+    try:
+        cursor.copy_expert(
+            "COPY lua_kb_import (line_no, category, topic, description, code_example, explanation, keywords, is_roblox) "
+            "FROM STDIN WITH (FORMAT csv)",
+            stream
+        )
+    except psycopg2.Error:
+        cursor.close()
+        if stream.error is not None:
+            raise stream.error
+        raise
+    
+    cursor.execute("LOCK TABLE lua_knowledge_base IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(MERGE_SQL)
+    inserted, updated = cursor.fetchone()
+    cursor.close()
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'received': stream.rows,
+        'inserted': inserted,
+        'updated': updated,
+        'skipped': stream.rows - inserted - updated,
+        'seconds': round(elapsed, 4),
+        'rows_per_second': round(stream.rows / elapsed, 1) if elapsed > 0 else None
+    }
@@ -0,0 +1,115 @@
+import base64
+import gzip
+import json
+import os
+from typing import Dict, Any, Optional
+
+RESPONSE_GZIP_MIN_BYTES = int(os.environ.get('RESPONSE_GZIP_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '4'))
+# Списки собираются в JSON запросом (json_agg) и отдаются как есть; false — прежний путь через Python
+DB_JSON_RESPONSES = os.environ.get('DB_JSON_RESPONSES', 'true').lower() == 'true'
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    '''Заголовок запроса без учёта регистра: шлюз присылает и X-Api-Key, и x-api-key'''
+    headers = event.get('headers') or {}
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())
+    if value is None:
+        lowered = name.lower()
+        value = next((v for k, v in headers.items() if k.lower() == lowered), None)
+    return value
+
+def json_response(payload: Any, status_code: int = 200, etag: Optional[str] = None,
+                  headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''JSON-ответ с CORS; с etag — ещё ETag и Cache-Control: no-cache для условных запросов'''
+    return raw_json_response(json.dumps(payload), status_code, etag, headers)
+
+def raw_json_response(body: str, status_code: int = 200, etag: Optional[str] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''То же, что json_response, для уже готового JSON — например, собранного в запросе через json_agg'''
+    response_headers = {'Content-Type': 'application/json', **CORS_HEADERS}
+    if etag is not None:
+        response_headers.update({
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'Access-Control-Expose-Headers': 'ETag'
+        })
+    if headers:
+        response_headers.update(headers)
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'isBase64Encoded': False,
+        'body': body
+    }
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return json_response({'error': message}, status_code)
+
+def not_modified(etag: str) -> Dict[str, Any]:
+    '''304 без тела: клиент показывает свою копию'''
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'Access-Control-Expose-Headers': 'ETag',
+            **CORS_HEADERS
+        },
+        'isBase64Encoded': False,
+        'body': ''
+    }
+
+def preflight_response(methods: str, allow_headers: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': {
+            **CORS_HEADERS,
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': ''
+    }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    '''Слабое сравнение If-None-Match с ETag, поддерживает список значений и *'''
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag.removeprefix('W/') for candidate in candidates)
+
+def accepts_gzip(event: Dict[str, Any]) -> bool:
+    '''Разбирает Accept-Encoding: gzip или *, если не запрещены через q=0'''
+    accept_encoding = get_header(event, 'Accept-Encoding') or ''
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    '''Сжимает тело ответа gzip, если клиент это принимает и тело больше порога'''
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+    
+    headers = dict(response.get('headers') or {})
+    if not headers.get('Content-Type'):
+        return response
+    headers['Vary'] = 'Accept-Encoding'
+    
+    raw = body.encode('utf-8')
+    if len(raw) < RESPONSE_GZIP_MIN_BYTES or not accepts_gzip(event):
+        return {**response, 'headers': headers}
+    
+    headers['Content-Encoding'] = 'gzip'
+    return {
+        **response,
+        'headers': headers,
+        'isBase64Encoded': True,
+        'body': base64.b64encode(gzip.compress(raw, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)).decode('ascii')
+    }
@@ -0,0 +1,121 @@
+import json
+import os
+import random
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, Any, Callable, ContextManager, Optional
+
+REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED', 'true').lower() == 'true'
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '0.1'))
+REQUEST_LOG_SLOW_MS = float(os.environ.get('REQUEST_LOG_SLOW_MS', '1000'))
+
+class Timings:
+    '''Длительности этапов одного запроса (повторный этап суммируется) и число запросов к БД'''
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.queries = 0
+        self.route: Optional[str] = None
+        self.events: Dict[str, Any] = {}
+    
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+    
+    def stage(self, name: str) -> '_Stage':
+        return _Stage(self, name)
+    
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+    
+    def stages_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+    
+    def server_timing(self, total_ms: float) -> str:
+        metrics = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items()]
+        metrics.append(f'queries;desc="{self.queries}"')
+        metrics.append(f'total;dur={total_ms:.2f}')
+        return ', '.join(metrics)
+
+class _Stage:
+    '''Контекст одного этапа; обычный класс вместо @contextmanager — вдвое дешевле на входе и выходе'''
+    __slots__ = ('timings', 'name', 'started')
+    
+    def __init__(self, timings: Timings, name: str):
+        self.timings = timings
+        self.name = name
+    
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+    
+    def __exit__(self, *exc_info) -> None:
+        self.timings.add(self.name, time.perf_counter() - self.started)
+
+_NOT_TIMED = nullcontext()
+_current_timings: ContextVar[Optional[Timings]] = ContextVar('request_timings', default=None)
+_log_stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def start_request() -> Optional[Timings]:
+    '''Заводит замер для текущего запроса; None, если REQUEST_TIMING_ENABLED выключен'''
+    if not REQUEST_TIMING_ENABLED:
+        return None
+    timings = Timings()
+    _current_timings.set(timings)
+    return timings
+
+def timed(name: str) -> ContextManager[None]:
+    '''
+    Засекает этап текущего запроса. Вне запроса (бенчмарки, прямой вызов функций)
+    и при выключенном замере ничего не пишет, поэтому бизнес-код размечается без проверок.
+    '''
+    timings = _current_timings.get()
+    if timings is None:
+        return _NOT_TIMED
+    return _Stage(timings, name)
+
+def count_query() -> None:
+    '''Засчитывает запрос к БД текущему запросу; вызывается курсором из пула'''
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.queries += 1
+
+def annotate(name: str, value: Any) -> None:
+    '''Отмечает событие текущего запроса (попадание в пул, кеш) для строки request_timing'''
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.events[name] = value
+
+def log_stats(name: str, snapshot: Callable[[], Dict[str, Any]]) -> None:
+    '''
+    Регистрирует счётчики тёплого контейнера для строки request_timing. snapshot
+    вызывается только для записываемых строк, поэтому горячий путь за него не платит.
+    '''
+    _log_stats[name] = snapshot
+
+def finish_request(timings: Timings, response: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Добавляет Server-Timing к ответу и пишет строку лога. Логируется доля
+    REQUEST_LOG_SAMPLE_RATE запросов, а ошибки 5xx и запросы дольше REQUEST_LOG_SLOW_MS — всегда.
+    '''
+    _current_timings.set(None)
+    total_ms = timings.total_ms()
+    response.setdefault('headers', {}).update({
+        'Server-Timing': timings.server_timing(total_ms),
+        'Timing-Allow-Origin': '*'
+    })
+    
+    status = response.get('statusCode', 200)
+    if status >= 500 or total_ms >= REQUEST_LOG_SLOW_MS or random.random() < REQUEST_LOG_SAMPLE_RATE:
+        print(json.dumps({
+            'request_timing': timings.route,
+            'function': getattr(context, 'function_name', None),
+            'request_id': getattr(context, 'request_id', None),
+            'status': status,
+            'total_ms': round(total_ms, 2),
+            'queries': timings.queries,
+            'stages_ms': timings.stages_ms(),
+            'events': timings.events,
+            'stats': {name: snapshot() for name, snapshot in _log_stats.items()}
+        }))
+    return response
@@ -0,0 +1,13 @@
+'''
+Общий рантайм облачных функций: роутер, пул соединений, построение ответов и ошибки.
+Исходник — backend/runtime; в каталоги функций копируется через backend/sync_runtime.py,
+потому что каждая функция деплоится отдельно.
+'''
+from .db import acquire_connection, release_connection, pool_stats
+from .errors import HttpError, BadRequest, Unauthorized, NotFound, MethodNotAllowed
+from .responses import (
+    DB_JSON_RESPONSES, json_response, raw_json_response, error_response, not_modified, etag_matches,
+    compress_response, get_header
+)
+from .router import Request, Router
+from .timing import timed, annotate, log_stats
@@ -0,0 +1,62 @@
+'''
+Копирует общий пакет backend/runtime в каталог каждой функции из func2url.json:
+функции деплоятся по отдельности и не видят соседние каталоги.
+
+    python backend/sync_runtime.py          # обновить копии
+    python backend/sync_runtime.py --check  # код выхода 1, если копия разошлась с исходником
+'''
+import filecmp
+import json
+import os
+import shutil
+import sys
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(BACKEND_DIR, 'runtime')
+
+def function_names() -> List[str]:
+    with open(os.path.join(BACKEND_DIR, 'func2url.json'), encoding='utf-8') as f:
+        return sorted(json.load(f))
+
+def source_files() -> List[str]:
+    return sorted(name for name in os.listdir(SOURCE_DIR) if name.endswith('.py'))
+
+def out_of_sync(target_dir: str) -> List[str]:
+    '''Файлы, которые отличаются, отсутствуют или лишние в копии'''
+    if not os.path.isdir(target_dir):
+        return source_files()
+    expected = source_files()
+    present = sorted(name for name in os.listdir(target_dir) if name.endswith('.py'))
+    stale = [name for name in present if name not in expected]
+    changed = [name for name in expected
+               if name not in present or not filecmp.cmp(os.path.join(SOURCE_DIR, name), os.path.join(target_dir, name), shallow=False)]
+    return changed + stale
+
+def sync(target_dir: str) -> None:
+    os.makedirs(target_dir, exist_ok=True)
+    for name in os.listdir(target_dir):
+        if name.endswith('.py') and name not in source_files():
+            os.remove(os.path.join(target_dir, name))
+    for name in source_files():
+        shutil.copyfile(os.path.join(SOURCE_DIR, name), os.path.join(target_dir, name))
+
+def main() -> None:
+    check = '--check' in sys.argv[1:]
+    failed = False
+    for function in function_names():
+        target_dir = os.path.join(BACKEND_DIR, function, 'runtime')
+        differences = out_of_sync(target_dir)
+        if not differences:
+            continue
+        if check:
+            print(f"{function}/runtime out of sync: {', '.join(differences)}")
+            failed = True
+        else:
+            sync(target_dir)
+            print(f"{function}/runtime updated: {', '.join(differences)}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
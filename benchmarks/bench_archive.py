@@ -0,0 +1,91 @@
+'''
+Архив перед удалением: cron выгружает устаревшие дневные секции и строки секции по
+умолчанию в NDJSON.gz через именованный курсор и удаляет их только после сверки.
+Показывает скорость выгрузки, размер архива и прирост пикового RSS — он не должен
+зависеть от числа строк. Архивы пишутся во временный каталог и удаляются после прогона.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_archive.py [rows ...]
+'''
+import gzip
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from common import load_function
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_archive'
+
+# Две устаревшие дневные секции и десятая часть строк в секции по умолчанию (дни без секции)
+FILL_SQL = """
+    SELECT ensure_chat_message_partitions(7, CURRENT_DATE - 3);
+    INSERT INTO chat_messages (role, content, chat_id, timestamp, created_at)
+    SELECT 'user', 'Сообщение для проверки архива №' || i || ', немного текста для сжатия', i %% 1000, t.at, t.at
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT CURRENT_DATE - 3 + (i * INTERVAL '2 days' / %(rows)s) - INTERVAL '1 second' AS at) t;
+    INSERT INTO chat_messages (role, content, created_at)
+    SELECT 'assistant', 'Старый ответ вне секций №' || i, CURRENT_DATE - 10 + i * INTERVAL '1 second'
+    FROM generate_series(1, %(rows)s / 10) i;
+    ANALYZE chat_messages;
+"""
+
+def max_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def archived_lines(archive_dir: str) -> int:
+    total = 0
+    for name in os.listdir(archive_dir):
+        if name.endswith('.ndjson.gz'):
+            with gzip.open(os.path.join(archive_dir, name), 'rb') as f:
+                total += sum(1 for _ in f)
+    return total
+
+def run(conn, cron, message_purge, rows: int) -> None:
+    cursor = conn.cursor()
+    cursor.execute(FILL_SQL, {'rows': rows})
+    conn.commit()
+    cursor.close()
+    
+    archive_dir = tempfile.mkdtemp(prefix='chat-archive-')
+    try:
+        rss_before = max_rss_mib()
+        started = time.perf_counter()
+        retired = cron.cleanup_old_messages(conn, archive_dir, days_to_keep=1)
+        partitions_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        purge = message_purge.purge_old_messages(conn, days_to_keep=1, table='chat_messages_default',
+                                                 budget_seconds=600, archive_dir=archive_dir)
+        purge_seconds = time.perf_counter() - started
+        rss_growth = max_rss_mib() - rss_before
+        
+        archived = sum(count for _, count in retired)
+        archive_bytes = sum(os.path.getsize(os.path.join(archive_dir, name)) for name in os.listdir(archive_dir)
+                            if name.endswith('.ndjson.gz'))
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM chat_messages WHERE created_at < LOCALTIMESTAMP - INTERVAL '1 day'")
+        left = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+        
+        print(f"{rows:>9} rows  partitions: {len(retired)} / {archived} rows {partitions_seconds:6.2f}s "
+              f"({archived / partitions_seconds:8.0f} rows/s)  default: {purge['deleted']} rows in {purge['chunks']} chunks "
+              f"{purge_seconds:6.2f}s ({purge['stopped']})  archive {archive_bytes / 1048576:7.1f} MiB, "
+              f"lines {archived_lines(archive_dir)}, expired left {left}, max RSS +{rss_growth:.1f} MiB")
+    finally:
+        shutil.rmtree(archive_dir)
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    
+    cron = load_function('cleanup-cron')
+    message_purge = sys.modules['message_purge']
+    
+    with scratch_database(DATABASE) as conn:
+        for rows in sizes:
+            run(conn, cron, message_purge, rows)
+
+if __name__ == '__main__':
+    main()
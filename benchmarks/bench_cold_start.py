@@ -0,0 +1,64 @@
+'''
+Время импорта index.py облачной функции в свежем интерпретаторе — то, что платит
+холодный старт до первого запроса. Меряется без байткода (-B, __pycache__ функции
+удаляется) и с уже скомпилированным .pyc.
+
+    python benchmarks/bench_cold_start.py [function] [runs]
+'''
+import marshal
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, report
+
+PROBE = '''
+import sys, time
+sys.path.insert(0, {function_dir!r})
+import importlib.util
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('probe', {index_path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print((time.perf_counter() - started) * 1000)
+'''
+
+def import_times(function_dir: str, runs: int, bytecode: bool) -> list:
+    '''Импорт index.py в отдельных процессах; сторонние модули (psycopg2) уже в кеше ОС'''
+    probe = PROBE.format(function_dir=function_dir, index_path=os.path.join(function_dir, 'index.py'))
+    samples = []
+    for _ in range(runs):
+        if not bytecode:
+            shutil.rmtree(os.path.join(function_dir, '__pycache__'), ignore_errors=True)
+        flags = [] if bytecode else ['-B']
+        output = subprocess.run([sys.executable, *flags, '-c', probe], capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return samples
+
+def compile_times(function_dir: str, runs: int) -> list:
+    '''Только компиляция index.py — доля самого модуля без импорта зависимостей'''
+    path = os.path.join(function_dir, 'index.py')
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        code = compile(source, path, 'exec')
+        samples.append((time.perf_counter() - started) * 1000)
+    print(f"index.py: {len(source.splitlines())} lines, {len(marshal.dumps(code))} bytes of bytecode")
+    return samples
+
+def main() -> None:
+    function = sys.argv[1] if len(sys.argv) > 1 else 'lua-knowledge'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    function_dir = os.path.abspath(os.path.join(BACKEND_DIR, function))
+    
+    report(f'{function} compile index.py', compile_times(function_dir, runs))
+    report(f'{function} import, no bytecode', import_times(function_dir, runs, bytecode=False))
+    import_times(function_dir, 1, bytecode=True)
+    report(f'{function} import, cached .pyc', import_times(function_dir, runs, bytecode=True))
+
+if __name__ == '__main__':
+    main()
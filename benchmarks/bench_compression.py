@@ -0,0 +1,65 @@
+'''
+Размер и время сборки ответа со сжатием и без: список базы знаний Lua
+и страница истории чата из 100 сообщений. Данные — стартовый корпус базы знаний
+и сообщения из корпуса чата в отдельной базе с миграциями из db_migrations;
+сама база из DATABASE_URL не трогается.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_compression.py [iterations]
+'''
+import json
+import sys
+
+from common import load_function, load_corpus, make_event, measure, report
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_compression'
+BENCH_CHAT_ID = -1013
+
+def fill_history(conn, chat, size: int) -> None:
+    '''Отдельный чат с size сообщениями из корпуса, чтобы страница была полной'''
+    corpus = load_corpus()
+    rows = []
+    for position in range(size // 2):
+        message = corpus[position % len(corpus)]
+        rows.append(('user', message))
+        rows.append(('assistant', chat.answer_message(message, conn)))
+    chat.save_messages(rows, conn, BENCH_CHAT_ID)
+    conn.commit()
+
+def compare(label: str, payload, iterations: int) -> None:
+    compress_response = sys.modules['runtime'].compress_response
+    plain_event = make_event()
+    gzip_event = make_event(headers={'Accept-Encoding': 'gzip, deflate, br'})
+    
+    def build(event):
+        response = {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps(payload)
+        }
+        return compress_response(event, response)
+    
+    plain = build(plain_event)
+    compressed = build(gzip_event)
+    print(f"{label}: {len(plain['body'].encode('utf-8'))} bytes plain, "
+          f"{len(compressed['body'])} bytes gzip+base64 (Content-Encoding={compressed['headers'].get('Content-Encoding')})")
+    report(f'{label} json only', measure(lambda: build(plain_event), iterations))
+    report(f'{label} json + gzip', measure(lambda: build(gzip_event), iterations))
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    
+    lua = load_function('lua-knowledge')
+    chat = load_function('chat')
+    with scratch_database(DATABASE) as conn:
+        lua.seed_initial_knowledge(conn)
+        compare('kb listing', lua.get_all_lua_knowledge(conn), iterations)
+        conn.rollback()
+        
+        fill_history(conn, chat, 100)
+        history = chat.get_messages(conn, chat_id=BENCH_CHAT_ID, limit=100)
+        compare(f'history ({len(history)} messages)', history, iterations)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+'''
+JSON списков из базы против прежнего пути через Python: весь список базы знаний Lua,
+страница истории чата и список API-ключей. Для каждого — время на вызов, CPU процесса
+функции и пик выделенной памяти Python за вызов (tracemalloc). Перед замером проверяется,
+что оба пути отдают одинаковые данные.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_db_json.py [--scale 10k] [--iterations 20]
+'''
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from common import load_corpus, load_function
+from scratch_db import scratch_database
+from synthetic_data import generate, parse_scale
+
+DATABASE = 'madai_bench_db_json'
+
+def measure(fn, iterations: int):
+    '''(мс на вызов, мс CPU процесса на вызов, пик памяти Python за вызов в МиБ)'''
+    fn()
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    for _ in range(iterations):
+        fn()
+    wall = (time.perf_counter() - wall_started) / iterations * 1000
+    cpu = (time.process_time() - cpu_started) / iterations * 1000
+    
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1048576
+    tracemalloc.stop()
+    return wall, cpu, peak
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='10k')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--page', type=int, default=500, help='сообщений на странице истории')
+    args = parser.parse_args()
+    rows = parse_scale(args.scale)
+    
+    lua = load_function('lua-knowledge')
+    chat = load_function('chat')
+    api_keys = load_function('api-keys')
+    
+    with scratch_database(DATABASE) as conn:
+        generate(conn, rows, load_corpus(), chats=10, api_keys=max(50, rows // 100))
+        cursor = conn.cursor()
+        cursor.execute("SELECT chat_id FROM chat_messages WHERE chat_id IS NOT NULL GROUP BY chat_id ORDER BY COUNT(*) DESC LIMIT 1")
+        chat_id = cursor.fetchone()[0]
+        cursor.close()
+        conn.commit()
+        
+        cases = (
+            ('kb listing', lambda: json.dumps(lua.get_all_lua_knowledge(conn)),
+             lambda: lua.get_all_lua_knowledge_json(conn)),
+            (f'history page {args.page}', lambda: json.dumps(chat.get_messages(conn, chat_id=chat_id, limit=args.page)),
+             lambda: chat.get_messages_json(conn, chat_id=chat_id, limit=args.page)),
+            ('api keys', lambda: json.dumps(api_keys.get_api_keys(conn)),
+             lambda: api_keys.get_api_keys_json(conn)),
+        )
+        print(f'scale {args.scale}: {rows} rows per table, {args.iterations} iterations')
+        for label, python_path, db_path in cases:
+            python_body, db_body = python_path(), db_path()
+            conn.rollback()
+            if json.loads(python_body) != json.loads(db_body):
+                sys.exit(f'{label}: JSON из базы не совпадает с прежним ответом')
+            items = len(json.loads(db_body))
+            for name, fn in (('python', python_path), ('db json', db_path)):
+                wall, cpu, peak = measure(fn, args.iterations)
+                conn.rollback()
+                print(f'  {label:<18} {name:<8} {items:>6} items  {wall:8.1f} ms  cpu {cpu:8.1f} ms  peak {peak:7.1f} MiB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+'''
+Задержка generate_ai_response на сообщение с in-memory индексом сущностей и без него.
+Порог ENTITY_INDEX_MAX_ROWS здесь снят: «on» — всегда поиск в памяти, при любом размере базы.
+Перед замером проверяется, что с индексом и без него на каждое сообщение корпуса один ответ.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_entity_index.py [iterations]
+'''
+import sys
+
+from common import load_function, load_corpus, require_database_url, measure, report
+
+def main() -> None:
+    database_url = require_database_url()
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    
+    chat = load_function('chat')
+    entity_index = sys.modules['entity_index']
+    runtime = sys.modules['runtime']
+    corpus = load_corpus()
+    conn = runtime.acquire_connection(database_url)
+    
+    def run_corpus() -> list:
+        answers = []
+        for message in corpus:
+            answers.append(chat.generate_ai_response(message, conn))
+            conn.commit()
+        return answers
+    
+    entity_index.ENTITY_INDEX_MAX_ROWS = sys.maxsize
+    answers = {}
+    for enabled in (False, True):
+        entity_index.ENTITY_INDEX_ENABLED = enabled
+        entity_index.reset_entity_index()
+        answers[enabled] = run_corpus()
+    for message, without_index, with_index in zip(corpus, answers[False], answers[True]):
+        if without_index != with_index:
+            sys.exit(f'ответ с индексом и без него разошёлся: {message!r}')
+    
+    for enabled in (False, True):
+        entity_index.ENTITY_INDEX_ENABLED = enabled
+        entity_index.reset_entity_index()
+        run_corpus()
+        samples = measure(run_corpus, iterations)
+        per_message = [sample / len(corpus) for sample in samples]
+        report(f"entity index {'on' if enabled else 'off'} (per message)", per_message)
+    
+    runtime.release_connection(conn)
+
+if __name__ == '__main__':
+    main()
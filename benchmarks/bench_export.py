@@ -0,0 +1,76 @@
+'''
+Выгрузка истории чата: прежний путь (fetchall, список словарей, json.dumps всего ответа)
+против export_history (именованный курсор, кодирование порциями, gzip на лету).
+Скорость меряется отдельно от памяти: tracemalloc замедляет оба пути.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_export.py [rows ...]
+'''
+import sys
+import time
+import tracemalloc
+
+from common import load_function
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_export'
+BENCH_CHAT_ID = 42
+
+FILL_SQL = """
+    SELECT ensure_chat_message_partitions(7, CURRENT_DATE - 1);
+    TRUNCATE chat_messages;
+    INSERT INTO chat_messages (role, content, chat_id, timestamp, created_at)
+    SELECT CASE WHEN i %% 2 = 0 THEN 'user' ELSE 'assistant' END,
+           'Сообщение №' || i || ': как сделать "двойной прыжок" в Roblox, через Humanoid.JumpPower?',
+           %(chat_id)s, t.at, t.at
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT CURRENT_TIMESTAMP - (%(rows)s - i) * (INTERVAL '20 hours' / %(rows)s) AS at) t;
+    ANALYZE chat_messages;
+"""
+
+def measure(fn):
+    '''(секунды, пиковая память Python в МиБ, результат)'''
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1048576
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    
+    chat = load_function('chat')
+    history_export = sys.modules['history_export']
+    runtime = sys.modules['runtime']
+    
+    with scratch_database(DATABASE) as conn:
+        for rows in sizes:
+            cursor = conn.cursor()
+            cursor.execute(FILL_SQL, {'rows': rows, 'chat_id': BENCH_CHAT_ID})
+            conn.commit()
+            cursor.close()
+            
+            def full_list():
+                body = runtime.json_response(chat.get_messages(conn, chat_id=BENCH_CHAT_ID, limit=rows))['body']
+                conn.rollback()
+                return len(body.encode('utf-8'))
+            
+            def export(fmt):
+                def run():
+                    result = history_export.export_history(conn, fmt, chat_id=BENCH_CHAT_ID, max_rows=rows)
+                    conn.rollback()
+                    assert result['rows'] == rows
+                    return len(result['body'])
+                return run
+            
+            print(f'{rows} rows')
+            for name, fn in (('fetchall + json.dumps', full_list), ('export ndjson.gz', export('ndjson')),
+                             ('export csv.gz', export('csv'))):
+                seconds, peak, size = measure(fn)
+                print(f'  {name:<22} {seconds:7.2f}s {rows / seconds:9.0f} rows/s  '
+                      f'peak {peak:8.1f} MiB  body {size / 1048576:7.1f} MiB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+Массовый импорт базы знаний через handler lua-knowledge (?import=ndjson):
+первая загрузка синтетических статей, повторная (всё пропускается) и загрузка
+с изменённой десятой частью записей. Импорт идёт в отдельную базу с миграциями
+из db_migrations на сервере из DATABASE_URL; сама база из DATABASE_URL не трогается.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_kb_import.py [rows]
+'''
+import json
+import sys
+import time
+
+from common import load_function, make_event
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_kb_import'
+BENCH_CATEGORY = 'Bench import'
+
+def make_body(rows: int, revision: int = 0) -> str:
+    lines = []
+    for position in range(rows):
+        changed = revision and position % 10 == 0
+        lines.append(json.dumps({
+            'category': BENCH_CATEGORY,
+            'topic': f'Статья {position}',
+            'description': f'Описание статьи {position}' + (f' (ред. {revision})' if changed else ''),
+            'code_example': f'local value = {position}\nprint(value)',
+            'explanation': 'Синтетическая запись для бенчмарка импорта',
+            'keywords': ['bench', f'k{position % 50}'],
+            'is_roblox': position % 3 == 0
+        }, ensure_ascii=False))
+    return '\n'.join(lines)
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    
+    lua = load_function('lua-knowledge')
+    runs = (('initial load', make_body(rows)), ('re-import', make_body(rows)), ('10% changed', make_body(rows, 1)))
+    
+    # Функции читают DATABASE_URL на каждом запросе, scratch_database направляет его в свою базу
+    with scratch_database(DATABASE):
+        for label, body in runs:
+            event = make_event('POST', query={'import': 'ndjson'})
+            event['body'] = body
+            started = time.perf_counter()
+            response = lua.handler(event, None)
+            elapsed = time.perf_counter() - started
+            result = json.loads(response['body'])
+            print(f"{label:<14} status={response['statusCode']} inserted={result.get('inserted')} "
+                  f"updated={result.get('updated')} skipped={result.get('skipped')} "
+                  f"handler={elapsed * 1000:.1f}ms rows/s={rows / elapsed:,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Поиск по базе знаний в режиме «ищем по мере набора»: каждый запрос корпуса
+отправляется всеми префиксами от 2 символов, через handler функции lua-knowledge.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_kb_search.py [rounds]
+
+KB_SEARCH_P95_BUDGET_MS задаёт бюджет p95 (по умолчанию 50 мс); при превышении код выхода 1.
+'''
+import os
+import sys
+
+from common import load_function, make_event, require_database_url, measure, percentile, report
+
+QUERIES = [
+    'цикл for', 'таблицы', 'функции', 'roblox', 'RemoteEvent', 'метатаблицы',
+    'строки', 'workspace part', 'события', 'корутины', 'условия if', 'touched'
+]
+
+def main() -> None:
+    require_database_url()
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(os.environ.get('KB_SEARCH_P95_BUDGET_MS', '50'))
+    
+    lua = load_function('lua-knowledge')
+    prefixes = [query[:length] for query in QUERIES for length in range(2, len(query) + 1)]
+    events = [make_event(query={'q': prefix, 'limit': '10'}) for prefix in prefixes]
+    
+    lua.handler(events[0], None)
+    position = 0
+    
+    def search() -> None:
+        nonlocal position
+        response = lua.handler(events[position % len(events)], None)
+        assert response['statusCode'] == 200, response
+        position += 1
+    
+    samples = measure(search, rounds * len(events))
+    report('search-as-you-type (handler)', samples)
+    
+    p95 = percentile(samples, 0.95)
+    print(f"p95 budget {budget_ms:.1f}ms: {'ok' if p95 <= budget_ms else 'EXCEEDED'}")
+    if p95 > budget_ms:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''
+Запись пары сообщений user/assistant: два INSERT с двумя коммитами (как было)
+против одного многострочного INSERT с одним коммитом. Пишет в отдельную базу
+с миграциями из db_migrations; сама база из DATABASE_URL не трогается.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_persistence.py [pairs]
+'''
+import sys
+
+import psycopg2
+import psycopg2.extensions
+
+from common import load_function, measure, report
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_persistence'
+
+class CountingConnection(psycopg2.extensions.connection):
+    '''Соединение, которое считает вызовы commit()'''
+    
+    commits = 0
+    
+    def commit(self) -> None:
+        self.commits += 1
+        super().commit()
+
+def legacy_save_pair(conn, user_content: str, assistant_content: str) -> None:
+    '''Прежний путь: save_message('user') и save_message('assistant'), каждый со своим коммитом'''
+    for role, content in (('user', user_content), ('assistant', assistant_content)):
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO chat_messages (role, content)
+            VALUES (%s, %s)
+            RETURNING id, role, content, timestamp
+        """, (role, content))
+        cursor.fetchone()
+        conn.commit()
+        cursor.close()
+
+def main() -> None:
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    
+    chat = load_function('chat')
+    with scratch_database(DATABASE, connection_factory=CountingConnection) as conn:
+        # Дневные секции, как их заводит cleanup-cron: вставки идут в секцию текущего дня
+        cursor = conn.cursor()
+        cursor.execute("SELECT ensure_chat_message_partitions(7)")
+        conn.commit()
+        cursor.close()
+        
+        def single_commit_pair() -> None:
+            chat.save_messages([('user', 'bench question'), ('assistant', 'bench answer')], conn)
+            conn.commit()
+        
+        variants = (
+            ('two commits per pair', lambda: legacy_save_pair(conn, 'bench question', 'bench answer')),
+            ('one commit per pair', single_commit_pair),
+        )
+        for label, fn in variants:
+            conn.commits = 0
+            samples = measure(fn, pairs)
+            report(label, samples)
+            print(f"{'':<40} commits per pair={conn.commits / pairs:.2f}")
+
+if __name__ == '__main__':
+    main()
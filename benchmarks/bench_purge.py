@@ -0,0 +1,63 @@
+'''
+Очистка истории пачками против одного DELETE на обычной (несекционированной) chat_messages,
+как до V0012. Показывает каждый запуск cron: сколько удалено, за сколько пачек, скорость
+и остаток; бюджет запуска маленький, чтобы было видно продолжение на следующем тике.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_purge.py [old_rows] [budget_seconds]
+'''
+import sys
+import time
+
+from common import load_function
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_purge'
+
+FILL_SQL = """
+    INSERT INTO chat_messages (role, content, chat_id, timestamp, created_at)
+    SELECT 'user', 'Сообщение для проверки очистки ' || i, i %% 1000, t.at, t.at
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT LOCALTIMESTAMP - INTERVAL '3 days' + (i * INTERVAL '1 day' / %(rows)s) AS at) t;
+    INSERT INTO chat_messages (role, content, created_at)
+    SELECT 'user', 'Свежее сообщение ' || i, LOCALTIMESTAMP - i * INTERVAL '1 second'
+    FROM generate_series(1, 1000) i;
+    ANALYZE chat_messages;
+"""
+
+def fill(conn, rows: int) -> None:
+    cursor = conn.cursor()
+    cursor.execute(FILL_SQL, {'rows': rows})
+    conn.commit()
+    cursor.close()
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    
+    load_function('cleanup-cron')
+    message_purge = sys.modules['message_purge']
+    
+    with scratch_database(DATABASE, until=11) as conn:
+        fill(conn, rows)
+        cursor = conn.cursor()
+        started = time.perf_counter()
+        cursor.execute("DELETE FROM chat_messages WHERE created_at < LOCALTIMESTAMP - INTERVAL '1 day'")
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        elapsed = time.perf_counter() - started
+        print(f'single DELETE: {deleted} rows in one transaction, {elapsed:.2f}s ({deleted / elapsed:.0f} rows/s)')
+        
+        fill(conn, rows)
+        tick = 0
+        while True:
+            tick += 1
+            result = message_purge.purge_old_messages(conn, days_to_keep=1, budget_seconds=budget)
+            print(f"tick {tick}: deleted {result['deleted']:>7} in {result['chunks']:>3} chunks, "
+                  f"{result['seconds']:.2f}s, {result['rows_per_second']:.0f} rows/s, "
+                  f"stopped={result['stopped']}, backlog {result['backlog']}{'+' if result['backlog_capped'] else ''}")
+            if result['backlog'] == 0:
+                break
+
+if __name__ == '__main__':
+    main()
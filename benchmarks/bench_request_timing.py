@@ -0,0 +1,65 @@
+'''
+Стоимость замера этапов: сам timed() и полный запрос через handler с выключенным
+замером, с замером без лога и с замером и логом каждого запроса.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_request_timing.py [iterations]
+'''
+import contextlib
+import os
+import sys
+
+from common import load_function, make_event, require_database_url, measure, report, percentile
+
+ROUNDS = 20
+
+def main() -> None:
+    require_database_url()
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    
+    lua = load_function('lua-knowledge')
+    timing = sys.modules['runtime.timing']
+    
+    def stages() -> None:
+        for name in ('connect', 'auth', 'search', 'save'):
+            with timing.timed(name):
+                pass
+    
+    report('4x timed(), no request', measure(stages, iterations * 10), 'ms')
+    timing.start_request()
+    report('4x timed(), inside request', measure(stages, iterations * 10), 'ms')
+    timing._current_timings.set(None)
+    
+    def instrumentation_only() -> None:
+        timings = timing.start_request()
+        stages()
+        timing.finish_request(timings, {'statusCode': 200, 'headers': {}}, None)
+    
+    timing.REQUEST_LOG_SAMPLE_RATE = 0.0
+    report('start + 4 stages + finish, no log', measure(instrumentation_only, iterations * 10), 'ms')
+    
+    event = make_event(query={'id': '1', 'fields': 'id,topic'})
+    lua.handler(event, None)
+    
+    def request() -> None:
+        response = lua.handler(event, None)
+        assert response['statusCode'] == 200, response
+    
+    configs = (('timing off', False, 0.0),
+               ('timing on, no log', True, 0.0),
+               ('timing on, log every request', True, 1.0))
+    results = {label: [] for label, _, _ in configs}
+    # Конфигурации чередуются короткими сериями, чтобы дрейф БД и кешей не лёг на одну из них
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(ROUNDS):
+            for label, enabled, sample_rate in configs:
+                timing.REQUEST_TIMING_ENABLED = enabled
+                timing.REQUEST_LOG_SAMPLE_RATE = sample_rate
+                results[label].extend(measure(request, iterations // ROUNDS))
+    
+    baseline = percentile(results['timing off'], 0.50)
+    for label, samples in results.items():
+        report(f'handler, {label}', samples)
+        print(f"{'':<40} p50 overhead {percentile(samples, 0.50) - baseline:+.3f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+Стоимость срока хранения истории: прежний DELETE ... WHERE created_at < срок по обычной
+таблице против retire_chat_message_partitions по дневным секциям. Время и объём WAL
+при разном числе устаревших сообщений; база создаётся отдельная и удаляется после прогона.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_retention.py [rows ...]
+'''
+import sys
+import time
+
+from scratch_db import scratch_database
+
+DATABASE = 'madai_bench_retention'
+
+# Обычная таблица с индексами, какие были у chat_messages до секционирования
+LEGACY_TABLE_SQL = """
+    CREATE TABLE chat_messages_legacy (LIKE chat_messages INCLUDING DEFAULTS);
+    CREATE INDEX ON chat_messages_legacy (chat_id, created_at, id);
+    CREATE INDEX ON chat_messages_legacy (created_at);
+    CREATE INDEX ON chat_messages_legacy (timestamp DESC);
+"""
+
+FILL_SQL = """
+    INSERT INTO {table} (role, content, chat_id, timestamp, created_at)
+    SELECT 'user', 'Сообщение для проверки срока хранения ' || i, i %% 1000, t.at, t.at
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT CURRENT_DATE - 3 + (i * INTERVAL '1 day' / %(rows)s) AS at) t
+"""
+
+def measure_wal(conn, sql: str, params=None):
+    '''(секунды, байты WAL, результат) для одного запроса в своей транзакции'''
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_current_wal_insert_lsn()")
+    start_lsn = cursor.fetchone()[0]
+    started = time.perf_counter()
+    cursor.execute(sql, params)
+    result = cursor.rowcount if cursor.description is None else len(cursor.fetchall())
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)", (start_lsn,))
+    wal_bytes = int(cursor.fetchone()[0])
+    conn.commit()
+    cursor.close()
+    return elapsed, wal_bytes, result
+
+def run(conn, rows: int) -> None:
+    cursor = conn.cursor()
+    cursor.execute("SELECT ensure_chat_message_partitions(7, CURRENT_DATE - 3)")
+    cursor.execute(FILL_SQL.format(table='chat_messages'), {'rows': rows})
+    cursor.execute(FILL_SQL.format(table='chat_messages_legacy'), {'rows': rows})
+    conn.commit()
+    cursor.close()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("VACUUM ANALYZE chat_messages")
+    cursor.execute("VACUUM ANALYZE chat_messages_legacy")
+    cursor.close()
+    conn.autocommit = False
+    
+    delete_seconds, delete_wal, deleted = measure_wal(
+        conn, "DELETE FROM chat_messages_legacy WHERE created_at < LOCALTIMESTAMP - INTERVAL '1 day'")
+    retire_seconds, retire_wal, partitions = measure_wal(
+        conn, "SELECT * FROM retire_chat_message_partitions(INTERVAL '1 day')")
+    
+    print(f"{rows:>9} rows  DELETE: {deleted:>8} rows {delete_seconds * 1000:9.1f}ms {delete_wal / 1024:10.0f} KiB WAL  |  "
+          f"retire: {partitions} partitions {retire_seconds * 1000:7.1f}ms {retire_wal / 1024:6.0f} KiB WAL")
+    
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE chat_messages, chat_messages_legacy")
+    conn.commit()
+    cursor.close()
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    
+    with scratch_database(DATABASE) as conn:
+        cursor = conn.cursor()
+        cursor.execute(LEGACY_TABLE_SQL)
+        conn.commit()
+        cursor.close()
+        for rows in sizes:
+            run(conn, rows)
+
+if __name__ == '__main__':
+    main()
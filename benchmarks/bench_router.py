@@ -0,0 +1,59 @@
+'''
+Стоимость маршрутизации одного сообщения: прежняя цепочка `in`-проверок и
+calculate_math на каждом сообщении против скомпилированного intent_router.
+База данных не нужна.
+
+    python benchmarks/bench_router.py [iterations]
+'''
+import sys
+
+from common import load_function, load_corpus, measure, report
+
+LEGACY_HELP_KEYWORDS = ['function', 'функция', 'table', 'таблица', 'loop', 'цикл',
+                        'roblox', 'script', 'game', 'workspace', 'part']
+
+def legacy_route(message: str, calculate_math) -> str:
+    '''Маршрутизация в том виде, в каком она была до intent_router'''
+    message_lower = message.lower()
+    if calculate_math(message):
+        return 'math'
+    if 'создал' in message_lower and 'madai' in message_lower or 'кто создал' in message_lower or 'автор' in message_lower:
+        return 'creator'
+    if any(keyword in message_lower for keyword in LEGACY_HELP_KEYWORDS):
+        return 'roblox_help' if 'roblox' in message_lower else 'lua_help'
+    return 'web'
+
+def compiled_route(message: str, calculate_math, router) -> str:
+    route = router.route_message(message.lower())
+    if route.intent == router.INTENT_MATH and calculate_math(message):
+        return 'math'
+    if route.creator:
+        return 'creator'
+    return route.fallback
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    
+    chat = load_function('chat')
+    router = sys.modules['intent_router']
+    corpus = load_corpus()
+    
+    mismatches = [message for message in corpus
+                  if legacy_route(message, chat.calculate_math) != compiled_route(message, chat.calculate_math, router)]
+    if mismatches:
+        print('router disagrees with the legacy chain on:', mismatches)
+    
+    def run_legacy() -> None:
+        for message in corpus:
+            legacy_route(message, chat.calculate_math)
+    
+    def run_compiled() -> None:
+        for message in corpus:
+            compiled_route(message, chat.calculate_math, router)
+    
+    for label, fn in (('legacy routing', run_legacy), ('compiled router', run_compiled)):
+        samples = measure(fn, iterations)
+        report(f"{label} (per message)", [sample * 1000 / len(corpus) for sample in samples], unit='us')
+
+if __name__ == '__main__':
+    main()
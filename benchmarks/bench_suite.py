@@ -0,0 +1,247 @@
+'''
+Сквозной бенчмарк горячего пути: отдельная база с миграциями из db_migrations,
+синтетические данные заданного масштаба и смесь запросов прямо в handler функций.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_suite.py --scale 100k
+    PG_BIN=/usr/lib/postgresql/16/bin python benchmarks/bench_suite.py --start-postgres --scale 1k
+
+DATABASE_URL — сервер, на котором создаётся база madai_bench_<scale> (нужно право CREATEDB);
+сама база из DATABASE_URL не трогается. --start-postgres вместо этого поднимает одноразовый
+кластер через initdb/pg_ctl. Каждый сценарий выводит p50/p95/p99, число запросов к БД
+на вызов (из Server-Timing) и пропускную способность в один поток — как один тёплый контейнер.
+
+--json сохраняет результат; --baseline сравнивает с сохранённым и завершается с кодом 1,
+если p95 сценария вырос больше чем на --tolerance или стало больше запросов к БД.
+'''
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+import psycopg2
+
+from common import load_function, load_corpus, make_event, percentile
+from scratch_db import apply_migrations, database_exists, database_url_for, drop_database, recreate_database, temporary_cluster
+from synthetic_data import generate, build_catalog, parse_scale, KB_SUBJECTS
+
+QUERIES_METRIC = re.compile(r'queries;desc="(\d+)"')
+# Полный список базы знаний без параметров отдаёт все строки — на больших масштабах сценарий выключается
+FULL_LISTING_MAX_ROWS = 10_000
+
+class Scenario:
+    '''Один тип запроса: какая функция, с каким весом в смеси и как собрать event'''
+    
+    def __init__(self, name: str, function: str, weight: int, build: Callable[..., Dict[str, Any]]):
+        self.name = name
+        self.function = function
+        self.weight = weight
+        self.build = build
+
+def _chat_post(message: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+    headers = {'X-Api-Key': api_key} if api_key else {}
+    return make_event('POST', body={'message': message}, headers=headers)
+
+def default_scenarios(corpus: List[str], catalog: Dict[str, List[Any]], etags: Dict[Any, str]) -> List[Scenario]:
+    def pick(rng: random.Random, key: str) -> Any:
+        return rng.choice(catalog[key])
+    
+    def history_304(rng: random.Random) -> Dict[str, Any]:
+        if not etags:
+            return make_event(query={'chat_id': str(pick(rng, 'chat_ids')), 'limit': '50'})
+        chat_id, etag = rng.choice(list(etags.items()))
+        return make_event(query={'chat_id': str(chat_id), 'limit': '50'}, headers={'If-None-Match': etag})
+    
+    scenarios = [
+        # Повторяющиеся вопросы пользователей — основная доля попаданий в кеш ответов
+        Scenario('chat: corpus message', 'chat', 25,
+                 lambda rng: _chat_post(rng.choice(corpus), pick(rng, 'api_keys'))),
+        Scenario('chat: unique message', 'chat', 10,
+                 lambda rng: _chat_post(f'{rng.choice(corpus)} {rng.randrange(10 ** 9)}')),
+        Scenario('chat: game lookup', 'chat', 10,
+                 lambda rng: _chat_post(f"расскажи про {pick(rng, 'games')}")),
+        Scenario('chat: celebrity lookup', 'chat', 5,
+                 lambda rng: _chat_post(f"кто такой {pick(rng, 'celebrities')}")),
+        Scenario('chat: lua question', 'chat', 10,
+                 lambda rng: _chat_post(f'как работает {rng.choice(KB_SUBJECTS)} в lua')),
+        Scenario('chat: math', 'chat', 5,
+                 lambda rng: _chat_post(f'сколько будет {rng.randint(2, 999)} * {rng.randint(2, 999)}')),
+        Scenario('chat: history page', 'chat', 10,
+                 lambda rng: make_event(query={'chat_id': str(pick(rng, 'chat_ids')), 'limit': '50'})),
+        Scenario('chat: history 304', 'chat', 5, history_304),
+        Scenario('chat: poll', 'chat', 10,
+                 lambda rng: make_event(query={'chat_id': str(pick(rng, 'chat_ids')), 'poll': '1', 'after_id': '1'})),
+        Scenario('kb: search', 'lua-knowledge', 5,
+                 lambda rng: make_event(query={'q': rng.choice(KB_SUBJECTS), 'limit': '10'})),
+        Scenario('kb: listing page', 'lua-knowledge', 3,
+                 lambda rng: make_event(query={'category': rng.choice(['Основы', 'Roblox', 'Таблицы']), 'limit': '50'})),
+        Scenario('kb: item', 'lua-knowledge', 2,
+                 lambda rng: make_event(query={'id': str(pick(rng, 'kb_ids'))})),
+        Scenario('api-keys: list', 'api-keys', 1, lambda rng: make_event()),
+    ]
+    if catalog['row_counts']['lua_knowledge_base'] <= FULL_LISTING_MAX_ROWS:
+        scenarios.append(Scenario('kb: full listing', 'lua-knowledge', 1, lambda rng: make_event()))
+    return scenarios
+
+def queries_of(response: Dict[str, Any]) -> Optional[int]:
+    match = QUERIES_METRIC.search(response.get('headers', {}).get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+def run(scenarios: List[Scenario], handlers: Dict[str, Any], requests: int, rng: random.Random,
+        etags: Dict[Any, str]) -> Tuple[Dict[str, Dict[str, Any]], float]:
+    samples: Dict[str, Dict[str, List]] = {s.name: {'ms': [], 'queries': [], 'errors': []} for s in scenarios}
+    weights = [s.weight for s in scenarios]
+    
+    started = time.perf_counter()
+    for _ in range(requests):
+        scenario = rng.choices(scenarios, weights)[0]
+        event = scenario.build(rng)
+        call_started = time.perf_counter()
+        response = handlers[scenario.function].handler(event, None)
+        elapsed_ms = (time.perf_counter() - call_started) * 1000
+        
+        bucket = samples[scenario.name]
+        bucket['ms'].append(elapsed_ms)
+        bucket['queries'].append(queries_of(response) or 0)
+        if response['statusCode'] not in (200, 201, 304):
+            bucket['errors'].append(f"{response['statusCode']}: {response.get('body', '')[:200]}")
+        etag = response.get('headers', {}).get('ETag')
+        if etag and scenario.name.startswith('chat: history'):
+            etags[(event['queryStringParameters'] or {}).get('chat_id')] = etag
+    wall_seconds = time.perf_counter() - started
+    
+    results = {}
+    for name, bucket in samples.items():
+        if not bucket['ms']:
+            continue
+        results[name] = {
+            'n': len(bucket['ms']),
+            'p50': round(percentile(bucket['ms'], 0.50), 3),
+            'p95': round(percentile(bucket['ms'], 0.95), 3),
+            'p99': round(percentile(bucket['ms'], 0.99), 3),
+            'queries': round(sum(bucket['queries']) / len(bucket['queries']), 2),
+            'rps': round(len(bucket['ms']) / (sum(bucket['ms']) / 1000), 1),
+            'errors': len(bucket['errors']),
+            'first_error': bucket['errors'][0] if bucket['errors'] else None
+        }
+    return results, wall_seconds
+
+def print_results(results: Dict[str, Dict[str, Any]], requests: int, wall_seconds: float) -> None:
+    print(f"{'scenario':<26} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'q/req':>6} {'req/s':>8} {'err':>4}")
+    for name, r in results.items():
+        print(f"{name:<26} {r['n']:>6} {r['p50']:>9.3f} {r['p95']:>9.3f} {r['p99']:>9.3f} "
+              f"{r['queries']:>6.2f} {r['rps']:>8.1f} {r['errors']:>4}")
+        if r['first_error']:
+            print(f"{'':<26} first error: {r['first_error']}")
+    print(f"total: {requests} requests in {wall_seconds:.2f}s, throughput {requests / wall_seconds:.1f} req/s (one process)")
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    '''Регрессии относительно сохранённого прогона; микросекундный шум по p95 не считается'''
+    regressions = []
+    for name, r in results.items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        if r['p95'] > base['p95'] * (1 + tolerance) and r['p95'] - base['p95'] > 1.0:
+            regressions.append(f"{name}: p95 {base['p95']:.3f} -> {r['p95']:.3f} ms")
+        if r['queries'] > base['queries'] + 0.01:
+            regressions.append(f"{name}: queries/request {base['queries']:.2f} -> {r['queries']:.2f}")
+    return regressions
+
+def prepare_database(server_url: str, database: str, rows: int, reuse: bool) -> str:
+    if reuse and database_exists(server_url, database):
+        print(f'reusing database {database}')
+        return database_url_for(server_url, database)
+    
+    started = time.perf_counter()
+    database_url = recreate_database(server_url, database)
+    applied = apply_migrations(database_url)
+    print(f'created {database}, applied {len(applied)} migrations ({applied[0]} .. {applied[-1]})', flush=True)
+    
+    conn = psycopg2.connect(database_url)
+    try:
+        for table, seconds in generate(conn, rows, load_corpus()).items():
+            print(f'  {table:<22} {seconds:8.2f}s', flush=True)
+    finally:
+        conn.close()
+    print(f'setup {time.perf_counter() - started:.1f}s')
+    return database_url
+
+def benchmark(server_url: str, args: argparse.Namespace) -> int:
+    rows = parse_scale(args.scale)
+    database = f'madai_bench_{args.scale.lower()}'
+    database_url = prepare_database(server_url, database, rows, args.reuse)
+    
+    # Функции читают DATABASE_URL на каждом запросе; замер включён ради счётчика запросов, лог не нужен
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['REQUEST_TIMING_ENABLED'] = 'true'
+    os.environ['REQUEST_LOG_SAMPLE_RATE'] = '0'
+    os.environ['REQUEST_LOG_SLOW_MS'] = 'inf'
+    
+    rng = random.Random(args.seed)
+    conn = psycopg2.connect(database_url)
+    catalog = build_catalog(conn, rng)
+    conn.close()
+    print('rows: ' + ', '.join(f'{table}={count}' for table, count in catalog['row_counts'].items()))
+    
+    handlers = {name: load_function(name) for name in ('chat', 'lua-knowledge', 'api-keys')}
+    etags: Dict[Any, str] = {}
+    scenarios = default_scenarios(load_corpus(), catalog, etags)
+    
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        warmup_started = time.perf_counter()
+        # Первый запрос каждого сценария платит за соединение, индекс сущностей и кеши
+        for scenario in scenarios:
+            handlers[scenario.function].handler(scenario.build(rng), None)
+        warmup_seconds = time.perf_counter() - warmup_started
+        results, wall_seconds = run(scenarios, handlers, args.requests, rng, etags)
+    
+    print(f'warm-up {warmup_seconds:.2f}s')
+    print_results(results, args.requests, wall_seconds)
+    
+    if not args.keep:
+        drop_database(server_url, database)
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'scale': args.scale, 'rows': catalog['row_counts'], 'requests': args.requests,
+                       'throughput': round(args.requests / wall_seconds, 1), 'scenarios': results}, f, indent=2)
+    
+    failed = sum(r['errors'] for r in results.values())
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        failed += len(regressions)
+    return 1 if failed else 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Сквозной бенчмарк функций на синтетических данных')
+    parser.add_argument('--scale', default='1k', help='строк в каждой таблице: 1k, 10k, 100k, 1m или число')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--start-postgres', action='store_true', help='поднять временный кластер через initdb/pg_ctl')
+    parser.add_argument('--reuse', action='store_true', help='взять базу от прошлого прогона с --keep')
+    parser.add_argument('--keep', action='store_true', help='не удалять базу после прогона')
+    parser.add_argument('--json', help='сохранить результат в файл')
+    parser.add_argument('--baseline', help='сравнить с результатом прошлого прогона')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимый рост p95, доля')
+    args = parser.parse_args()
+    
+    if args.start_postgres:
+        with temporary_cluster() as server_url:
+            sys.exit(benchmark(server_url, args))
+    
+    server_url = os.environ.get('DATABASE_URL')
+    if not server_url:
+        sys.exit('DATABASE_URL is not set: point it at a Postgres server where a scratch database can be created, '
+                 'or pass --start-postgres')
+    sys.exit(benchmark(server_url, args))
+
+if __name__ == '__main__':
+    main()
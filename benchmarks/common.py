@@ -0,0 +1,61 @@
+import importlib.util
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Callable, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chat_messages.txt')
+
+def load_function(name: str):
+    '''Импортирует index.py облачной функции так же, как это делает рантайм'''
+    function_dir = os.path.abspath(os.path.join(BACKEND_DIR, name))
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(function_dir, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_corpus() -> List[str]:
+    '''Сообщения пользователей для бенчмарков, по одному на строку'''
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+def make_event(method: str = 'GET', body: Optional[Dict] = None, query: Optional[Dict] = None,
+               headers: Optional[Dict] = None) -> Dict[str, Any]:
+    event: Dict[str, Any] = {
+        'httpMethod': method,
+        'headers': headers or {},
+        'queryStringParameters': query
+    }
+    if body is not None:
+        event['body'] = json.dumps(body)
+    return event
+
+def require_database_url() -> str:
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is not set: point it at a database with db_migrations applied')
+    return database_url
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def measure(fn: Callable[[], Any], iterations: int) -> List[float]:
+    '''Возвращает длительности вызовов fn в миллисекундах'''
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def report(label: str, samples: List[float], unit: str = 'ms') -> None:
+    print(f"{label:<40} n={len(samples):<6} "
+          f"p50={percentile(samples, 0.50):8.3f}{unit} "
+          f"p95={percentile(samples, 0.95):8.3f}{unit} "
+          f"p99={percentile(samples, 0.99):8.3f}{unit}")
@@ -0,0 +1,145 @@
+'''
+Postgres для сквозных бенчмарков: временный кластер через initdb/pg_ctl
+или уже запущенный сервер, отдельная база под прогон и миграции из db_migrations.
+'''
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import psycopg2
+
+from common import require_database_url
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_migrations')
+MIGRATION_NAME = re.compile(r'^V(\d+)__.+\.sql$')
+
+def migration_files() -> List[str]:
+    '''Файлы миграций в порядке версий: V0002 раньше V0010'''
+    names = [name for name in os.listdir(MIGRATIONS_DIR) if MIGRATION_NAME.match(name)]
+    names.sort(key=lambda name: int(MIGRATION_NAME.match(name).group(1)))
+    return [os.path.join(MIGRATIONS_DIR, name) for name in names]
+
+def apply_migrations(database_url: str, until: Optional[int] = None) -> List[str]:
+    '''Применяет миграции по порядку; until — последняя версия, например 11 для схемы до V0012'''
+    conn = psycopg2.connect(database_url)
+    applied = []
+    try:
+        for path in migration_files():
+            if until is not None and int(MIGRATION_NAME.match(os.path.basename(path)).group(1)) > until:
+                break
+            with open(path, encoding='utf-8') as f:
+                sql = f.read()
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            cursor.close()
+            conn.commit()
+            applied.append(os.path.basename(path))
+    finally:
+        conn.close()
+    return applied
+
+def database_url_for(server_url: str, database: str) -> str:
+    '''Тот же сервер и пользователь, другая база'''
+    parts = urlsplit(server_url)
+    return urlunsplit((parts.scheme, parts.netloc, '/' + database, parts.query, parts.fragment))
+
+def _admin_execute(server_url: str, sql: str) -> None:
+    conn = psycopg2.connect(database_url_for(server_url, 'postgres'))
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        cursor.close()
+    finally:
+        conn.close()
+
+def database_exists(server_url: str, database: str) -> bool:
+    conn = psycopg2.connect(database_url_for(server_url, 'postgres'))
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,))
+        exists = cursor.fetchone() is not None
+        cursor.close()
+        return exists
+    finally:
+        conn.close()
+
+def recreate_database(server_url: str, database: str) -> str:
+    '''
+    Пустая база с нуля; возвращает её URL. LC_CTYPE C.UTF-8 как у temporary_cluster: с ctype C
+    pg_trgm не видит кириллицу, триграммные индексы совпадают со всеми строками и поиск
+    меряется по полному проходу, а не так, как в проде.
+    '''
+    _admin_execute(server_url, f'DROP DATABASE IF EXISTS "{database}" WITH (FORCE)')
+    _admin_execute(server_url, f'CREATE DATABASE "{database}" ENCODING \'UTF8\' LC_CTYPE \'C.UTF-8\' TEMPLATE template0')
+    return database_url_for(server_url, database)
+
+def drop_database(server_url: str, database: str) -> None:
+    _admin_execute(server_url, f'DROP DATABASE IF EXISTS "{database}" WITH (FORCE)')
+
+@contextmanager
+def scratch_database(database: str, until: Optional[int] = None, **connect_kwargs: Any) -> Iterator[Any]:
+    '''
+    Отдельная база бенчмарка на сервере из DATABASE_URL: пересоздаётся, получает миграции
+    (until — как у apply_migrations) и удаляется после прогона, даже упавшего. Отдаёт
+    соединение с ней (connect_kwargs — в psycopg2.connect); на время прогона DATABASE_URL
+    указывает на неё же, так что handler функций ходит в ту же базу.
+    '''
+    server_url = require_database_url()
+    database_url = recreate_database(server_url, database)
+    conn = None
+    try:
+        apply_migrations(database_url, until)
+        os.environ['DATABASE_URL'] = database_url
+        conn = psycopg2.connect(database_url, **connect_kwargs)
+        yield conn
+    finally:
+        if conn is not None:
+            conn.close()
+        os.environ['DATABASE_URL'] = server_url
+        drop_database(server_url, database)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _pg_tool(name: str) -> str:
+    pg_bin = os.environ.get('PG_BIN')
+    path = os.path.join(pg_bin, name) if pg_bin else shutil.which(name)
+    if not path or not os.path.exists(path):
+        sys.exit(f'{name} не найден: добавьте каталог bin Postgres в PATH или укажите PG_BIN')
+    return path
+
+@contextmanager
+def temporary_cluster() -> Iterator[str]:
+    '''
+    Поднимает одноразовый кластер на свободном порту и удаляет его после прогона.
+    Настройки по умолчанию (fsync включён), чтобы стоимость коммита была как в проде.
+    Postgres не запускается от root — тогда используйте готовый сервер через DATABASE_URL.
+    '''
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        sys.exit('initdb не запускается от root: запустите от обычного пользователя или укажите DATABASE_URL')
+    
+    initdb, pg_ctl = _pg_tool('initdb'), _pg_tool('pg_ctl')
+    data_dir = tempfile.mkdtemp(prefix='madai-bench-pg-')
+    port = _free_port()
+    try:
+        subprocess.run([initdb, '-D', data_dir, '-U', 'postgres', '--auth=trust',
+                        '--encoding=UTF8', '--locale=C.UTF-8', '--no-sync'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([pg_ctl, '-D', data_dir, '-l', os.path.join(data_dir, 'server.log'), '-w',
+                        '-o', f'-p {port} -k {data_dir} -c listen_addresses=127.0.0.1', 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        yield f'postgresql://postgres@127.0.0.1:{port}/postgres'
+    finally:
+        subprocess.run([pg_ctl, '-D', data_dir, '-m', 'fast', '-w', 'stop'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(data_dir, ignore_errors=True)
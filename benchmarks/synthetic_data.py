@@ -0,0 +1,160 @@
+'''
+Синтетические данные для сквозных бенчмарков: игры, артисты, статьи базы знаний
+и история чатов генерируются на стороне сервера через generate_series — 1M строк
+не гоняются через Python. Данные детерминированы: одинаковый масштаб даёт одинаковую базу.
+'''
+import random
+import time
+from typing import Dict, Any, List
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+GAME_FIRST_WORDS = ['Dark', 'Space', 'Super', 'Royal', 'Crystal', 'Iron', 'Pixel', 'Shadow', 'Neon', 'Wild',
+                    'Тёмный', 'Последний', 'Железный', 'Звёздный', 'Дикий', 'Снежный', 'Красный', 'Тихий']
+GAME_SECOND_WORDS = ['Legends', 'Quest', 'Racing', 'Craft', 'Frontier', 'Tactics', 'Arena', 'Odyssey', 'Siege',
+                     'Империя', 'Рыцарь', 'Хроники', 'Гонщик', 'Остров', 'Легион', 'Охотник', 'Город', 'Шторм']
+GAME_GENRES = ['RPG', 'Shooter', 'Strategy', 'Racing', 'Sandbox', 'MOBA', 'Platformer', 'Puzzle']
+
+FIRST_NAMES = ['Алексей', 'Мария', 'Иван', 'Анна', 'Дмитрий', 'Ольга', 'Никита', 'Елена',
+               'James', 'Emma', 'Lucas', 'Olivia', 'Noah', 'Mia', 'Leo', 'Sofia']
+LAST_NAMES = ['Смирнов', 'Кузнецова', 'Попов', 'Волкова', 'Соколов', 'Морозова', 'Лебедев', 'Новикова',
+              'Johnson', 'Miller', 'Garcia', 'Walker', 'Young', 'King', 'Scott', 'Turner']
+PROFESSIONS = ['Рэпер', 'Певица', 'Актёр', 'Продюсер', 'Блогер', 'Стример', 'Диджей', 'Режиссёр']
+
+KB_CATEGORIES = ['Основы', 'Таблицы', 'Функции', 'Roblox', 'ООП', 'Корутины', 'Строки', 'События']
+KB_SUBJECTS = ['цикл for', 'цикл while', 'метатаблицы', 'RemoteEvent', 'DataStore', 'string.format',
+               'pcall', 'корутины', 'workspace Part', 'Touched', 'таблицы', 'замыкания',
+               'модули require', 'TweenService', 'ipairs и pairs', 'условия if']
+
+GAMES_SQL = """
+    INSERT INTO games_database (name, developer, publisher, release_year, genre, platform, description, keywords)
+    SELECT w.first || ' ' || w.second || ' ' || i,
+           w.second || ' Studio', w.second || ' Games',
+           1990 + i %% 35,
+           (%(genres)s::text[])[1 + i %% cardinality(%(genres)s::text[])],
+           'PC, консоли',
+           'Синтетическая игра ' || w.first || ' ' || w.second || ', выпуск ' || i,
+           ARRAY[lower(w.first), lower(w.second), 'game' || i]
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT (%(first)s::text[])[1 + i %% cardinality(%(first)s::text[])] AS first,
+                    (%(second)s::text[])[1 + (i / cardinality(%(first)s::text[])) %% cardinality(%(second)s::text[])] AS second) w
+"""
+
+CELEBRITIES_SQL = """
+    INSERT INTO celebrities_database (name, profession, birth_year, nationality, known_for, description, keywords)
+    SELECT w.first || ' ' || w.last || ' ' || i,
+           (%(professions)s::text[])[1 + i %% cardinality(%(professions)s::text[])],
+           1950 + i %% 55,
+           'Россия',
+           'Синтетические хиты №' || i,
+           'Синтетический артист ' || w.first || ' ' || w.last,
+           ARRAY[lower(w.first), lower(w.last), 'artist' || i]
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT (%(first)s::text[])[1 + i %% cardinality(%(first)s::text[])] AS first,
+                    (%(last)s::text[])[1 + (i / cardinality(%(first)s::text[])) %% cardinality(%(last)s::text[])] AS last) w
+"""
+
+KNOWLEDGE_SQL = """
+    INSERT INTO lua_knowledge_base (category, topic, description, code_example, explanation, keywords, is_roblox)
+    SELECT w.category,
+           initcap(w.subject) || ' #' || i,
+           'Как использовать ' || w.subject || ' в Lua: разбор примера ' || i,
+           'local value = ' || i || E'\\nprint(value)',
+           'Пояснение к статье ' || i || ' про ' || w.subject,
+           string_to_array(lower(w.subject), ' '),
+           w.category = 'Roblox'
+    FROM generate_series(1, %(rows)s) i,
+    LATERAL (SELECT (%(categories)s::text[])[1 + i %% cardinality(%(categories)s::text[])] AS category,
+                    (%(subjects)s::text[])[1 + (i / 7) %% cardinality(%(subjects)s::text[])] AS subject) w
+"""
+
+# Сообщения идут парами вопрос/ответ и раскладываются по %(chats)s чатам (нулевой — веб-чат без chat_id)
+# на последние 20 часов, чтобы автоочистка «старше суток» их не трогала; дневные секции под них заводятся заранее
+MESSAGES_SQL = """
+    SELECT ensure_chat_message_partitions(7, CURRENT_DATE - 1);
+    INSERT INTO chat_messages (role, content, chat_id, timestamp, created_at)
+    SELECT CASE WHEN i %% 2 = 0 THEN 'user' ELSE 'assistant' END,
+           CASE WHEN i %% 2 = 0
+                THEN (%(corpus)s::text[])[1 + (i / 2) %% cardinality(%(corpus)s::text[])]
+                ELSE 'Синтетический ответ на сообщение ' || i END,
+           NULLIF((i / 2) %% %(chats)s, 0),
+           t.at, t.at
+    FROM generate_series(0, %(rows)s - 1) i,
+    LATERAL (SELECT CURRENT_TIMESTAMP - (%(rows)s - i) * (INTERVAL '20 hours' / %(rows)s) AS at) t
+"""
+
+API_KEYS_SQL = """
+    INSERT INTO api_keys (key, name)
+    SELECT 'madai_bench_' || i, 'bench ' || i
+    FROM generate_series(1, %(count)s) i
+"""
+
+TABLES = ('games_database', 'celebrities_database', 'lua_knowledge_base', 'chat_messages')
+
+def parse_scale(value: str) -> int:
+    '''1k / 100k / 1m или просто число строк'''
+    return SCALES.get(value.lower()) or int(value)
+
+def generate(conn, rows: int, corpus: List[str], chats: int = 1000, api_keys: int = 50) -> Dict[str, float]:
+    '''Заполняет таблицы по rows строк в каждой; возвращает секунды на таблицу'''
+    steps = (
+        ('games_database', GAMES_SQL, {'rows': rows, 'first': GAME_FIRST_WORDS, 'second': GAME_SECOND_WORDS,
+                                       'genres': GAME_GENRES}),
+        ('celebrities_database', CELEBRITIES_SQL, {'rows': rows, 'first': FIRST_NAMES, 'last': LAST_NAMES,
+                                                   'professions': PROFESSIONS}),
+        ('lua_knowledge_base', KNOWLEDGE_SQL, {'rows': rows, 'categories': KB_CATEGORIES, 'subjects': KB_SUBJECTS}),
+        ('chat_messages', MESSAGES_SQL, {'rows': rows, 'corpus': corpus, 'chats': min(chats, max(1, rows // 2))}),
+        ('api_keys', API_KEYS_SQL, {'count': api_keys}),
+    )
+    timings = {}
+    for table, sql, params in steps:
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        cursor.close()
+        conn.commit()
+        timings[table] = time.perf_counter() - started
+    
+    cursor = conn.cursor()
+    cursor.execute("UPDATE content_versions SET version = version + 1 WHERE name = 'lua_knowledge'")
+    cursor.close()
+    conn.commit()
+    
+    started = time.perf_counter()
+    autocommit, conn.autocommit = conn.autocommit, True
+    cursor = conn.cursor()
+    cursor.execute("VACUUM ANALYZE")
+    cursor.close()
+    conn.autocommit = autocommit
+    timings['vacuum analyze'] = time.perf_counter() - started
+    return timings
+
+def _sample(conn, sql: str, size: int, rng: random.Random) -> List[Any]:
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM (" + sql + ") s")
+    low, high = cursor.fetchone()
+    if low is None:
+        cursor.close()
+        return []
+    ids = [rng.randint(low, high) for _ in range(size)]
+    cursor.execute("SELECT value FROM (" + sql + ") s WHERE id = ANY(%s)", (ids,))
+    values = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return values
+
+def build_catalog(conn, rng: random.Random, size: int = 200) -> Dict[str, List[Any]]:
+    '''Реальные значения из базы, из которых собираются запросы к handler'''
+    catalog = {
+        'games': _sample(conn, "SELECT id, name AS value FROM games_database", size, rng),
+        'celebrities': _sample(conn, "SELECT id, name AS value FROM celebrities_database", size, rng),
+        'kb_ids': _sample(conn, "SELECT id, id AS value FROM lua_knowledge_base", size, rng),
+        'api_keys': _sample(conn, "SELECT id, key AS value FROM api_keys WHERE key IS NOT NULL", size, rng),
+    }
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT chat_id FROM chat_messages WHERE chat_id IS NOT NULL LIMIT %s", (size,))
+    catalog['chat_ids'] = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in TABLES))
+    catalog['row_counts'] = dict(zip(TABLES, cursor.fetchone()))
+    cursor.close()
+    conn.commit()
+    return catalog
@@ -0,0 +1,31 @@
+-- Индексируемый поиск вместо LIKE '%запрос%' с последовательным сканированием
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Полнотекстовые векторы: русская морфология + simple для латиницы и терминов
+ALTER TABLE games_database ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian', COALESCE(name, '')) || to_tsvector('simple', COALESCE(name, ''))
+    ) STORED;
+
+ALTER TABLE celebrities_database ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('russian', COALESCE(name, '')) || to_tsvector('simple', COALESCE(name, ''))
+    ) STORED;
+
+ALTER TABLE lua_knowledge_base ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', COALESCE(topic, '')), 'A')
+        || setweight(to_tsvector('simple', COALESCE(topic, '')), 'A')
+        || setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+        || setweight(to_tsvector('simple', COALESCE(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_games_search_vector ON games_database USING GIN(search_vector);
+CREATE INDEX IF NOT EXISTS idx_celebrities_search_vector ON celebrities_database USING GIN(search_vector);
+CREATE INDEX IF NOT EXISTS idx_lua_kb_search_vector ON lua_knowledge_base USING GIN(search_vector);
+
+-- Триграммные индексы обслуживают LOWER(...) LIKE '%запрос%' и similarity()
+CREATE INDEX IF NOT EXISTS idx_games_name_trgm ON games_database USING GIN(LOWER(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_celebrities_name_trgm ON celebrities_database USING GIN(LOWER(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_lua_kb_topic_trgm ON lua_knowledge_base USING GIN(LOWER(topic) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_lua_kb_description_trgm ON lua_knowledge_base USING GIN(LOWER(description) gin_trgm_ops);
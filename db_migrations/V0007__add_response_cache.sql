@@ -0,0 +1,18 @@
+-- Версии контента: увеличиваются при изменении данных и сбрасывают кеши ответов
+CREATE TABLE IF NOT EXISTS content_versions (
+    name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO content_versions (name) VALUES ('lua_knowledge') ON CONFLICT (name) DO NOTHING;
+
+-- Общий для всех контейнеров кеш ответов чата по нормализованному запросу
+CREATE TABLE IF NOT EXISTS response_cache (
+    query_key VARCHAR(64) PRIMARY KEY,
+    kb_version BIGINT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_response_cache_created_at ON response_cache(created_at);
@@ -0,0 +1,3 @@
+-- delete_api_key отзывает ключ через key = NULL, а не удаляет строку: на неё ссылаются
+-- telegram_bots.api_key_id, а name, created_at и last_used остаются для истории ключа
+ALTER TABLE api_keys ALTER COLUMN key DROP NOT NULL;
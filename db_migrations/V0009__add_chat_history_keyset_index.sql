@@ -0,0 +1,5 @@
+-- Страница истории чата — один проход по индексу: chat_id = X ORDER BY created_at, id с курсором (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_created_id ON chat_messages(chat_id, created_at, id);
+
+-- Покрывается префиксом нового индекса
+DROP INDEX IF EXISTS idx_chat_messages_chat_id;
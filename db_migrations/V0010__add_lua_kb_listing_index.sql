@@ -0,0 +1,5 @@
+-- Keyset-страницы списка базы знаний: ORDER BY category, topic, id с курсором по тем же колонкам
+CREATE INDEX IF NOT EXISTS idx_lua_kb_category_topic_id ON lua_knowledge_base(category, topic, id);
+
+-- Покрывается префиксом нового индекса
+DROP INDEX IF EXISTS idx_lua_kb_category;
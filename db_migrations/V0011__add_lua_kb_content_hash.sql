@@ -0,0 +1,17 @@
+-- Хеш содержимого статьи: массовый импорт по нему пропускает неизменённые записи,
+-- так что повторная загрузка того же файла ничего не переписывает
+CREATE OR REPLACE FUNCTION lua_kb_content_hash(
+    category TEXT, topic TEXT, description TEXT, code_example TEXT,
+    explanation TEXT, keywords TEXT[], is_roblox BOOLEAN
+) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT md5(jsonb_build_array(
+        category, topic, description, code_example, explanation,
+        COALESCE(keywords, '{}'::TEXT[]), COALESCE(is_roblox, false)
+    )::text)
+$$;
+
+ALTER TABLE lua_knowledge_base ADD COLUMN IF NOT EXISTS content_hash TEXT
+    GENERATED ALWAYS AS (
+        lua_kb_content_hash(category, topic, description, code_example, explanation, keywords, is_roblox)
+    ) STORED;
@@ -0,0 +1,98 @@
+-- История чата хранится по дневным секциям created_at: срок хранения соблюдается
+-- удалением целой секции, а не DELETE по строкам. Секции заводятся заранее,
+-- строки вне заведённых дней попадают в chat_messages_default и переносятся при создании секции.
+LOCK TABLE chat_messages IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE chat_messages RENAME TO chat_messages_unpartitioned;
+ALTER SEQUENCE chat_messages_id_seq OWNED BY NONE;
+
+CREATE TABLE chat_messages (
+    id INTEGER NOT NULL DEFAULT nextval('chat_messages_id_seq'),
+    role VARCHAR(20) NOT NULL CHECK (role IN ('user', 'assistant')),
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    chat_id BIGINT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE chat_messages_id_seq OWNED BY chat_messages.id;
+
+CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT;
+
+-- Заводит дневные секции с from_day по сегодня + days_ahead; возвращает число новых.
+-- Строки этих дней, успевшие попасть в секцию по умолчанию, переезжают в новую секцию.
+CREATE OR REPLACE FUNCTION ensure_chat_message_partitions(days_ahead INTEGER DEFAULT 7, from_day DATE DEFAULT CURRENT_DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    day DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_chat_message_partitions'));
+    FOR day IN SELECT generate_series(from_day, CURRENT_DATE + days_ahead, INTERVAL '1 day')::date LOOP
+        partition_name := 'chat_messages_p' || to_char(day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        EXECUTE format('CREATE TABLE %I (LIKE chat_messages INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM chat_messages_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            day, day + 1, partition_name
+        );
+        EXECUTE format('ALTER TABLE chat_messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, day, day + 1);
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END
+$$;
+
+-- Отсоединяет и удаляет секции, целиком лежащие раньше LOCALTIMESTAMP - keep.
+-- Блокировка родительской таблицы ждётся не дольше lock_timeout_ms: не дождались —
+-- оставшиеся секции уйдут на следующем запуске, вставки в чат за это время не встают.
+CREATE OR REPLACE FUNCTION retire_chat_message_partitions(keep INTERVAL, lock_timeout_ms INTEGER DEFAULT 2000)
+RETURNS TABLE (partition_name TEXT, estimated_rows BIGINT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    part RECORD;
+BEGIN
+    PERFORM set_config('lock_timeout', lock_timeout_ms || 'ms', true);
+    FOR part IN
+        SELECT c.relname, GREATEST(c.reltuples, 0)::bigint AS reltuples,
+               (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamp AS upper_bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'chat_messages'::regclass
+        ORDER BY upper_bound
+    LOOP
+        CONTINUE WHEN part.upper_bound IS NULL OR part.upper_bound > LOCALTIMESTAMP - keep;
+        BEGIN
+            EXECUTE format('ALTER TABLE chat_messages DETACH PARTITION %I', part.relname);
+        EXCEPTION WHEN lock_not_available THEN
+            RAISE NOTICE 'chat_messages is busy, % left for the next run', part.relname;
+            EXIT;
+        END;
+        EXECUTE format('DROP TABLE %I', part.relname);
+        partition_name := part.relname;
+        estimated_rows := part.reltuples;
+        RETURN NEXT;
+    END LOOP;
+END
+$$;
+
+SELECT ensure_chat_message_partitions(7, (SELECT COALESCE(MIN(created_at)::date, CURRENT_DATE) FROM chat_messages_unpartitioned));
+
+INSERT INTO chat_messages (id, role, content, timestamp, created_at, chat_id)
+SELECT id, role, content, timestamp, COALESCE(created_at, timestamp, CURRENT_TIMESTAMP), chat_id
+FROM chat_messages_unpartitioned;
+
+DROP TABLE chat_messages_unpartitioned;
+
+-- Индексы на родительской таблице наследуются каждой секцией, в том числе будущими.
+-- Отдельный индекс по created_at не нужен: отбор по дате решается выбором секций.
+CREATE INDEX idx_chat_messages_chat_created_id ON chat_messages (chat_id, created_at, id);
+CREATE INDEX idx_chat_messages_timestamp ON chat_messages (timestamp DESC);
+
+ANALYZE chat_messages;
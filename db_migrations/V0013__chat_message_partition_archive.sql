@@ -0,0 +1,50 @@
+-- Cron архивирует устаревшие секции по одной и удаляет только ту, чей архив сверен,
+-- поэтому список устаревших секций вынесен в отдельную функцию, а retire умеет
+-- удалять одну названную секцию.
+CREATE OR REPLACE FUNCTION expired_chat_message_partitions(keep INTERVAL)
+RETURNS TABLE (partition_name TEXT, estimated_rows BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT p.relname::text, p.reltuples
+    FROM (
+        SELECT c.relname, GREATEST(c.reltuples, 0)::bigint AS reltuples,
+               (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamp AS upper_bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'chat_messages'::regclass
+    ) p
+    WHERE p.upper_bound <= LOCALTIMESTAMP - keep
+    ORDER BY p.upper_bound
+$$;
+
+DROP FUNCTION retire_chat_message_partitions(INTERVAL, INTEGER);
+
+-- Отсоединяет и удаляет секции, целиком лежащие раньше LOCALTIMESTAMP - keep;
+-- only_partition ограничивает удаление одной секцией.
+-- Блокировка родительской таблицы ждётся не дольше lock_timeout_ms: не дождались —
+-- оставшиеся секции уйдут на следующем запуске, вставки в чат за это время не встают.
+CREATE FUNCTION retire_chat_message_partitions(keep INTERVAL, lock_timeout_ms INTEGER DEFAULT 2000,
+                                               only_partition TEXT DEFAULT NULL)
+RETURNS TABLE (partition_name TEXT, estimated_rows BIGINT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    part RECORD;
+BEGIN
+    PERFORM set_config('lock_timeout', lock_timeout_ms || 'ms', true);
+    FOR part IN
+        SELECT e.partition_name AS relname, e.estimated_rows AS reltuples
+        FROM expired_chat_message_partitions(keep) e
+        WHERE only_partition IS NULL OR e.partition_name = only_partition
+    LOOP
+        BEGIN
+            EXECUTE format('ALTER TABLE chat_messages DETACH PARTITION %I', part.relname);
+        EXCEPTION WHEN lock_not_available THEN
+            RAISE NOTICE 'chat_messages is busy, % left for the next run', part.relname;
+            EXIT;
+        END;
+        EXECUTE format('DROP TABLE %I', part.relname);
+        partition_name := part.relname;
+        estimated_rows := part.reltuples;
+        RETURN NEXT;
+    END LOOP;
+END
+$$;
@@ -0,0 +1,9 @@
+-- Дата в том виде, в каком её отдаёт datetime.isoformat() в Python: списки, которые
+-- собираются в JSON прямо в запросе, отдают те же строки, что и прежний путь через Python.
+-- Микросекунды пишутся только ненулевые и всегда шестью знаками.
+CREATE OR REPLACE FUNCTION py_isoformat(ts TIMESTAMP)
+RETURNS TEXT
+LANGUAGE sql STABLE AS $$
+    SELECT to_char(ts, 'YYYY-MM-DD"T"HH24:MI:SS')
+           || CASE WHEN extract(microseconds FROM ts)::int % 1000000 = 0 THEN '' ELSE to_char(ts, '.US') END
+$$;
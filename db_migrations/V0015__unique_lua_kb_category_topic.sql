@@ -0,0 +1,9 @@
+-- Ключ статьи — (category, topic): импорт сливает записи по нему через ON CONFLICT.
+-- Из накопившихся дублей остаётся самый свежий — с наибольшим id.
+DELETE FROM lua_knowledge_base kb
+USING lua_knowledge_base newer
+WHERE newer.category = kb.category
+  AND newer.topic = kb.topic
+  AND newer.id > kb.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_lua_kb_category_topic_unique ON lua_knowledge_base(category, topic);
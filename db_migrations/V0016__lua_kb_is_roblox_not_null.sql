@@ -0,0 +1,7 @@
+-- Фильтр списка ?is_roblox= сравнивает колонку напрямую, чтобы планировщик мог взять
+-- idx_lua_kb_roblox; прежде NULL читался как false, так что ответы не меняются
+UPDATE lua_knowledge_base SET is_roblox = false WHERE is_roblox IS NULL;
+
+ALTER TABLE lua_knowledge_base
+    ALTER COLUMN is_roblox SET DEFAULT false,
+    ALTER COLUMN is_roblox SET NOT NULL;